@@ -0,0 +1,247 @@
+"""
+Асинхронные версии самых читаемых эндпоинтов для запуска под ASGI.
+
+Ответы совпадают с синхронными представлениями (кэш по версиям,
+ETag/Last-Modified, values()-путь сериализаторов), но запросы идут
+через async ORM и не держат поток воркера, пока ждут кэш и БД.
+
+DRF 3.14 не поддерживает async-представления, поэтому это обычные
+async-функции Django: аутентификация по сессии (как у DRF по
+умолчанию), ответы - JsonResponse.
+
+В Django 5.0 async ORM выполняет SQL через sync_to_async в одном
+потоке запроса, поэтому запросы одного ответа идут последовательно и
+задержка ответа не меньше, чем у синхронной версии. Выигрыш - в
+пропускной способности: цикл событий обслуживает другие запросы, пока
+этот ждет кэш и БД (см. команду bench_async).
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.shortcuts import aget_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.request import Request
+
+from .pagination import KeysetPagination
+from .serializers import BranchSerializer, PostSerializer, UserSerializer
+from .views import TimelineView
+from core.cache import (
+    acached_response_data, aget_last_modified, aget_versions, get_etag_viewer,
+    get_viewer_scope, make_etag
+)
+from core.routing import prefer_primary
+from likes.models import Like
+from posts.models import Post
+
+
+UserModel = get_user_model()
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, safe=False,
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def login_required(view):
+    """Проверка сессии; пользователь подставляется в request.user"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return json_response(
+                {'detail': 'Учетные данные не были предоставлены.'}, status=403
+            )
+        # Ленивый request.user обратился бы к БД синхронно
+        request.user = user
+        try:
+            return await view(request, *args, **kwargs)
+        except (Http404, NotFound):
+            return json_response({'detail': 'Страница не найдена.'}, status=404)
+        except ParseError as error:
+            return json_response({'detail': str(error.detail)}, status=400)
+    return wrapper
+
+
+async def aversioned_response(request, name, keys, viewer, build):
+    """versioned_response() с корутиной build"""
+    versions = await aget_versions(*keys)
+    etag = make_etag(name, versions, get_etag_viewer(request, viewer))
+    last_modified = await aget_last_modified(*keys)
+    prefer_primary(last_modified)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = json_response(
+            await acached_response_data(request, name, versions, viewer, build)
+        )
+
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+async def serialize_rows(serializer, queryset, paginator=None, request=None):
+    """
+    Строки ответа через values(); с ?expand= - обычная сериализация в потоке.
+
+    С paginator возвращается страница в формате KeysetPagination.
+    """
+    columns = serializer.get_values_columns()
+    if columns is None:
+        serializer_class = type(serializer)
+
+        def serialize(rows):
+            return serializer_class(rows, many=True, context=serializer.context).data
+
+        if paginator is None:
+            return await sync_to_async(lambda: serialize(queryset))()
+        page = await paginator.apaginate_queryset(queryset, request)
+        return paginator.get_paginated_data(await sync_to_async(serialize)(page))
+
+    rows = serializer.values_queryset(queryset, columns)
+    if paginator is None:
+        return serializer.rows_from_values([row async for row in rows], columns)
+    page = await paginator.apaginate_queryset(rows, request)
+    return paginator.get_paginated_data(serializer.rows_from_values(page, columns))
+
+
+async def mark_liked_by_me(request, data):
+    """mark_liked_by_me() из views через async ORM"""
+    rows = data['results'] if isinstance(data, dict) else data
+    if rows and 'id' not in rows[0]:
+        return data
+    liked = set()
+    if rows:
+        post_ids = [row['id'] for row in rows]
+        liked = {pk async for pk in Like.liked_post_ids(request.user, post_ids)}
+    for row in rows:
+        row['liked_by_me'] = row['id'] in liked
+    return data
+
+
+def visible_posts(user):
+    """Публичные посты и свои черновики - как в PostViewSet"""
+    return Post.objects.filter(
+        Q(visibility=Post.Visibility.PUBLIC) | Q(user=user)
+    ).select_related('user', 'branch')
+
+
+async def timeline_months(user, is_owner):
+    rows = TimelineView.timeline_rows(user, is_owner)
+    return TimelineView.group_timeline([row async for row in rows])
+
+
+@require_GET
+@login_required
+async def timeline(request, username):
+    """Асинхронный TimelineView"""
+    user = await aget_object_or_404(UserModel, username=username)
+
+    viewer = get_viewer_scope(request, user.pk)
+    return await aversioned_response(
+        request, f'timeline:{user.pk}',
+        keys=[('user', user.pk)],
+        viewer=viewer,
+        build=lambda: timeline_months(user, is_owner=viewer == 'owner')
+    )
+
+
+def user_branches_queryset(user, viewer):
+    branches = user.branches.all()
+    if viewer != 'owner':
+        branches = branches.filter(is_private=False)
+    return branches
+
+
+@require_GET
+@login_required
+async def user_branches(request, username):
+    """Асинхронный UserViewSet.branches"""
+    user = await aget_object_or_404(UserModel, username=username)
+
+    viewer = get_viewer_scope(request, user.pk)
+    serializer = BranchSerializer(context={'request': Request(request)})
+    return await aversioned_response(
+        request, f'user_branches:{user.pk}',
+        keys=[('user', user.pk)],
+        viewer=viewer,
+        build=lambda: serialize_rows(serializer, user_branches_queryset(user, viewer))
+    )
+
+
+@require_GET
+@login_required
+async def posts(request):
+    """
+    Асинхронный список постов с курсорной пагинацией (без COUNT).
+
+    Фильтры: user, branch, post_type, is_draft.
+    """
+    queryset = visible_posts(request.user)
+    try:
+        for name in ('user', 'branch'):
+            if request.GET.get(name):
+                queryset = queryset.filter(**{f'{name}_id': int(request.GET[name])})
+    except ValueError:
+        return json_response({'detail': 'Неверный фильтр'}, status=400)
+    if request.GET.get('post_type'):
+        queryset = queryset.filter(post_type=request.GET['post_type'])
+    if request.GET.get('is_draft') in ('true', 'false', '1', '0'):
+        queryset = queryset.filter(is_draft=request.GET['is_draft'] in ('true', '1'))
+
+    drf_request = Request(request)
+    serializer = PostSerializer(context={'request': drf_request})
+    page = await serialize_rows(serializer, queryset, KeysetPagination(), drf_request)
+    return json_response(await mark_liked_by_me(request, page))
+
+
+@require_GET
+@login_required
+async def user_overview(request, username):
+    """
+    Профиль со счетчиками, временная шкала, ветки и первая страница постов.
+
+    Части читаются по очереди (async ORM не выполняет запросы одного
+    запроса параллельно); ответ кэшируется по версии пользователя.
+    """
+    user = await aget_object_or_404(UserModel.objects.with_stats(), username=username)
+
+    viewer = get_viewer_scope(request, user.pk)
+    drf_request = Request(request)
+
+    async def build():
+        posts = visible_posts(request.user).filter(user=user)
+        months = await timeline_months(user, is_owner=viewer == 'owner')
+        branches = await serialize_rows(
+            BranchSerializer(context={'request': drf_request}),
+            user_branches_queryset(user, viewer)
+        )
+        page = await serialize_rows(
+            PostSerializer(context={'request': drf_request}),
+            posts, KeysetPagination(), drf_request
+        )
+        return {
+            'user': UserSerializer(user).data,
+            'timeline': months,
+            'branches': branches,
+            'posts': page,
+        }
+
+    return await aversioned_response(
+        request, f'user_overview:{user.pk}',
+        keys=[('user', user.pk)],
+        viewer=viewer,
+        build=build
+    )
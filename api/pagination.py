@@ -1,15 +1,218 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(payload):
+    """Кодирование позиции курсора в непрозрачную строку"""
+    data = json.dumps(payload, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Декодирование курсора; при ошибке - ParseError (400)"""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (TypeError, ValueError):
+        raise ParseError('Неверный курсор')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация без COUNT(*) и OFFSET.
+
+    Порядок берется из order_by запроса (или Meta.ordering модели)
+    и дополняется первичным ключом, чтобы позиция была однозначной.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    # Сортировка однозначна сама (по уникальному индексу) - первичный
+    # ключ не добавляется, и страница читается из этого индекса
+    unique_ordering = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """То же для async-представлений: строки читаются через async ORM"""
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page([row async for row in queryset[:self.page_size + 1]])
+
+    def page_queryset(self, queryset, request):
+        """Запрос страницы: сортировка и условие позиции курсора"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in self.ordering
+        ]
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        self.position, self.reverse = None, False
+        if cursor:
+            payload = decode_cursor(cursor)
+            try:
+                self.position = self.parse_position(queryset.model, payload['p'])
+                self.reverse = bool(payload.get('r'))
+            except (KeyError, TypeError, ValueError, ValidationError):
+                raise ParseError('Неверный курсор')
+
+        if self.reverse:
+            ordering = [
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering
+            ]
+        else:
+            ordering = self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.build_filter(self.position, self.reverse))
+        return queryset
+
+    def set_page(self, rows):
+        """Страница из page_size + 1 прочитанных строк"""
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if self.reverse:
+            rows.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        ordering = [
+            name for name in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(name, str)
+        ]
+        pk_names = {'pk', 'id', '-pk', '-id', queryset.model._meta.pk.attname}
+        if not self.unique_ordering and not pk_names.intersection(ordering):
+            ordering.append('id' if queryset.model._meta.pk.attname == 'id' else 'pk')
+        return ordering
+
+    def build_filter(self, position, reverse):
+        """
+        Лексикографическое условие "после позиции":
+        (a < x) OR (a = x AND b < y) OR ...
+        """
+        condition = Q()
+        for index, (name, descending) in enumerate(self.fields):
+            if descending != reverse:
+                lookup = f'{name}__lt'
+            else:
+                lookup = f'{name}__gt'
+
+            term = Q(**{lookup: position[index]})
+            for prev_index, (prev_name, _) in enumerate(self.fields[:index]):
+                term &= Q(**{prev_name: position[prev_index]})
+            condition |= term
+        return condition
+
+    def parse_position(self, model, values):
+        if len(values) != len(self.fields):
+            raise ValueError('Длина курсора не совпадает с сортировкой')
+
+        position = []
+        for (name, _), value in zip(self.fields, values):
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            position.append(field.to_python(value))
+        return position
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return [row[name] for name, _ in self.fields]
+        return [getattr(row, name) for name, _ in self.fields]
+
+    def build_link(self, row, reverse):
+        url = self.request.build_absolute_uri()
+        payload = {'p': self.get_position(row)}
+        if reverse:
+            payload['r'] = 1
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(payload))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.build_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.build_link(self.page[0], reverse=True)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'page_size': self.page_size,
+            'results': data
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
 
 
 class StandardResultsSetPagination(PageNumberPagination):
-    """Кастомная пагинация для API"""
+    """
+    Кастомная пагинация для API.
+
+    Курсорный режим включается параметром ?pagination=cursor
+    (или наличием ?cursor=) и не выполняет COUNT(*).
+    """
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
-    
+    mode_query_param = 'pagination'
+
+    keyset = None
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.keyset = KeysetPagination()
+            self.keyset.page_size = self.page_size
+            self.keyset.max_page_size = self.max_page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        self.keyset = None
+        return super().paginate_queryset(queryset, request, view)
+
     def get_paginated_response(self, data):
         """Кастомный формат ответа с пагинацией"""
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
         return Response({
             'count': self.page.paginator.count,
             'next': self.get_next_link(),
@@ -18,4 +221,4 @@ class StandardResultsSetPagination(PageNumberPagination):
             'current_page': self.page.number,
             'total_pages': self.page.paginator.num_pages,
             'results': data
-        })
\ No newline at end of file
+        })
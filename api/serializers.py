@@ -1,17 +1,167 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.utils import timezone
+import datetime
 from users.models import User
 from branches.models import Branch
 from posts.models import Post
 from subscriptions.models import Subscription
 from likes.models import Like
+from core.metrics import measure_serialization
 
 
 UserModel = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+def datetime_to_representation(value):
+    """То же представление, что у serializers.DateTimeField"""
+    if value is None:
+        return None
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def date_to_representation(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return value.isoformat()
+
+
+class MeasuredSerializerMixin:
+    """Время сериализации попадает в Server-Timing (core.metrics)"""
+    
+    def to_representation(self, instance):
+        with measure_serialization():
+            return super().to_representation(instance)
+
+
+class DynamicFieldsMixin:
+    """
+    Разреженные наборы полей и разворачивание связей.
+    
+    ?fields=id,title - вернуть только перечисленные поля;
+    ?expand=user,post.user - вложенные объекты вместо id.
+    Параметры запроса применяются только к корневому сериализатору,
+    вложенным передаются явно через аргументы fields/expand.
+    """
+    # имя поля -> (класс сериализатора, kwargs) для ?expand=
+    expandable_fields = {}
+    
+    def __init__(self, *args, **kwargs):
+        self._only_fields = kwargs.pop('fields', None)
+        self._expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+    
+    def is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+    
+    def get_field_options(self):
+        only, expand = self._only_fields, self._expand
+        
+        request = self.context.get('request')
+        if request is not None and self.is_root():
+            params = getattr(request, 'query_params', request.GET)
+            if only is None and params.get('fields'):
+                only = params['fields'].split(',')
+            if expand is None and params.get('expand'):
+                expand = params['expand'].split(',')
+        
+        return (
+            {name.strip() for name in only} if only else None,
+            {name.strip() for name in expand} if expand else set()
+        )
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        only, expand = self.get_field_options()
+        
+        for name, (serializer_class, kwargs) in self.expandable_fields.items():
+            if name not in expand or name not in fields:
+                continue
+            nested_expand = [
+                item.split('.', 1)[1] for item in expand
+                if item.startswith(f'{name}.')
+            ]
+            fields[name] = serializer_class(
+                read_only=True, expand=nested_expand, **kwargs
+            )
+        
+        if only is not None:
+            fields = {
+                name: field for name, field in fields.items()
+                if name in only or field.write_only
+            }
+        
+        return fields
+
+
+class ValuesRowsMixin:
+    """
+    Быстрый путь для списков только на чтение.
+    
+    Строки строятся прямо из queryset.values() простыми функциями
+    преобразования, без объектов модели и вызовов полей DRF на каждую строку.
+    Доступен, только если все читаемые поля плоские.
+    """
+    def get_values_columns(self):
+        """[(имя поля, lookup для values(), преобразование)] или None"""
+        columns = []
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField)):
+                return None
+            
+            if isinstance(field, serializers.DateTimeField):
+                convert = datetime_to_representation
+            elif isinstance(field, serializers.DateField):
+                convert = date_to_representation
+            elif isinstance(field, serializers.FileField):
+                return None
+            else:
+                convert = None
+            
+            lookup = field.source.replace('.', '__')
+            columns.append((name, lookup, convert))
+        return columns
+    
+    def values_queryset(self, queryset, columns):
+        """values() с колонками ответа и полями сортировки для курсора"""
+        lookups = [lookup for _, lookup, _ in columns]
+        ordering = [
+            name.lstrip('-') for name in
+            (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(name, str)
+        ]
+        for name in [*ordering, 'id']:
+            if name not in lookups:
+                lookups.append(name)
+        return queryset.prefetch_related(None).values(*lookups)
+    
+    @staticmethod
+    def rows_from_values(rows, columns):
+        result = []
+        with measure_serialization():
+            for row in rows:
+                item = {}
+                for name, lookup, convert in columns:
+                    value = row[lookup]
+                    item[name] = convert(value) if convert is not None else value
+                result.append(item)
+        return result
+
+
+class UserSerializer(MeasuredSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для пользователя"""
     followers_count = serializers.IntegerField(read_only=True)
     following_count = serializers.IntegerField(read_only=True)
@@ -22,12 +172,11 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = [
             'id', 'username', 'email', 'first_name', 'last_name',
-            'bio', 'avatar', 'website', 'location', 'birth_date',
-            'is_verified', 'date_joined',
+            'bio', 'avatar', 'date_joined',
             'followers_count', 'following_count', 
             'branches_count', 'posts_count'
         ]
-        read_only_fields = ['date_joined', 'is_verified']
+        read_only_fields = ['date_joined']
         extra_kwargs = {
             'email': {'required': False},
             'password': {'write_only': True, 'required': False}
@@ -52,9 +201,9 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class BranchSerializer(serializers.ModelSerializer):
+class BranchSerializer(MeasuredSerializerMixin, DynamicFieldsMixin, ValuesRowsMixin, serializers.ModelSerializer):
     """Сериализатор для ветки"""
-    user = UserSerializer(read_only=True)
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
         write_only=True,
@@ -65,6 +214,10 @@ class BranchSerializer(serializers.ModelSerializer):
         read_only=True
     )
     
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+    }
+    
     class Meta:
         model = Branch
         fields = [
@@ -87,12 +240,20 @@ class BranchSerializer(serializers.ModelSerializer):
                 'parent_branch': 'Можно использовать только свои ветки как родительские'
             })
         
+        if parent_branch and self.instance is not None:
+            try:
+                self.instance.validate_parent(parent_branch.pk)
+            except DjangoValidationError as exc:
+                raise serializers.ValidationError({
+                    'parent_branch': exc.messages
+                })
+        
         return data
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(MeasuredSerializerMixin, DynamicFieldsMixin, ValuesRowsMixin, serializers.ModelSerializer):
     """Сериализатор для поста"""
-    user = UserSerializer(read_only=True)
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
         write_only=True,
@@ -103,6 +264,10 @@ class PostSerializer(serializers.ModelSerializer):
         read_only=True
     )
     
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+    }
+    
     class Meta:
         model = Post
         fields = [
@@ -118,18 +283,18 @@ class PostSerializer(serializers.ModelSerializer):
     
     def validate_event_date(self, value):
         """Валидация даты события"""
-        if value > timezone.now().date():
+        if value > timezone.localdate():
             raise serializers.ValidationError(
                 'Дата события не может быть в будущем'
             )
         return value
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(MeasuredSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для подписки"""
-    subscriber = UserSerializer(read_only=True)
-    target_user = UserSerializer(read_only=True)
-    target_branch = BranchSerializer(read_only=True)
+    subscriber = serializers.PrimaryKeyRelatedField(read_only=True)
+    target_user = serializers.PrimaryKeyRelatedField(read_only=True)
+    target_branch = serializers.PrimaryKeyRelatedField(read_only=True)
     
     subscriber_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
@@ -151,6 +316,12 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         source='target_branch'
     )
     
+    expandable_fields = {
+        'subscriber': (UserSerializer, {}),
+        'target_user': (UserSerializer, {}),
+        'target_branch': (BranchSerializer, {}),
+    }
+    
     class Meta:
         model = Subscription
         fields = [
@@ -175,10 +346,10 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return data
 
 
-class LikeSerializer(serializers.ModelSerializer):
+class LikeSerializer(MeasuredSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для лайка"""
-    user = UserSerializer(read_only=True)
-    post = PostSerializer(read_only=True)
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    post = serializers.PrimaryKeyRelatedField(read_only=True)
     
     user_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
@@ -191,6 +362,11 @@ class LikeSerializer(serializers.ModelSerializer):
         source='post'
     )
     
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+        'post': (PostSerializer, {}),
+    }
+    
     class Meta:
         model = Like
         fields = ['id', 'user', 'user_id', 'post', 'post_id', 'created_at']
@@ -210,7 +386,7 @@ class LikeSerializer(serializers.ModelSerializer):
         return data
 
 
-class TimelineSerializer(serializers.Serializer):
+class TimelineSerializer(MeasuredSerializerMixin, serializers.Serializer):
     """Сериализатор для данных временной шкалы"""
     year = serializers.IntegerField()
     month = serializers.IntegerField()
@@ -0,0 +1,34 @@
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from . import async_views, views
+
+
+router = DefaultRouter()
+router.register('users', views.UserViewSet)
+router.register('branches', views.BranchViewSet)
+router.register('posts', views.PostViewSet)
+router.register('subscriptions', views.SubscriptionViewSet)
+router.register('likes', views.LikeViewSet)
+
+urlpatterns = [
+    path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('feed/', views.FeedView.as_view(), name='feed'),
+    path('timeline/<str:username>/', views.TimelineView.as_view(), name='timeline'),
+    path('timeline/<str:username>/heatmap/', views.HeatmapView.as_view(), name='timeline_heatmap'),
+    path(
+        'timeline/<str:username>/<str:zoom>/',
+        views.TimelineWindowView.as_view(), name='timeline_window'
+    ),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('export/', views.ExportView.as_view(), name='export'),
+    path('cache-stats/', views.CacheStatsView.as_view(), name='cache_stats'),
+    # Асинхронные версии для ASGI
+    path('async/timeline/<str:username>/', async_views.timeline, name='async_timeline'),
+    path('async/users/<str:username>/branches/', async_views.user_branches, name='async_user_branches'),
+    path('async/users/<str:username>/overview/', async_views.user_overview, name='async_user_overview'),
+    path('async/posts/', async_views.posts, name='async_posts'),
+    path('', include(router.urls)),
+]
@@ -1,32 +1,136 @@
 from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 import datetime
+import itertools
+import sys
 
 from .serializers import (
     UserSerializer, BranchSerializer, PostSerializer,
     SubscriptionSerializer, LikeSerializer, TimelineSerializer
 )
 from .permissions import IsOwnerOrReadOnly, IsPublicOrOwner
-from .pagination import StandardResultsSetPagination
+from .pagination import (
+    KeysetPagination, StandardResultsSetPagination, encode_cursor, decode_cursor
+)
 from users.models import User
-from branches.models import Branch
+from branches.models import Branch, BranchClosure
 from posts.models import Post
+from posts.importing import PostImporter
 from subscriptions.models import Subscription
 from likes.models import Like
+from subscriptions.feed import read_feed
+from core.search import search
+from core.export import export_stream, parse_position
+from core.routing import prefer_primary
+from core.cache import (
+    cached_response_data, get_etag_viewer, get_versions, get_last_modified,
+    get_viewer_scope, get_stats, make_etag
+)
+from timeline.models import TimelineMonth
+from timeline.zoom import (
+    CHUNK_SIZE as ZOOM_CHUNK_SIZE, MAX_RANGE_DAYS, ZOOMS, adjacent_periods,
+    period_bounds, stream_json, window_posts
+)
 
 
 UserModel = get_user_model()
 
 
+def versioned_response(request, name, keys, viewer, build):
+    """
+    Ответ с кэшированием по версиям и условным GET.
+    
+    keys - пары (scope, id), от которых зависит ответ. Валидаторы
+    строятся из версий без чтения данных: при совпадении If-None-Match
+    (или If-Modified-Since) отдается 304 и build() не вызывается.
+    Данные кэшируются общими для viewer, ETag - свой у пользователя.
+    """
+    versions = get_versions(*keys)
+    etag = make_etag(name, versions, get_etag_viewer(request, viewer))
+    last_modified = get_last_modified(*keys)
+    # Свежие изменения реплика может еще не видеть
+    prefer_primary(last_modified)
+    
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        response = Response(
+            cached_response_data(request, name, versions, viewer, build)
+        )
+    
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Ответ зависит от пользователя и должен перепроверяться при каждом опросе
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def mark_liked_by_me(request, data):
+    """
+    Флаг liked_by_me у постов ответа (список или страница с results).
+    
+    Лайки зрителя среди постов страницы читаются одним запросом по
+    индексу unique_like. Флаг ставится после кэша ответов: кэш общий
+    для всех зрителей. Строки без id (?fields= без id) остаются без флага.
+    """
+    rows = data['results'] if isinstance(data, dict) else data
+    if rows and 'id' not in rows[0]:
+        return data
+    liked = set()
+    if rows and request.user.is_authenticated:
+        liked = set(Like.liked_post_ids(request.user, [row['id'] for row in rows]))
+    for row in rows:
+        row['liked_by_me'] = row['id'] in liked
+    return data
+
+
+class ValuesListMixin:
+    """
+    Быстрый путь list для плоских сериализаторов.
+    
+    Если в ответе нет развернутых связей (?expand=), строки страницы
+    читаются через values() и собираются без объектов модели.
+    """
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.values_list_response(queryset, self.get_serializer())
+    
+    def values_list_response(self, queryset, serializer):
+        columns = serializer.get_values_columns()
+        if columns is None:
+            serializer_class = type(serializer)
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                data = serializer_class(page, many=True, context=serializer.context).data
+                return self.get_paginated_response(data)
+            data = serializer_class(queryset, many=True, context=serializer.context).data
+            return Response(data)
+        
+        rows = serializer.values_queryset(queryset, columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.rows_from_values(page, columns))
+        return Response(serializer.rows_from_values(rows, columns))
+
+
 class UserViewSet(viewsets.ModelViewSet):
     """ViewSet для пользователей"""
     queryset = UserModel.objects.all()
@@ -45,67 +149,147 @@ class UserViewSet(viewsets.ModelViewSet):
             permission_classes = [IsOwnerOrReadOnly]
         return [permission() for permission in permission_classes]
     
+    # Наибольшее число веток и постов в превью одного пользователя
+    max_preview = 5
+    
     def get_queryset(self):
-        """Оптимизация запросов"""
+        """Счетчики пользователя одним JOIN со статистикой"""
         queryset = super().get_queryset()
-        return queryset.select_related().prefetch_related(
-            'branches', 'posts'
+        return queryset.with_stats()
+    
+    def list(self, request, *args, **kwargs):
+        """
+        Каталог пользователей: строки со счетчиками, без веток и постов.
+        
+        ?username=<префикс> - поиск по началу имени (по возрастанию имени).
+        ?preview=N - N последних публичных веток и постов каждого
+        пользователя страницы (не больше max_preview).
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        prefix = request.query_params.get('username', '').strip()
+        if prefix:
+            queryset = self.username_prefix(queryset, prefix).order_by('username')
+        
+        try:
+            preview = int(request.query_params.get('preview', 0))
+        except ValueError:
+            preview = 0
+        preview = max(0, min(preview, self.max_preview))
+        
+        page = self.paginate_queryset(queryset)
+        users = page if page is not None else list(queryset)
+        data = self.get_serializer(users, many=True).data
+        if preview:
+            previews = self.build_previews([user.pk for user in users], preview)
+            for row in data:
+                row['preview'] = previews.get(row['id'], {'branches': [], 'posts': []})
+        
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+    
+    @staticmethod
+    def username_prefix(queryset, prefix):
+        """
+        Имена, начинающиеся с prefix: диапазон [prefix, следующий префикс)
+        читается из уникального индекса username. LIKE 'prefix%' индекс
+        использует не при любой collation, диапазон - всегда.
+        
+        У префикса, оканчивающегося на U+10FFFF, следующего нет - для него
+        остается только startswith.
+        """
+        last = ord(prefix[-1])
+        if last == sys.maxunicode:
+            return queryset.filter(username__startswith=prefix)
+        # Суррогаты не кодируются в UTF-8 - следующий после U+D7FF символ U+E000
+        upper = prefix[:-1] + chr(0xE000 if 0xD7FF <= last < 0xE000 else last + 1)
+        return queryset.filter(
+            username__gte=prefix, username__lt=upper
+        ).filter(username__startswith=prefix)
+    
+    @staticmethod
+    def build_previews(user_ids, limit):
+        """
+        {id пользователя: {'branches': [...], 'posts': [...]}} - по limit
+        последних публичных веток и постов на пользователя.
+        
+        Два запроса с ROW_NUMBER() OVER (PARTITION BY user_id): в память
+        попадает не больше len(user_ids) * limit строк каждого вида.
+        """
+        previews = {user_id: {'branches': [], 'posts': []} for user_id in user_ids}
+        if not user_ids:
+            return previews
+        
+        def top(queryset, ordering, fields):
+            return queryset.filter(user_id__in=user_ids).annotate(
+                row_number=Window(
+                    RowNumber(), partition_by=[F('user_id')], order_by=ordering
+                )
+            ).filter(row_number__lte=limit).order_by('user_id', 'row_number').values(
+                'user_id', *fields
+            )
+        
+        branches = top(
+            Branch.objects.filter(is_private=False),
+            [F('created_at').desc(), F('id').desc()],
+            ('id', 'title', 'color')
+        )
+        for row in branches:
+            previews[row.pop('user_id')]['branches'].append(row)
+        
+        posts = top(
+            Post.objects.filter(visibility=Post.Visibility.PUBLIC),
+            [F('event_date').desc(), F('created_at').desc(), F('id').desc()],
+            ('id', 'branch_id', 'title', 'post_type', 'event_date')
         )
+        for row in posts:
+            previews[row.pop('user_id')]['posts'].append(row)
+        return previews
     
     @action(detail=True, methods=['get'])
     def timeline_data(self, request, username=None):
         """Получение данных временной шкалы пользователя"""
         user = get_object_or_404(UserModel, username=username)
-        
-        # Проверяем права доступа
-        if user != request.user and not user.profile.is_public:
-            return Response(
-                {'error': 'Профиль пользователя приватный'},
-                status=status.HTTP_403_FORBIDDEN
-            )
-        
-        # Получаем посты пользователя
-        posts = Post.objects.filter(
+
+        # Сводка содержит только публичные ветки, отдельной приватности
+        # профиля у пользователя нет
+        return versioned_response(
+            request, f'timeline_data:{user.pk}',
+            keys=[('user', user.pk)],
+            viewer='public',
+            build=lambda: self.build_timeline_data(user)
+        )
+    
+    def build_timeline_data(self, user):
+        """Помесячные счетчики публичных постов по веткам"""
+        # Читаем помесячную сводку вместо всех постов пользователя
+        months = TimelineMonth.objects.filter(
             user=user,
-            is_draft=False,
-            branch__is_private=False
-        ).select_related('branch').order_by('event_date')
+            is_private=False,
+            posts_count__gt=0
+        ).values('year', 'month', 'branch__title', 'posts_count')
         
-        # Группируем по годам и месяцам
+        # Группируем строки сводки по годам и месяцам
         timeline_data = {}
-        for post in posts:
-            year = post.event_date.year
-            month = post.event_date.month
+        for row in months.order_by('year', 'month'):
+            key = (row['year'], row['month'])
             
-            if year not in timeline_data:
-                timeline_data[year] = {}
-            
-            if month not in timeline_data[year]:
-                timeline_data[year][month] = {
+            if key not in timeline_data:
+                timeline_data[key] = {
+                    'year': row['year'],
+                    'month': row['month'],
                     'posts_count': 0,
                     'branches': {}
                 }
             
-            timeline_data[year][month]['posts_count'] += 1
-            
-            branch_title = post.branch.title
-            if branch_title not in timeline_data[year][month]['branches']:
-                timeline_data[year][month]['branches'][branch_title] = 0
-            timeline_data[year][month]['branches'][branch_title] += 1
+            timeline_data[key]['posts_count'] += row['posts_count']
+            timeline_data[key]['branches'][row['branch__title']] = row['posts_count']
         
-        # Преобразуем в список для сериализации
-        result = []
-        for year, months in timeline_data.items():
-            for month, data in months.items():
-                result.append({
-                    'year': year,
-                    'month': month,
-                    'posts_count': data['posts_count'],
-                    'branches': data['branches']
-                })
+        result = list(timeline_data.values())
         
         serializer = TimelineSerializer(result, many=True)
-        return Response(serializer.data)
+        return serializer.data
     
     @action(detail=True, methods=['get'])
     def branches(self, request, username=None):
@@ -113,16 +297,26 @@ class UserViewSet(viewsets.ModelViewSet):
         user = get_object_or_404(UserModel, username=username)
         
         # Проверяем права доступа
-        if user != request.user:
+        viewer = get_viewer_scope(request, user.pk)
+        if viewer != 'owner':
             branches = user.branches.filter(is_private=False)
         else:
             branches = user.branches.all()
+        # parent_branch_title - без запроса на каждую вложенную ветку
+        branches = branches.select_related('parent_branch')
         
-        serializer = BranchSerializer(branches, many=True)
-        return Response(serializer.data)
+        serializer = BranchSerializer(
+            branches, many=True, context=self.get_serializer_context()
+        )
+        return versioned_response(
+            request, f'user_branches:{user.pk}',
+            keys=[('user', user.pk)],
+            viewer=viewer,
+            build=lambda: serializer.data
+        )
 
 
-class BranchViewSet(viewsets.ModelViewSet):
+class BranchViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """ViewSet для веток"""
     queryset = Branch.objects.all()
     serializer_class = BranchSerializer
@@ -162,18 +356,85 @@ class BranchViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        posts = branch.posts.filter(is_draft=False).order_by('-event_date')
-        page = self.paginate_queryset(posts)
+        # ?include_descendants=1 - посты всего поддерева через таблицу замыкания
+        if request.query_params.get('include_descendants') in ('1', 'true'):
+            posts = branch.get_subtree_posts()
+        else:
+            posts = branch.posts.all()
+        
+        if branch.user != request.user:
+            posts = posts.filter(visibility=Post.Visibility.PUBLIC)
+        else:
+            posts = posts.exclude(visibility=Post.Visibility.DRAFT)
+        posts = posts.order_by('-event_date', '-created_at')
+        serializer = PostSerializer(context=self.get_serializer_context())
         
-        if page is not None:
-            serializer = PostSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        # Поддерево может включать любые ветки владельца - версия пользователя
+        if request.query_params.get('include_descendants') in ('1', 'true'):
+            keys = [('user', branch.user_id)]
+        else:
+            keys = [('branch', branch.pk)]
+        
+        response = versioned_response(
+            request, f'branch_posts:{branch.pk}',
+            keys=keys,
+            viewer=get_viewer_scope(request, branch.user_id),
+            build=lambda: self.values_list_response(posts, serializer).data
+        )
+        if response.status_code == status.HTTP_200_OK:
+            mark_liked_by_me(request, response.data)
+        return response
+    
+    @action(detail=True, methods=['get'])
+    def ancestors(self, request, pk=None):
+        """Цепочка родительских веток от корня (хлебные крошки)"""
+        branch = self.get_object()
         
-        serializer = PostSerializer(posts, many=True)
+        ancestors = branch.get_ancestors()
+        if branch.user != request.user:
+            ancestors = ancestors.filter(is_private=False)
+        
+        serializer = BranchSerializer(
+            ancestors, many=True, context=self.get_serializer_context()
+        )
         return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def subtree(self, request, pk=None):
+        """Под-ветки на любой глубине и число постов поддерева"""
+        branch = self.get_object()
+        
+        descendants = BranchClosure.objects.filter(
+            ancestor=branch, depth__gt=0
+        )
+        posts = branch.get_subtree_posts()
+        if branch.user != request.user:
+            descendants = descendants.filter(descendant__is_private=False)
+            posts = posts.filter(visibility=Post.Visibility.PUBLIC)
+        else:
+            posts = posts.exclude(visibility=Post.Visibility.DRAFT)
+        
+        descendants = descendants.order_by('depth', 'descendant__title').values_list(
+            'descendant_id', 'descendant__title', 'descendant__color',
+            'descendant__parent_branch_id', 'depth'
+        )
+        
+        return Response({
+            'posts_count': posts.count(),
+            'branches': [
+                {
+                    'id': branch_id,
+                    'title': title,
+                    'color': color,
+                    'parent_branch': parent_branch_id,
+                    'depth': depth,
+                }
+                for branch_id, title, color, parent_branch_id, depth in descendants
+            ]
+        })
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ValuesListMixin, viewsets.ModelViewSet):
     """ViewSet для постов"""
     queryset = Post.objects.all()
     serializer_class = PostSerializer
@@ -190,40 +451,87 @@ class PostViewSet(viewsets.ModelViewSet):
         if user.is_authenticated:
             # Показываем публичные посты и свои черновики
             queryset = queryset.filter(
-                Q(is_draft=False, branch__is_private=False) | 
+                Q(visibility=Post.Visibility.PUBLIC) |
                 Q(user=user)
             )
         else:
-            queryset = queryset.filter(
-                is_draft=False,
-                branch__is_private=False
-            )
+            queryset = queryset.filter(visibility=Post.Visibility.PUBLIC)
         
-        return queryset.select_related('user', 'branch').prefetch_related('likes')
+        # Лайки не подгружаются: liked_by_me - один запрос на страницу
+        return queryset.select_related('user', 'branch')
+    
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        mark_liked_by_me(request, response.data)
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        mark_liked_by_me(request, [response.data])
+        return response
     
     def perform_create(self, serializer):
         """Автоматически устанавливаем пользователя"""
         serializer.save(user=self.request.user)
     
+    @action(detail=True, methods=['get'])
+    def likers(self, request, pk=None):
+        """
+        Кто лайкнул пост, по возрастанию id пользователя.
+        
+        Курсорная пагинация по индексу unique_like (post, user): страница -
+        чтение диапазона индекса, без COUNT и без загрузки всех лайков.
+        """
+        post = self.get_object()
+        
+        likes = Like.objects.filter(post=post).order_by('user_id').values(
+            'user_id', 'user__username', 'user__first_name', 'user__last_name', 'created_at'
+        )
+        paginator = KeysetPagination()
+        paginator.unique_ordering = True
+        page = paginator.paginate_queryset(likes, request, view=self)
+        return paginator.get_paginated_response([
+            {
+                'id': row['user_id'],
+                'username': row['user__username'],
+                'first_name': row['user__first_name'],
+                'last_name': row['user__last_name'],
+                'liked_at': row['created_at'],
+            }
+            for row in page
+        ])
+    
     @action(detail=True, methods=['post'])
     def like(self, request, pk=None):
         """Постановка/снятие лайка"""
         post = self.get_object()
         user = request.user
         
-        like = Like.objects.filter(user=user, post=post).first()
-        
-        if like:
-            like.delete()
-            liked = False
-        else:
-            Like.objects.create(user=user, post=post)
-            liked = True
+        liked, likes_count = Like.toggle(user, post)
         
         return Response({
             'liked': liked,
-            'likes_count': post.likes_count
+            'likes_count': likes_count
         })
+    
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_posts(self, request):
+        """
+        Пакетный импорт постов текущего пользователя из NDJSON в теле запроса.
+        
+        ?create_branches=1 - создавать недостающие ветки.
+        """
+        importer = PostImporter(
+            request.user,
+            create_branches=request.query_params.get('create_branches') in ('1', 'true')
+        )
+        # Тело читается построчно, без загрузки в request.data
+        result = importer.run(request.stream or [])
+        
+        # Ошибки в отдельных строках не отменяют импорт остальных
+        if result['errors'] and not result['created']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED)
 
 
 class SubscriptionViewSet(viewsets.ModelViewSet):
@@ -280,54 +588,412 @@ class TimelineView(APIView):
         """Получение данных временной шкалы пользователя"""
         user = get_object_or_404(UserModel, username=username)
         
+        viewer = get_viewer_scope(request, user.pk)
+        return versioned_response(
+            request, f'timeline:{user.pk}',
+            keys=[('user', user.pk)],
+            viewer=viewer,
+            build=lambda: self.build_timeline(user, is_owner=viewer == 'owner')
+        )
+    
+    def build_timeline(self, user, is_owner):
+        """Помесячные счетчики и ветки; владелец видит черновики и приватные ветки"""
+        return self.group_timeline(self.timeline_rows(user, is_owner))
+    
+    @staticmethod
+    def timeline_rows(user, is_owner):
+        """Строки сводки от новых месяцев к старым"""
+        months = TimelineMonth.objects.filter(user=user)
+        
         # Проверяем права доступа
-        if user != request.user:
-            posts = Post.objects.filter(
-                user=user,
-                is_draft=False,
-                branch__is_private=False
-            )
+        if not is_owner:
+            months = months.filter(is_private=False)
+            posts_count = F('posts_count')
         else:
+            posts_count = F('posts_count') + F('drafts_count')
+        
+        rows = months.annotate(
+            total=posts_count
+        ).filter(
+            total__gt=0
+        ).values(
+            'year', 'month', 'branch__title', 'total'
+        ).order_by('-year', '-month')
+        return rows
+    
+    @staticmethod
+    def group_timeline(rows):
+        """Группировка строк сводки по годам и месяцам"""
+        result = []
+        for row in rows:
+            if not result or (result[-1]['year'], result[-1]['month']) != (row['year'], row['month']):
+                result.append({
+                    'year': row['year'],
+                    'month': row['month'],
+                    'posts_count': 0,
+                    'branches': []
+                })
+            
+            result[-1]['posts_count'] += row['total']
+            result[-1]['branches'].append(row['branch__title'])
+        
+        return result
+
+
+class TimelineWindowView(APIView):
+    """
+    Посты временной шкалы за год, месяц, день или явный диапазон дат.
+
+    /timeline/<username>/year/?year=2024
+    /timeline/<username>/month/?year=2024&month=1
+    /timeline/<username>/day/?date=2024-01-15
+    /timeline/<username>/range/?start=2024-01-01&end=2024-03-31
+
+    Период можно задать датой (?date=) или частями (?year=&month=&day=),
+    по умолчанию - сегодняшний. ?branch=<id> - только одна ветка.
+
+    Ответ {"zoom", "start", "end", "prev", "next", "posts": [...]}
+    отдается потоком; prev и next - начала ближайших непустых периодов.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, username, zoom):
+        if zoom not in ZOOMS:
+            raise NotFound('Неизвестный масштаб')
+        user = get_object_or_404(UserModel, username=username)
+
+        try:
+            start, end = self.get_window(zoom, request.query_params)
+            branch_id = request.query_params.get('branch')
+            branch_id = int(branch_id) if branch_id else None
+        except ValueError as error:
+            return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        viewer = get_viewer_scope(request, user.pk)
+        keys = [('user', user.pk)]
+        etag = make_etag(
+            f'timeline_{zoom}:{user.pk}:{start.isoformat()}:{end.isoformat()}:{branch_id}',
+            get_versions(*keys), get_etag_viewer(request, viewer)
+        )
+        last_modified = get_last_modified(*keys)
+        prefer_primary(last_modified)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+        if response is None:
             posts = Post.objects.filter(user=user)
+            # Владелец видит черновики и приватные ветки, как на временной шкале
+            if viewer != 'owner':
+                posts = posts.filter(visibility=Post.Visibility.PUBLIC)
+            if branch_id is not None:
+                posts = posts.filter(branch_id=branch_id)
+
+            previous, following = adjacent_periods(zoom, posts, start, end)
+            header = {
+                'zoom': zoom,
+                'start': start,
+                'end': end,
+                'prev': previous,
+                'next': following,
+            }
+            rows = self.serialize_rows(window_posts(posts, start, end), request)
+            response = StreamingHttpResponse(
+                stream_json(header, 'posts', rows), content_type='application/json'
+            )
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def get_window(zoom, params):
+        """(start, end) окна; ValueError при неверных параметрах"""
+        if zoom == 'range':
+            try:
+                start = parse_date(params.get('start', ''))
+                end = parse_date(params.get('end', ''))
+            except ValueError:
+                start = end = None
+            if start is None or end is None or start > end:
+                raise ValueError('Укажите start <= end в формате ГГГГ-ММ-ДД')
+            if (end - start).days >= MAX_RANGE_DAYS:
+                raise ValueError(f'Диапазон не длиннее {MAX_RANGE_DAYS} дней')
+            return start, end
+
+        try:
+            if params.get('date'):
+                anchor = parse_date(params['date'])
+                if anchor is None:
+                    raise ValueError
+            else:
+                # Не заданные части - первые в заданном периоде или сегодняшние
+                today = timezone.localdate()
+                year = int(params.get('year', today.year))
+                month = int(params.get('month', 1 if 'year' in params else today.month))
+                day = int(params.get('day', 1 if 'year' in params or 'month' in params else today.day))
+                anchor = datetime.date(year, month, day)
+        except ValueError:
+            raise ValueError('Неверная дата периода')
+        return period_bounds(zoom, anchor)
+
+    @staticmethod
+    def serialize_rows(queryset, request):
+        """
+        Строки PostSerializer по мере чтения курсора. liked_by_me
+        проставляется пачками по ZOOM_CHUNK_SIZE - запрос на пачку.
+        """
+        serializer = PostSerializer(context={'request': request})
+        columns = serializer.get_values_columns()
+        if columns is None:
+            posts = queryset.select_related('user', 'branch').iterator(chunk_size=ZOOM_CHUNK_SIZE)
+            rows = (PostSerializer(post, context={'request': request}).data for post in posts)
+        else:
+            values = serializer.values_queryset(queryset, columns).iterator(chunk_size=ZOOM_CHUNK_SIZE)
+            rows = (serializer.rows_from_values([row], columns)[0] for row in values)
+
+        while chunk := list(itertools.islice(rows, ZOOM_CHUNK_SIZE)):
+            yield from mark_liked_by_me(request, chunk)
+
+
+class HeatmapView(APIView):
+    """
+    Тепловая карта активности: число постов по дням за год.
+
+    ?year=2024 - календарный год, без него - последние 365 дней.
+    ?by_branch=1 - дополнительно разбивка по веткам.
+
+    Счетчики плотные: counts[i] - число постов за start + i дней.
+    Все дни считаются одним GROUP BY по event_date в диапазоне дат -
+    это индекс (user, event_date); event_date хранит день, поэтому
+    усечение даты не нужно.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, username):
+        user = get_object_or_404(UserModel, username=username)
+
+        year = request.query_params.get('year')
+        if year:
+            try:
+                year = int(year)
+                start, end = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+            except ValueError:
+                return Response(
+                    {'error': 'Неверный год'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            end = timezone.localdate()
+            start = end - datetime.timedelta(days=364)
+        by_branch = request.query_params.get('by_branch') in ('1', 'true')
+
+        viewer = get_viewer_scope(request, user.pk)
+        # Окно "последние 365 дней" сдвигается каждый день - дата в имени ключа
+        return versioned_response(
+            request, f'heatmap:{user.pk}:{start.isoformat()}',
+            keys=[('user', user.pk)],
+            viewer=viewer,
+            build=lambda: self.build_heatmap(
+                user, start, end, is_owner=viewer == 'owner', by_branch=by_branch
+            )
+        )
+
+    @staticmethod
+    def heatmap_rows(user, start, end, is_owner, by_branch=False):
+        """(event_date, число постов) или (event_date, ветка, число) по дням"""
+        posts = Post.objects.filter(user=user, event_date__range=(start, end))
+        # Владелец видит черновики и приватные ветки, как на временной шкале
+        if not is_owner:
+            posts = posts.filter(visibility=Post.Visibility.PUBLIC)
+
+        columns = ['event_date']
+        if by_branch:
+            columns += ['branch_id', 'branch__title', 'branch__color']
+        return posts.order_by().values(*columns).annotate(
+            count=Count('pk')
+        ).values_list(*columns, 'count')
+
+    def build_heatmap(self, user, start, end, is_owner, by_branch=False):
+        days = (end - start).days + 1
+        counts = [0] * days
+        branches = {}
+
+        for row in self.heatmap_rows(user, start, end, is_owner, by_branch):
+            index = (row[0] - start).days
+            counts[index] += row[-1]
+            if by_branch:
+                branch = branches.get(row[1])
+                if branch is None:
+                    branch = branches[row[1]] = {
+                        'id': row[1],
+                        'title': row[2],
+                        'color': row[3],
+                        'total': 0,
+                        'counts': [0] * days,
+                    }
+                branch['counts'][index] += row[-1]
+                branch['total'] += row[-1]
+
+        data = {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'total': sum(counts),
+            'max': max(counts),
+            'active_days': sum(1 for count in counts if count),
+            'counts': counts,
+        }
+        if by_branch:
+            data['branches'] = sorted(
+                branches.values(), key=lambda branch: (-branch['total'], branch['id'])
+            )
+        return data
+
+
+class FeedView(APIView):
+    """API ленты подписок текущего пользователя"""
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
+    
+    def get(self, request):
+        """Страница ленты с курсорной пагинацией"""
+        before = None
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                before = int(decode_cursor(cursor)['b'])
+            except (KeyError, TypeError, ValueError):
+                raise ParseError('Неверный курсор')
         
-        # Группировка по годам и месяцам
-        timeline_data = {}
+        try:
+            page_size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            page_size = self.page_size
+        page_size = max(1, min(page_size, self.max_page_size))
         
-        for post in posts.select_related('branch'):
-            year = post.event_date.year
-            month = post.event_date.month
-            
-            key = f"{year}-{month:02d}"
-            
-            if key not in timeline_data:
-                timeline_data[key] = {
-                    'year': year,
-                    'month': month,
-                    'posts': [],
-                    'branches': set()
-                }
-            
-            timeline_data[key]['posts'].append({
-                'id': post.id,
-                'title': post.title,
-                'branch': post.branch.title,
-                'branch_color': post.branch.color,
-                'event_date': post.event_date,
-                'likes_count': post.likes_count
-            })
-            
-            timeline_data[key]['branches'].add(post.branch.title)
+        posts, next_before = read_feed(request.user, before=before, limit=page_size)
         
-        # Преобразуем в список и сортируем
-        result = []
-        for key, data in sorted(timeline_data.items(), reverse=True):
-            data['posts_count'] = len(data['posts'])
-            data['branches'] = list(data['branches'])
-            data['posts'] = sorted(
-                data['posts'],
-                key=lambda x: x['event_date'],
-                reverse=True
+        next_link = None
+        if next_before is not None:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), 'cursor',
+                encode_cursor({'b': next_before})
             )
-            result.append(data)
         
-        return Response(result)
\ No newline at end of file
+        serializer = PostSerializer(
+            posts, many=True, context={'request': request}
+        )
+        return Response(mark_liked_by_me(request, {
+            'next': next_link,
+            'page_size': page_size,
+            'results': serializer.data
+        }))
+
+
+class SearchView(APIView):
+    """
+    Полнотекстовый поиск по постам (?type=posts) или веткам (?type=branches).
+    
+    Результаты упорядочены по релевантности, пагинация курсорная.
+    """
+    permission_classes = [IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
+    serializers = {
+        'posts': PostSerializer,
+        'branches': BranchSerializer,
+    }
+    
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Параметр q обязателен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        kind = request.query_params.get('type', 'posts')
+        if kind not in self.serializers:
+            return Response(
+                {'error': 'Параметр type: posts или branches'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        after = None
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                payload = decode_cursor(cursor)
+                after = (float(payload['s']), int(payload['i']))
+            except (KeyError, TypeError, ValueError):
+                raise ParseError('Неверный курсор')
+        
+        try:
+            page_size = int(request.query_params.get('page_size', self.page_size))
+        except ValueError:
+            page_size = self.page_size
+        page_size = max(1, min(page_size, self.max_page_size))
+        
+        objects, next_position = search(
+            kind, query, request.user, after=after, limit=page_size
+        )
+        
+        next_link = None
+        if next_position is not None:
+            score, last_id = next_position
+            next_link = replace_query_param(
+                request.build_absolute_uri(), 'cursor',
+                encode_cursor({'s': score, 'i': last_id})
+            )
+        
+        serializer = self.serializers[kind](
+            objects, many=True, context={'request': request}
+        )
+        data = {
+            'next': next_link,
+            'page_size': page_size,
+            'results': serializer.data
+        }
+        if kind == 'posts':
+            mark_liked_by_me(request, data)
+        return Response(data)
+
+
+class ExportView(APIView):
+    """
+    Потоковый экспорт веток, постов и лайков текущего пользователя в NDJSON.
+    
+    ?gzip=1 - сжатие на лету, ?after=<type>:<id> - продолжение
+    после последней полученной строки.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        after = request.query_params.get('after')
+        if after:
+            try:
+                after = parse_position(after)
+            except ValueError:
+                return Response(
+                    {'error': 'Параметр after: <type>:<id>'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        response = StreamingHttpResponse(
+            export_stream(request.user, after=after or None, compress=compress),
+            content_type='application/gzip' if compress else 'application/x-ndjson'
+        )
+        filename = f'{request.user.username}.ndjson' + ('.gz' if compress else '')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'no-store'
+        return response
+
+
+class CacheStatsView(APIView):
+    """Счетчики попаданий и промахов кэша ответов"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response(get_stats())
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from branches.models import BranchClosure
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает таблицу замыкания иерархии веток по parent_branch'
+
+    def handle(self, *args, **options):
+        created = BranchClosure.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Таблица замыкания пересобрана: {created} связей'
+        ))
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
+from django.core.exceptions import ValidationError
 
 
 class Branch(models.Model):
@@ -93,10 +96,184 @@ class Branch(models.Model):
     def __str__(self):
         return f"{self.title} ({self.user.username})"
     
+    # Поля, изменения которых требуют обновления производных данных
+    TRACKED_FIELDS = ('is_private', 'parent_branch_id')
+    # Счетчики меняются только дельтами (apply_delta) и пересчетом
+    COUNTERS = ('posts_count', 'subscribers_count')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+    
+    def _remember_state(self):
+        if all(field in self.__dict__ for field in self.TRACKED_FIELDS):
+            self._saved_state = tuple(
+                getattr(self, field) for field in self.TRACKED_FIELDS
+            )
+        else:
+            self._saved_state = None
+    
+    def get_saved_state(self):
+        """(is_private, parent_branch_id) в БД или None для новой ветки"""
+        if self._state.adding or self.pk is None:
+            return None
+        
+        state = getattr(self, '_saved_state', None)
+        if state is None:
+            state = Branch.objects.filter(pk=self.pk).values_list(
+                *self.TRACKED_FIELDS
+            ).first()
+        return state
+    
+    def clean(self):
+        """
+        Валидация иерархии ветки.
+        """
+        self.validate_parent(self.parent_branch_id)
+    
+    def validate_parent(self, parent_branch_id):
+        """Родитель не может быть самой веткой или ее потомком"""
+        if not parent_branch_id or not self.pk:
+            return
+        
+        if BranchClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=parent_branch_id
+        ).exists():
+            raise ValidationError(
+                _('Ветка не может быть вложена в собственную под-ветку')
+            )
+    
+    def save(self, *args, **kwargs):
+        from core.cache import invalidate
+        from posts.models import Post
+        from timeline.models import TimelineMonth
+        from users.models import UserStats
+        
+        adding = self._state.adding
+        previous = self.get_saved_state()
+        moved = previous is not None and previous[1] != self.parent_branch_id
+        if moved:
+            self.clean()
+        
+        if previous is not None and kwargs.get('update_fields') is None:
+            # Счетчики экземпляра могли устареть - полное сохранение
+            # не должно затирать параллельные дельты
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+                and field.attname not in deferred
+            ]
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding or previous is None:
+                UserStats.apply_delta(self.user_id, branches_count=1)
+                BranchClosure.branch_created(self)
+            elif moved:
+                BranchClosure.branch_moved(self)
+            if previous is not None and previous[0] != self.is_private:
+                Post.branch_privacy_changed(self)
+                TimelineMonth.branch_privacy_changed(self)
+            
+            invalidate(users=[self.user_id], branches=[self.pk])
+        self._remember_state()
+    
+    def delete(self, *args, **kwargs):
+        from django.db.models import Count
+        from core.cache import invalidate
+        from subscriptions.models import Subscription
+        from users.models import UserStats
+        
+        with transaction.atomic():
+            # Под-ветки становятся корневыми (SET_NULL) - отрываем их
+            # поддеревья от предков удаляемой ветки
+            BranchClosure.detach_subtree(self)
+            
+            # Посты и подписки удаляются каскадом, минуя свои delete()
+            published = self.posts.filter(is_draft=False).count()
+            followers = list(
+                Subscription.objects.filter(target_branch=self).order_by().values(
+                    'subscriber_id'
+                ).annotate(count=Count('id')).values_list('subscriber_id', 'count')
+            )
+            
+            result = super().delete(*args, **kwargs)
+            
+            UserStats.apply_delta(
+                self.user_id,
+                branches_count=-1,
+                posts_count=-published,
+                followers_count=-sum(count for _, count in followers)
+            )
+            for subscriber_id, count in followers:
+                UserStats.apply_delta(subscriber_id, following_count=-count)
+            
+            invalidate(users=[self.user_id], branches=[self.pk])
+        return result
+    
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('branches:detail', kwargs={'pk': self.pk})
     
+    def get_ancestors(self):
+        """Цепочка предков от корня к родителю одним запросом"""
+        return Branch.objects.filter(
+            descendant_links__descendant=self,
+            descendant_links__depth__gt=0
+        ).order_by('-descendant_links__depth')
+    
+    def get_descendants(self, include_self=True):
+        """Все под-ветки на любой глубине одним запросом"""
+        min_depth = 0 if include_self else 1
+        return Branch.objects.filter(
+            ancestor_links__ancestor=self,
+            ancestor_links__depth__gte=min_depth
+        )
+    
+    def get_subtree_posts(self):
+        """Посты ветки и всех ее под-веток одним запросом"""
+        from posts.models import Post
+        
+        return Post.objects.filter(branch__ancestor_links__ancestor=self)
+    
+    @classmethod
+    def apply_delta(cls, branch_id, **deltas):
+        """
+        Изменение счетчиков ветки атомарным UPDATE, например posts_count=1.
+        
+        Уменьшение не опускает счетчик ниже нуля: разошедшийся счетчик
+        исправит сверка, а не CHECK-ограничение с ошибкой записи.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas or branch_id is None:
+            return
+        
+        cls.objects.filter(pk=branch_id).update(**{
+            field: F(field) + delta if delta > 0 else Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        })
+    
+    @classmethod
+    def post_saved(cls, current, previous=None):
+        """
+        Учет постов ветки (включая черновики); состояния как у Post.get_tracked_state().
+        """
+        if previous is not None and previous[1] == current[1]:
+            return
+        if previous is not None:
+            cls.apply_delta(previous[1], posts_count=-1)
+        cls.apply_delta(current[1], posts_count=1)
+    
+    @classmethod
+    def counters_refreshed(cls, changed, missing):
+        """После фонового пересчета (core.tasks.refresh_counters)"""
+        from core.cache import invalidate
+        
+        invalidate(branches=changed)
+    
     def update_counts(self):
         """Обновление счетчиков ветки"""
         from posts.models import Post
@@ -122,4 +299,112 @@ class Branch(models.Model):
         if user.is_authenticated:
             return user == self.user or user.is_staff
         
-        return False
\ No newline at end of file
+        return False
+
+
+class BranchClosure(models.Model):
+    """
+    Таблица замыкания иерархии веток.
+    
+    Для каждой пары (предок, потомок) хранится расстояние depth,
+    включая пару (ветка, ветка) с depth=0. Поддерево, цепочка предков
+    и посты поддерева выбираются одним запросом вне зависимости от глубины.
+    """
+    ancestor = models.ForeignKey(
+        Branch,
+        on_delete=models.CASCADE,
+        related_name='descendant_links',
+        verbose_name=_('предок')
+    )
+    
+    descendant = models.ForeignKey(
+        Branch,
+        on_delete=models.CASCADE,
+        related_name='ancestor_links',
+        verbose_name=_('потомок')
+    )
+    
+    depth = models.PositiveIntegerField(_('глубина'))
+    
+    class Meta:
+        verbose_name = _('связь веток')
+        verbose_name_plural = _('связи веток')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ancestor', 'descendant'],
+                name='unique_branch_closure'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
+    
+    @classmethod
+    def branch_created(cls, branch):
+        """Связи новой ветки: с собой и с предками родителя"""
+        links = [cls(ancestor_id=branch.pk, descendant_id=branch.pk, depth=0)]
+        if branch.parent_branch_id:
+            links += [
+                cls(ancestor_id=ancestor_id, descendant_id=branch.pk, depth=depth + 1)
+                for ancestor_id, depth in cls.objects.filter(
+                    descendant_id=branch.parent_branch_id
+                ).values_list('ancestor_id', 'depth')
+            ]
+        cls.objects.bulk_create(links)
+    
+    @classmethod
+    def detach_subtree(cls, branch):
+        """Удаление связей поддерева ветки с ее предками"""
+        subtree = cls.objects.filter(ancestor_id=branch.pk).values('descendant_id')
+        cls.objects.filter(
+            descendant_id__in=subtree
+        ).exclude(
+            ancestor_id__in=subtree
+        ).delete()
+    
+    @classmethod
+    def branch_moved(cls, branch):
+        """Перенос поддерева ветки под нового родителя"""
+        cls.detach_subtree(branch)
+        if not branch.parent_branch_id:
+            return
+        
+        subtree = list(cls.objects.filter(
+            ancestor_id=branch.pk
+        ).values_list('descendant_id', 'depth'))
+        ancestors = list(cls.objects.filter(
+            descendant_id=branch.parent_branch_id
+        ).values_list('ancestor_id', 'depth'))
+        
+        cls.objects.bulk_create([
+            cls(
+                ancestor_id=ancestor_id,
+                descendant_id=descendant_id,
+                depth=ancestor_depth + descendant_depth + 1
+            )
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, descendant_depth in subtree
+        ], batch_size=1000)
+    
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """Полная пересборка таблицы по parent_branch"""
+        parents = dict(Branch.objects.values_list('pk', 'parent_branch_id'))
+        
+        links = []
+        for branch_id in parents:
+            ancestor_id, depth, seen = branch_id, 0, set()
+            while ancestor_id is not None and ancestor_id not in seen:
+                seen.add(ancestor_id)
+                links.append(cls(
+                    ancestor_id=ancestor_id, descendant_id=branch_id, depth=depth
+                ))
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(links, batch_size=batch_size)
+        return len(links)
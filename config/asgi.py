@@ -0,0 +1,19 @@
+"""
+ASGI config for Knowledge Map project.
+
+Запуск: uvicorn config.asgi:application --workers 4
+Асинхронные эндпоинты - в api/async_views.py, синхронные
+представления Django выполняет в пуле потоков.
+"""
+import os
+
+from django.core.asgi import get_asgi_application
+
+# Синхронный код каждого запроса ASGI выполняется в своем потоке
+# sync_to_async, и постоянное соединение этого потока больше не
+# переиспользуется, а копится до CONN_MAX_AGE. Под ASGI соединения
+# закрываются в конце запроса
+os.environ['DB_CONN_MAX_AGE'] = '0'
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+application = get_asgi_application()
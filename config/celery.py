@@ -0,0 +1,18 @@
+"""
+Celery для фоновых задач Knowledge Map.
+
+Запуск воркера: celery -A config worker -l info
+
+Настройки берутся из settings с префиксом CELERY_. Без брокера
+(CELERY_TASK_ALWAYS_EAGER) задачи выполняются сразу в процессе,
+который их поставил, - так работают тесты и локальный запуск.
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('config')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
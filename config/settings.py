@@ -4,6 +4,8 @@ Django settings for Knowledge Map project.
 import os
 from pathlib import Path
 
+from .database import parse_database_url
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Простые настройки для разработки
@@ -25,6 +27,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы учитывать SQL и время всех остальных слоев
+    'core.metrics.QueryMetricsMiddleware',
+    # До SessionMiddleware: сохранение сессии - запись, закрепляющая клиента
+    'core.routing.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,14 +59,53 @@ TEMPLATES = [
     },
 ]
 
-# База данных SQLite (для простоты)
+# Параметры соединений основной базы и реплик
+DATABASE_CONNECTION = {
+    # Соединение переживает запрос и переиспользуется потоком: установка
+    # (TCP, TLS, аутентификация) не входит во время ответа. Под ASGI
+    # всегда 0 (config/asgi.py)
+    'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+    # Переиспользуемое соединение проверяется в начале запроса, разорванное
+    # (рестарт БД или пулера) открывается заново вместо ошибки 500
+    'CONN_HEALTH_CHECKS': True,
+    # За пулером в режиме transaction (PgBouncer) курсор iterator() может
+    # попасть на другое серверное соединение - серверные курсоры отключаются,
+    # и iterator() читает результат целиком. Экспорт поэтому читает пачками
+    # по id, окно шкалы ограничено MAX_RANGE_DAYS постов одного автора
+    'DISABLE_SERVER_SIDE_CURSORS': os.environ.get(
+        'DB_TRANSACTION_POOLING', 'false'
+    ).lower() in ('1', 'true', 'yes'),
+}
+
+# База данных из DATABASE_URL (PostgreSQL в docker-compose), без него - SQLite.
+# Размер пулов на воркер - в README, раздел "Соединения с базой данных"
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': parse_database_url(
+        os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'),
+        base_dir=BASE_DIR, **DATABASE_CONNECTION
+    )
 }
 
+# Реплики только для чтения (core.routing): адреса через запятую,
+# алиасы replica, replica_2, ... В тестах реплики - зеркала default
+DATABASE_REPLICAS = []
+for number, url in enumerate(
+    filter(None, map(str.strip, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))), 1
+):
+    alias = 'replica' if number == 1 else f'replica_{number}'
+    DATABASES[alias] = parse_database_url(
+        url, base_dir=BASE_DIR, TEST={'MIRROR': 'default'}, **DATABASE_CONNECTION
+    )
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['core.routing.PrimaryReplicaRouter']
+# Клиент после записи читает из default столько секунд
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+# Реплика проверяется не чаще раза в столько секунд
+REPLICA_CHECK_INTERVAL = int(os.environ.get('REPLICA_CHECK_INTERVAL', 10))
+# Реплика, отставшая сильнее (секунд), пропускается
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+
 # Валидация паролей
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -109,3 +154,75 @@ LOGGING = {
         'level': 'INFO',
     },
 }
+
+# Redis (лента, кэш, очереди)
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+# Кэш: Redis в продакшене (задан REDIS_URL), иначе память процесса
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'knowledge-map',
+        }
+    }
+
+# Время жизни закэшированных ответов (инвалидация - через версии)
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Лента подписок (fan-out on write)
+FEED_BACKEND = os.environ.get('FEED_BACKEND', 'subscriptions.feed.DatabaseFeedBackend')
+# Аккаунты и ветки с большим числом подписчиков читаются при построении ленты
+FEED_FANOUT_LIMIT = int(os.environ.get('FEED_FANOUT_LIMIT', 10000))
+# Длина входящих в Redis
+FEED_MAX_LENGTH = 1000
+
+# Фоновые задачи (Celery, core.tasks). Без брокера (REDIS_URL или
+# CELERY_BROKER_URL не заданы) задачи выполняются сразу при фиксации
+# транзакции в том же процессе - для тестов и локального запуска
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = os.environ.get(
+    'CELERY_TASK_ALWAYS_EAGER',
+    'false' if {'CELERY_BROKER_URL', 'REDIS_URL'} & set(os.environ) else 'true'
+).lower() in ('1', 'true', 'yes')
+CELERY_TASK_EAGER_PROPAGATES = True
+# Задачи идемпотентны: повторная доставка после падения воркера безопасна
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_IGNORE_RESULT = True
+# Задержка запуска задачи, секунд: записи за это время сливаются в одну задачу
+TASK_BATCH_DELAY = float(os.environ.get('TASK_BATCH_DELAY', 1))
+# Наибольшее число id в одной задаче
+TASK_BATCH_SIZE = 500
+# Сколько живет отметка "уже в очереди", если воркер так и не взял задачу
+TASK_DEDUP_TIMEOUT = 10 * 60
+# Периодическая сверка счетчиков (celery beat): исправляет расхождения
+# после каскадных удалений и массовых операций, секунд между запусками
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-counters': {
+        'task': 'core.tasks.reconcile_all_counters',
+        'schedule': float(os.environ.get('COUNTER_RECONCILE_INTERVAL', 6 * 60 * 60)),
+    },
+}
+# Пауза между диапазонами id при сверке, секунд
+COUNTER_RECONCILE_PAUSE = 0.1
+
+# Инструментирование запросов (core.metrics)
+# Повторов одного SQL за запрос, после которых он считается N+1
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 5))
+# Сколько самых медленных запросов писать в журнал
+METRICS_SLOWEST_QUERIES = 3
+# Запросы дольше порога пишутся в журнал с самым медленным SQL
+METRICS_SLOW_REQUEST_MS = int(os.environ.get('METRICS_SLOW_REQUEST_MS', 500))
+# Токен для /metrics/; без него метрики доступны только персоналу
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
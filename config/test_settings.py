@@ -0,0 +1,45 @@
+"""
+Настройки для pytest: все приложения API и тестовая SQLite в файле.
+
+Файл, а не память: тесты с потоками (параллельные лайки) открывают
+по соединению на поток, и все они должны видеть одну базу.
+"""
+import tempfile
+from pathlib import Path
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS
+
+
+INSTALLED_APPS = INSTALLED_APPS + [
+    'rest_framework',
+    'django_filters',
+    'branches',
+    'posts',
+    'likes',
+    'subscriptions',
+    'timeline',
+    'core',
+    'api',
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': Path(tempfile.gettempdir()) / 'knowledge_map.sqlite3',
+        # Параллельные транзакции ждут блокировку, а не падают сразу
+        'OPTIONS': {'timeout': 30},
+        'TEST': {'NAME': str(Path(tempfile.gettempdir()) / 'test_knowledge_map.sqlite3')},
+    }
+}
+DATABASE_REPLICAS = []
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'knowledge-map-tests',
+    }
+}
+CELERY_TASK_ALWAYS_EAGER = True
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -5,6 +5,8 @@ from django.contrib import admin
 from django.urls import path
 from django.http import HttpResponse
 
+from core.metrics import metrics_view
+
 def home(request):
     return HttpResponse("""
     <!DOCTYPE html>
@@ -60,5 +62,6 @@ def home(request):
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics/', metrics_view, name='metrics'),
     path('', home, name='home'),
 ]
@@ -0,0 +1,80 @@
+"""
+Общие фикстуры pytest.
+
+Настройки - config.test_settings; тестовая база создается один раз
+на сессию так же, как manage.py migrate (с сигналом post_migrate).
+"""
+import os
+
+import pytest
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.test_settings')
+
+
+@pytest.fixture(scope='session')
+def django_db():
+    """Тестовая база на всю сессию"""
+    import django
+    from django.test.utils import (
+        setup_databases, setup_test_environment, teardown_databases,
+        teardown_test_environment
+    )
+
+    django.setup()
+    setup_test_environment()
+    databases = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(databases, verbosity=0)
+        teardown_test_environment()
+
+
+@pytest.fixture
+def make_user(django_db):
+    """Фабрика пользователей с уникальными именами; удаляются после теста"""
+    import uuid
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    created = []
+
+    def make(**fields):
+        user = User.objects.create_user(
+            username=f'test_{uuid.uuid4().hex[:12]}', password='pass', **fields
+        )
+        created.append(user.pk)
+        return user
+
+    yield make
+    User.objects.filter(pk__in=created).delete()
+
+
+@pytest.fixture
+def make_post(django_db):
+    """Фабрика постов; без ветки создается новая ветка автора"""
+    import datetime
+    import uuid
+    from branches.models import Branch
+    from posts.models import Post
+
+    def make(user, branch=None, **fields):
+        if branch is None:
+            branch = Branch.objects.create(user=user, title=f'Ветка {uuid.uuid4().hex[:8]}')
+        fields.setdefault('title', 'Пост')
+        fields.setdefault('content', 'Текст')
+        fields.setdefault('event_date', datetime.date(2020, 1, 1))
+        return Post.objects.create(user=user, branch=branch, **fields)
+
+    return make
+
+
+@pytest.fixture
+def api(django_db):
+    """APIClient с маршрутами api.urls"""
+    from django.test.utils import override_settings
+    from rest_framework.test import APIClient
+
+    with override_settings(ROOT_URLCONF='api.urls'):
+        yield APIClient()
@@ -5,3 +5,23 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Core'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+
+        # У core нет моделей - post_migrate для него не отправляется,
+        # поэтому слушаем сигналы приложений с индексируемыми таблицами
+        post_migrate.connect(
+            install_search_indexes_after_migrate,
+            dispatch_uid='core.install_search_indexes'
+        )
+
+
+def install_search_indexes_after_migrate(app_config, using, **kwargs):
+    """Индексы полнотекстового поиска для новых и существующих таблиц"""
+    from django.db import connections
+    from .search import BACKENDS, SEARCH_INDEXES, install_search_indexes
+
+    labels = {model_label.split('.')[0] for model_label, _, _ in SEARCH_INDEXES.values()}
+    if app_config.label in labels and connections[using].vendor in BACKENDS:
+        install_search_indexes(using=using)
@@ -0,0 +1,209 @@
+"""
+Версионированный кэш ответов.
+
+У каждого пользователя и каждой ветки есть счетчик версии. Ключ ответа
+включает текущие версии, поэтому запись (Post, Branch, Like, Subscription)
+инвалидирует все зависимые ответы одним инкрементом, без поиска ключей.
+Устаревшие записи просто перестают запрашиваться и вытесняются по TTL.
+
+Те же версии служат валидаторами условных GET: ETag строится из версий,
+Last-Modified - из времени последнего инкремента.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+VERSION_PREFIX = 'ver'
+CHANGED_PREFIX = 'changed'
+RESPONSE_PREFIX = 'resp'
+STATS_KEYS = {
+    'hits': 'resp-stats:hits',
+    'misses': 'resp-stats:misses',
+}
+
+
+def _version_key(scope, obj_id):
+    return f'{VERSION_PREFIX}:{scope}:{obj_id}'
+
+
+def _changed_key(scope, obj_id):
+    return f'{CHANGED_PREFIX}:{scope}:{obj_id}'
+
+
+def _initial_version():
+    # После вытеснения счетчика версия не должна повториться,
+    # поэтому начальное значение берем от времени
+    return time.time_ns() // 1000
+
+
+def get_versions(*keys):
+    """
+    Текущие версии для пар (scope, id), например ('user', 1).
+    """
+    version_keys = [_version_key(scope, obj_id) for scope, obj_id in keys]
+    versions = cache.get_many(version_keys)
+
+    for key in version_keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+
+    return tuple(versions[key] for key in version_keys)
+
+
+async def aget_versions(*keys):
+    """get_versions() для async-представлений"""
+    version_keys = [_version_key(scope, obj_id) for scope, obj_id in keys]
+    versions = await cache.aget_many(version_keys)
+
+    for key in version_keys:
+        if key not in versions:
+            await cache.aadd(key, _initial_version(), timeout=None)
+            versions[key] = await cache.aget(key)
+
+    return tuple(versions[key] for key in version_keys)
+
+
+def bump(scope, obj_id):
+    key = _version_key(scope, obj_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=None)
+    cache.set(_changed_key(scope, obj_id), int(time.time()), timeout=None)
+
+
+def get_last_modified(*keys):
+    """
+    Время последнего изменения (unix-время) для пар (scope, id)
+    или None, если изменений с момента запуска кэша не было.
+    """
+    changed = cache.get_many([_changed_key(scope, obj_id) for scope, obj_id in keys])
+    return max(changed.values(), default=None)
+
+
+async def aget_last_modified(*keys):
+    changed = await cache.aget_many([_changed_key(scope, obj_id) for scope, obj_id in keys])
+    return max(changed.values(), default=None)
+
+
+def make_etag(name, versions, viewer):
+    """ETag ответа: имя эндпоинта, область видимости и версии"""
+    return '"{}:{}:{}"'.format(
+        name, viewer, '.'.join(str(version) for version in versions)
+    )
+
+
+def invalidate(users=(), branches=()):
+    """
+    Инкремент версий после фиксации транзакции, чтобы параллельный
+    запрос не закэшировал данные, которые еще не видны.
+    """
+    keys = {('user', pk) for pk in users if pk is not None}
+    keys |= {('branch', pk) for pk in branches if pk is not None}
+    if not keys:
+        return
+
+    def bump_all():
+        for scope, obj_id in keys:
+            bump(scope, obj_id)
+
+    transaction.on_commit(bump_all)
+
+
+def get_viewer_scope(request, owner_id):
+    """Владелец видит приватные данные - его ответы кэшируются отдельно"""
+    user = request.user
+    if user.is_authenticated and user.pk == owner_id:
+        return 'owner'
+    return 'public'
+
+
+def get_etag_viewer(request, viewer):
+    """
+    Область ETag: данные кэшируются общими для viewer, но флаги зрителя
+    (liked_by_me) у каждого пользователя свои - 304 только ему же.
+    """
+    user = request.user
+    if user.is_authenticated:
+        return f'{viewer}:{user.pk}'
+    return viewer
+
+
+def _count(name):
+    key = STATS_KEYS[name]
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+async def _acount(name):
+    key = STATS_KEYS[name]
+    if not await cache.aadd(key, 1, timeout=None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            await cache.aset(key, 1, timeout=None)
+
+
+def _response_key(request, name, versions, viewer):
+    query = request.GET.urlencode()
+    digest = hashlib.md5(query.encode(), usedforsecurity=False).hexdigest()
+    return ':'.join([
+        RESPONSE_PREFIX, name, viewer,
+        '.'.join(str(version) for version in versions), digest
+    ])
+
+
+def cached_response_data(request, name, versions, viewer, build):
+    """
+    Данные ответа из кэша или build() с сохранением.
+
+    name - имя эндпоинта, versions - результат get_versions(),
+    viewer - результат get_viewer_scope(). Параметры запроса
+    (страница, курсор, поля) входят в ключ.
+    """
+    key = _response_key(request, name, versions, viewer)
+
+    data = cache.get(key)
+    if data is not None:
+        _count('hits')
+        return data
+
+    _count('misses')
+    data = build()
+    cache.set(key, data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    return data
+
+
+async def acached_response_data(request, name, versions, viewer, build):
+    """cached_response_data() с корутиной build"""
+    key = _response_key(request, name, versions, viewer)
+
+    data = await cache.aget(key)
+    if data is not None:
+        await _acount('hits')
+        return data
+
+    await _acount('misses')
+    data = await build()
+    await cache.aset(key, data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    return data
+
+
+def get_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    hits = values.get(STATS_KEYS['hits'], 0)
+    misses = values.get(STATS_KEYS['misses'], 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
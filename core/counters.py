@@ -0,0 +1,219 @@
+"""
+Сверка денормализованных счетчиков с исходными таблицами.
+
+Счетчики поддерживаются F() дельтами при записи, но каскадные удаления,
+массовые операции и ручные правки в БД обходят save()/delete(), и
+значения расходятся. reconcile() пересчитывает счетчики GROUP BY по
+диапазонам первичного ключа (chunk_size id за раз) и переписывает
+только строки с расхождением.
+
+Запись условная: UPDATE ... WHERE pk = %s AND <счетчик> = <прочитанное
+значение>. Если за время сверки счетчик изменила параллельная запись,
+строка пропускается и будет исправлена следующим запуском - так
+сверка не затирает свежие дельты и не держит блокировок дольше
+одного диапазона.
+
+Счетчики подписок не меняются дельтами в запросе: после записи
+core.tasks.refresh_counters пересчитывает их тем же кодом (reconcile_ids)
+для затронутых строк. Полная сверка запускается периодически
+(core.tasks.reconcile_all_counters) и командой reconcile_counters.
+"""
+import time
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, Q
+
+
+# Сверяемая модель -> {счетчик: ((модель источника, поле id цели, фильтр), ...)}
+# Значение счетчика - сумма COUNT(*) по всем источникам
+COUNTERS = {
+    'posts.Post': {
+        'likes_count': (
+            ('likes.Like', 'post_id', None),
+        ),
+    },
+    'branches.Branch': {
+        'posts_count': (
+            ('posts.Post', 'branch_id', None),
+        ),
+        'subscribers_count': (
+            ('subscriptions.Subscription', 'target_branch_id', None),
+        ),
+    },
+    'users.UserStats': {
+        'followers_count': (
+            ('subscriptions.Subscription', 'target_user_id', Q(target_branch__isnull=True)),
+            ('subscriptions.Subscription', 'target_branch__user_id', None),
+        ),
+        'following_count': (
+            ('subscriptions.Subscription', 'subscriber_id', None),
+        ),
+        'branches_count': (
+            ('branches.Branch', 'user_id', None),
+        ),
+        'posts_count': (
+            ('posts.Post', 'user_id', Q(is_draft=False)),
+        ),
+    },
+}
+
+CHUNK_SIZE = 10000
+
+
+class CounterDrift:
+    """Итог сверки одного счетчика"""
+
+    def __init__(self, model_label, field):
+        self.model_label = model_label
+        self.field = field
+        self.checked = 0
+        self.drifted = 0
+        self.fixed = 0
+        self.skipped = 0
+        self.total_drift = 0
+        self.max_drift = 0
+
+    @property
+    def name(self):
+        return f'{self.model_label}.{self.field}'
+
+    def as_dict(self):
+        return {
+            'counter': self.name,
+            'checked': self.checked,
+            'drifted': self.drifted,
+            'fixed': self.fixed,
+            'skipped': self.skipped,
+            'total_drift': self.total_drift,
+            'max_drift': self.max_drift,
+        }
+
+
+def count_sources(sources, **bounds):
+    """
+    {id цели: сумма} по источникам.
+
+    bounds - условия на id цели: gte=/lt= для диапазона или in= для списка.
+    """
+    totals = {}
+    for model_label, target_field, condition in sources:
+        rows = apps.get_model(model_label).objects.filter(**{
+            f'{target_field}__{lookup}': value for lookup, value in bounds.items()
+        })
+        if condition is not None:
+            rows = rows.filter(condition)
+        for target_id, count in rows.order_by().values(target_field).annotate(
+            count=Count('pk')
+        ).values_list(target_field, 'count'):
+            totals[target_id] = totals.get(target_id, 0) + count
+    return totals
+
+
+def reconcile_rows(model, counters, report, dry_run=False, **bounds):
+    """
+    Сверка строк модели с pk, подходящими под bounds (как у count_sources).
+
+    Возвращает множества pk: исправленные, пропущенные из-за параллельной
+    записи и все найденные строки.
+    """
+    fields = list(counters)
+    # Сначала текущие значения, затем пересчет: запись между двумя чтениями
+    # меняет счетчик, и условный UPDATE ниже ее не затрет
+    current = {
+        row[0]: row[1:]
+        for row in model.objects.filter(**{
+            f'pk__{lookup}': value for lookup, value in bounds.items()
+        }).values_list('pk', *fields)
+    }
+    fixed, skipped = set(), set()
+    if not current:
+        return fixed, skipped, set()
+
+    expected = {
+        field: count_sources(sources, **bounds) for field, sources in counters.items()
+    }
+
+    with transaction.atomic():
+        for pk, values in current.items():
+            observed, changes = {}, {}
+            for field, value in zip(fields, values):
+                drift = report[field]
+                drift.checked += 1
+                target = expected[field].get(pk, 0)
+                if value == target:
+                    continue
+                drift.drifted += 1
+                drift.total_drift += abs(target - value)
+                drift.max_drift = max(drift.max_drift, abs(target - value))
+                observed[field] = value
+                changes[field] = target
+
+            if not changes or dry_run:
+                continue
+
+            updated = model.objects.filter(pk=pk, **observed).update(**changes)
+            for field in changes:
+                if updated:
+                    report[field].fixed += 1
+                else:
+                    report[field].skipped += 1
+            (fixed if updated else skipped).add(pk)
+
+    return fixed, skipped, set(current)
+
+
+def reconcile_range(model, counters, start, end, report, dry_run=False):
+    """Сверка строк модели с pk в [start, end)"""
+    return reconcile_rows(model, counters, report, dry_run, gte=start, lt=end)
+
+
+def reconcile_ids(model_label, ids, fields=None):
+    """
+    Пересчет счетчиков fields (по умолчанию всех) у строк с pk из ids.
+
+    Используется фоновыми задачами после записей; возвращает
+    (исправленные, пропущенные, отсутствующие в таблице) pk.
+    """
+    counters = COUNTERS[model_label]
+    if fields:
+        counters = {field: counters[field] for field in fields}
+    report = {field: CounterDrift(model_label, field) for field in counters}
+    ids = set(ids)
+    # in - ключевое слово, поэтому условие передается словарем
+    fixed, skipped, found = reconcile_rows(
+        apps.get_model(model_label), counters, report, **{'in': list(ids)}
+    )
+    return fixed, skipped, ids - found
+
+
+def reconcile(models=None, chunk_size=CHUNK_SIZE, dry_run=False, pause=0, progress=None):
+    """
+    Сверка счетчиков моделей из COUNTERS (все или перечисленные в models).
+
+    Каждый диапазон id - отдельная короткая транзакция; pause - пауза
+    между диапазонами в секундах, чтобы не нагружать БД. Возвращает
+    список CounterDrift.
+    """
+    results = []
+    for model_label, counters in COUNTERS.items():
+        if models and model_label not in models:
+            continue
+
+        model = apps.get_model(model_label)
+        report = {field: CounterDrift(model_label, field) for field in counters}
+        results.extend(report.values())
+
+        bounds = model.objects.order_by('pk').values_list('pk', flat=True)
+        first, last = bounds.first(), bounds.last()
+        if first is None:
+            continue
+
+        for start in range(first, last + 1, chunk_size):
+            reconcile_range(model, counters, start, start + chunk_size, report, dry_run)
+            if progress:
+                progress(model_label, min(start + chunk_size - 1, last), last)
+            if pause:
+                time.sleep(pause)
+
+    return results
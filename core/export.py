@@ -0,0 +1,105 @@
+"""
+Потоковый экспорт карты знаний пользователя в NDJSON.
+
+Каждая строка - объект с полями type и id:
+    {"type": "branch", "id": 1, "title": "...", ...}
+    {"type": "post", "id": 7, "branch_id": 1, "title": "...", ...}
+    {"type": "like", "id": 3, "post_id": 7, "created_at": "..."}
+
+Разделы идут в порядке SECTIONS, строки внутри раздела - по возрастанию id.
+Строки читаются пачками по chunk_size (WHERE id > последний прочитанный),
+поэтому память не зависит от размера аккаунта и без серверных курсоров -
+за пулером в режиме transaction они отключены, и iterator() загрузил бы
+весь результат. Экспорт продолжается с позиции "<type>:<id>" последней
+полученной строки (параметр after).
+"""
+import zlib
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# (type, модель, поле владельца, выгружаемые поля)
+SECTIONS = (
+    ('branch', 'branches.Branch', 'user', (
+        'id', 'parent_branch_id', 'title', 'color', 'description',
+        'is_private', 'created_at', 'updated_at',
+    )),
+    ('post', 'posts.Post', 'user', (
+        'id', 'branch_id', 'title', 'content', 'event_date', 'post_type',
+        'is_draft', 'created_at', 'updated_at',
+    )),
+    ('like', 'likes.Like', 'user', (
+        'id', 'post_id', 'created_at',
+    )),
+)
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+
+def parse_position(value):
+    """
+    Позиция "<type>:<id>" -> (type, id); ValueError при неверном формате.
+    """
+    kind, _, obj_id = value.partition(':')
+    if kind not in {section[0] for section in SECTIONS}:
+        raise ValueError(f'Неизвестный тип в позиции: {kind}')
+    return kind, int(obj_id)
+
+
+def export_lines(user, after=None, chunk_size=CHUNK_SIZE):
+    """Строки NDJSON (с переводом строки) после позиции after"""
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    kinds = [section[0] for section in SECTIONS]
+    start = kinds.index(after[0]) if after else 0
+
+    for index, (kind, model_label, owner_field, fields) in enumerate(SECTIONS):
+        if index < start:
+            continue
+
+        rows = apps.get_model(model_label).objects.filter(
+            **{owner_field: user}
+        ).order_by('pk').values(*fields)
+        last_id = after[1] if after and index == start else None
+
+        while True:
+            batch = rows if last_id is None else rows.filter(pk__gt=last_id)
+            batch = list(batch[:chunk_size])
+            for row in batch:
+                yield encoder.encode({'type': kind, **row}) + '\n'
+            if len(batch) < chunk_size:
+                break
+            last_id = batch[-1]['id']
+
+
+def export_stream(user, after=None, compress=False, chunk_size=CHUNK_SIZE,
+                  buffer_size=BUFFER_SIZE):
+    """
+    Байтовые блоки экспорта для StreamingHttpResponse или файла.
+
+    compress=True - gzip на лету; каждый поток (в том числе
+    продолженный с after) - самостоятельный gzip-файл.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = []
+    size = 0
+
+    def flush():
+        data = ''.join(buffer).encode()
+        return compressor.compress(data) if compressor else data
+
+    for line in export_lines(user, after=after, chunk_size=chunk_size):
+        buffer.append(line)
+        size += len(line)
+        if size >= buffer_size:
+            data = flush()
+            buffer, size = [], 0
+            if data:
+                yield data
+
+    data = flush()
+    if compressor:
+        data += compressor.flush()
+    if data:
+        yield data
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import math
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность синхронных и асинхронных '
+        'эндпоинтов под ASGI при большом числе одновременных запросов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Чью временную шкалу и ветки читать (по умолчанию - самый активный автор)'
+        )
+        parser.add_argument('--requests', type=int, default=1000, help='Запросов на эндпоинт')
+        parser.add_argument('--concurrency', type=int, default=100, help='Одновременных запросов')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Без кэша ответов (DummyCache): каждый запрос читает БД'
+        )
+        parser.add_argument(
+            '--urlconf', default='api.urls',
+            help='URLconf, в котором подключены эндпоинты API'
+        )
+
+    def handle(self, *args, **options):
+        owner = self.get_user(options['user'])
+        viewer = User.objects.exclude(pk=owner.pk).order_by('pk').first() or owner
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.create_session(viewer)}'
+
+        username = owner.username
+        pairs = [
+            ('timeline', f'/timeline/{username}/', f'/async/timeline/{username}/'),
+            ('user branches', f'/users/{username}/branches/', f'/async/users/{username}/branches/'),
+            ('posts', '/posts/?pagination=cursor', '/async/posts/'),
+        ]
+
+        overrides = {'ROOT_URLCONF': options['urlconf']}
+        if options['cold']:
+            overrides['CACHES'] = {
+                'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+            }
+
+        self.stdout.write(
+            f"{options['requests']} запросов на эндпоинт, одновременно {options['concurrency']}"
+            f"{', без кэша' if options['cold'] else ''}"
+        )
+        self.stdout.write(
+            f'{"эндпоинт":<16}{"режим":<7}{"запр./с":>10}{"p50, мс":>10}{"p99, мс":>10}{"ошибки":>8}'
+        )
+        # Под нагрузкой почти каждый запрос медленный - не засоряем вывод
+        metrics_logger = logging.getLogger('core.metrics')
+        level = metrics_logger.level
+        metrics_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(**overrides):
+                application = get_asgi_application()
+                for name, sync_path, async_path in pairs:
+                    for mode, path in (('sync', sync_path), ('async', async_path)):
+                        self.report(name, mode, application, path, cookie, options)
+        finally:
+            metrics_logger.setLevel(level)
+
+    def report(self, name, mode, application, path, cookie, options):
+        # asyncio.run, а не async_to_sync: внутри async_to_sync все
+        # thread-sensitive вызовы ушли бы в главный поток, а сервер дает
+        # каждому запросу свой поток
+        throughput, p50, p99, errors = asyncio.run(self.run_load(
+            application, path, cookie, options['requests'], options['concurrency']
+        ))
+        self.stdout.write(
+            f'{name:<16}{mode:<7}{throughput:>10.1f}{p50:>10.1f}{p99:>10.1f}{errors:>8}'
+        )
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+
+        user = User.objects.order_by('-stats__posts_count', 'pk').first()
+        if user is None:
+            raise CommandError('Нет данных: сначала выполните create_sample_data')
+        return user
+
+    def create_session(self, user):
+        from importlib import import_module
+
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store[SESSION_KEY] = str(user.pk)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        return store.session_key
+
+    async def run_load(self, application, path, cookie, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        timings, errors = [], 0
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                status = await self.request(application, path, cookie)
+                timings.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    errors += 1
+
+        # Прогрев: импорты, соединение с БД, кэш
+        await self.request(application, path, cookie)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        return (
+            total / elapsed,
+            timings[max(0, math.ceil(0.5 * total) - 1)],
+            timings[max(0, math.ceil(0.99 * total) - 1)],
+            errors,
+        )
+
+    async def request(self, application, path, cookie):
+        """Один GET через ASGI-приложение, как его вызвал бы сервер"""
+        url = urlsplit(path)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': url.path,
+            'raw_path': url.path.encode(),
+            'query_string': url.query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        disconnect = asyncio.Event()
+        received = False
+        status = None
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await application(scope, receive, send)
+        disconnect.set()
+        return status
@@ -0,0 +1,197 @@
+import io
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает задержку запросов под WSGI с новым соединением с БД '
+        'на каждый запрос (CONN_MAX_AGE=0) и с постоянными соединениями'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Чей профиль читать (по умолчанию - самый активный автор)'
+        )
+        parser.add_argument('--path', help='Запрашиваемый путь вместо профиля')
+        parser.add_argument('--requests', type=int, default=2000, help='Запросов в каждом режиме')
+        parser.add_argument('--threads', type=int, default=8, help='Потоков, как у воркера gunicorn')
+        parser.add_argument(
+            '--conn-max-age', type=int, default=None,
+            help='CONN_MAX_AGE постоянного режима (по умолчанию - из настроек, не меньше 60)'
+        )
+        parser.add_argument(
+            '--urlconf', default='api.urls',
+            help='URLconf, в котором подключены эндпоинты API'
+        )
+
+    def handle(self, *args, **options):
+        owner = self.get_user(options['user'])
+        viewer = User.objects.exclude(pk=owner.pk).order_by('pk').first() or owner
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.create_session(viewer)}'
+        path = options['path'] or f'/users/{owner.username}/'
+
+        database = connections.settings['default']
+        persistent = options['conn_max_age']
+        if persistent is None:
+            persistent = max(database.get('CONN_MAX_AGE') or 0, 60)
+
+        self.stdout.write(
+            f"{database['ENGINE'].rsplit('.', 1)[-1]}, {path}: {options['requests']} запросов "
+            f"в {options['threads']} потоках, без кэша ответов"
+        )
+        self.stdout.write(
+            f'{"CONN_MAX_AGE":<14}{"запр./с":>10}{"p50, мс":>10}{"p99, мс":>10}'
+            f'{"соединений":>12}{"ошибки":>8}'
+        )
+        # Кэш ответов выключен: каждый запрос обращается к БД
+        overrides = {
+            'ROOT_URLCONF': options['urlconf'],
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        }
+        metrics_logger = logging.getLogger('core.metrics')
+        level = metrics_logger.level
+        metrics_logger.setLevel(logging.ERROR)
+        try:
+            with override_settings(**overrides):
+                application = get_wsgi_application()
+                for conn_max_age in (0, persistent):
+                    self.report(application, path, cookie, conn_max_age, options)
+        finally:
+            metrics_logger.setLevel(level)
+
+    def report(self, application, path, cookie, conn_max_age, options):
+        # settings_dict общий у соединений всех потоков, так что новое
+        # значение видят и соединения, открытые в потоках нагрузки
+        database = connections.settings['default']
+        previous = database.get('CONN_MAX_AGE')
+        database['CONN_MAX_AGE'] = conn_max_age
+        opened = []
+        lock = threading.Lock()
+
+        def created(sender, connection, **kwargs):
+            with lock:
+                opened.append(connection.alias)
+
+        connection_created.connect(created, weak=False, dispatch_uid='bench_connections')
+        try:
+            throughput, p50, p99, errors = self.run_load(
+                application, path, cookie, options['requests'], options['threads']
+            )
+        finally:
+            connection_created.disconnect(dispatch_uid='bench_connections')
+            database['CONN_MAX_AGE'] = previous
+
+        self.stdout.write(
+            f'{conn_max_age:<14}{throughput:>10.1f}{p50:>10.2f}{p99:>10.2f}'
+            f'{len(opened):>12}{errors:>8}'
+        )
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден')
+
+        user = User.objects.order_by('-stats__posts_count', 'pk').first()
+        if user is None:
+            raise CommandError('Нет данных: сначала выполните create_sample_data')
+        return user
+
+    def create_session(self, user):
+        from importlib import import_module
+
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store[SESSION_KEY] = str(user.pk)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        return store.session_key
+
+    def run_load(self, application, path, cookie, total, threads):
+        timings, errors = [], [0]
+        lock = threading.Lock()
+
+        def worker(count):
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    status = self.request(application, path, cookie)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        timings.append(elapsed)
+                        if status != 200:
+                            errors[0] += 1
+            finally:
+                # Поток завершается - постоянные соединения закрываем сами
+                connections.close_all()
+
+        workers = [
+            threading.Thread(target=worker, args=(total // threads + (index < total % threads),))
+            for index in range(threads)
+        ]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        return (
+            total / elapsed,
+            timings[max(0, math.ceil(0.5 * total) - 1)],
+            timings[max(0, math.ceil(0.99 * total) - 1)],
+            errors[0],
+        )
+
+    def request(self, application, path, cookie):
+        """Один GET через WSGI-приложение, как его вызвал бы сервер"""
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': 'testserver',
+            'HTTP_COOKIE': cookie,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        status = []
+
+        def start_response(value, headers, exc_info=None):
+            status.append(int(value.split()[0]))
+
+        response = application(environ, start_response)
+        try:
+            for _ in response:
+                pass
+        finally:
+            # close() отправляет request_finished - по нему Django закрывает
+            # соединения, у которых истек CONN_MAX_AGE (при 0 - сразу)
+            response.close()
+        return status[0]
@@ -0,0 +1,107 @@
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from branches.models import Branch
+from core.search import install_search_indexes, search
+from posts.models import Post
+from users.models import User
+
+
+SYLLABLES = 'ка ли но ра те мо ви са ду ре по ни ло зо ме та ку ся'.split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск через icontains с полнотекстовым индексом '
+        'на сгенерированном корпусе постов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000, help='Размер корпуса')
+        parser.add_argument('--repeat', type=int, default=5, help='Повторов замера')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не откатывать созданные данные'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = self.make_vocabulary(rng, size=20000)
+        # Распределение частот слов по закону Ципфа, как в живом тексте
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+        install_search_indexes()
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            user = self.create_data(
+                rng, words, weights, options['posts'], options['batch_size']
+            )
+            self.stdout.write(
+                f"Корпус: {options['posts']} постов за "
+                f"{time.perf_counter() - started:.1f} с ({connection.vendor})"
+            )
+
+            # Частое, среднее и редкое слово, префикс и фраза из двух слов
+            queries = [
+                words[0], words[100], words[15000],
+                words[200][:4], f'{words[50]} {words[300]}',
+            ]
+            self.stdout.write(f'{"запрос":<24}{"icontains, мс":>16}{"индекс, мс":>14}')
+            for query in queries:
+                scan = self.measure(options['repeat'], lambda: list(
+                    Post.objects.filter(
+                        visibility=Post.Visibility.PUBLIC,
+                        content__icontains=query.split()[0]
+                    ).order_by('-event_date')[:20]
+                ))
+                indexed = self.measure(options['repeat'], lambda: search(
+                    'posts', query, user, limit=20
+                ))
+                self.stdout.write(f'{query:<24}{scan:>16.2f}{indexed:>14.2f}')
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+    def make_vocabulary(self, rng, size):
+        words = set()
+        while len(words) < size:
+            words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 5))))
+        words = sorted(words)
+        rng.shuffle(words)
+        return words
+
+    def create_data(self, rng, words, weights, count, batch_size):
+        # weights - накопленные веса для random.choices
+        user = User.objects.create_user(
+            username='bench_search', password='bench',
+            first_name='Bench', last_name='User', bio='Пользователь для замеров'
+        )
+        branch = Branch.objects.create(user=user, title='Поиск')
+
+        batch = []
+        for index in range(count):
+            batch.append(Post(
+                user=user, branch=branch,
+                title=' '.join(rng.choices(words, cum_weights=weights, k=3)),
+                content=' '.join(rng.choices(words, cum_weights=weights, k=rng.randint(20, 120))),
+                visibility=Post.Visibility.PUBLIC,
+            ))
+            if len(batch) >= batch_size:
+                Post.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Post.objects.bulk_create(batch)
+        return user
+
+    def measure(self, repeat, run):
+        run()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        return (time.perf_counter() - started) / repeat * 1000
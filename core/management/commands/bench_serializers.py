@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.serializers import PostSerializer, LikeSerializer
+from branches.models import Branch
+from likes.models import Like
+from posts.models import Post
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает размер ответа и время сериализации страницы постов: '
+        'вложенные объекты, плоский вариант и быстрый путь через values()'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Строк на странице')
+        parser.add_argument('--repeat', type=int, default=50, help='Повторов замера')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        repeat = options['repeat']
+
+        # Данные создаются во временной транзакции и откатываются
+        with transaction.atomic():
+            post_ids, like_ids = self.create_data(rows)
+            posts = Post.objects.filter(pk__in=post_ids).select_related('user', 'branch')
+            likes = Like.objects.filter(pk__in=like_ids).select_related('user', 'post__user')
+
+            cases = [
+                ('posts: expand=user', lambda: self.serialize(PostSerializer, posts, 'expand=user')),
+                ('posts: плоский', lambda: self.serialize(PostSerializer, posts, '')),
+                ('posts: values()', lambda: self.serialize_values(PostSerializer, posts)),
+                ('likes: expand=user,post.user', lambda: self.serialize(LikeSerializer, likes, 'expand=user,post,post.user')),
+                ('likes: плоский', lambda: self.serialize(LikeSerializer, likes, '')),
+            ]
+
+            self.stdout.write(f'{"вариант":<32}{"байт":>10}{"мс/страница":>14}')
+            for name, run in cases:
+                payload = JSONRenderer().render(run())
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    JSONRenderer().render(run())
+                elapsed = (time.perf_counter() - started) / repeat * 1000
+                self.stdout.write(f'{name:<32}{len(payload):>10}{elapsed:>14.2f}')
+
+            transaction.set_rollback(True)
+
+    def create_data(self, rows):
+        user = User.objects.create_user(
+            username='bench_serializers', password='bench',
+            first_name='Bench', last_name='User', bio='Пользователь для замеров'
+        )
+        branch = Branch.objects.create(user=user, title='Замеры')
+        posts = Post.objects.bulk_create([
+            Post(
+                user=user, branch=branch,
+                title=f'Пост {index}', content='Содержание поста ' * 10
+            )
+            for index in range(rows)
+        ])
+        likes = Like.objects.bulk_create([Like(user=user, post=post) for post in posts])
+        return [post.pk for post in posts], [like.pk for like in likes]
+
+    def get_context(self, query):
+        request = Request(RequestFactory().get(f'/?{query}'))
+        return {'request': request}
+
+    def serialize(self, serializer_class, queryset, query):
+        # .all() - свежий запрос на каждый прогон, как и в values()
+        return serializer_class(
+            queryset.all(), many=True, context=self.get_context(query)
+        ).data
+
+    def serialize_values(self, serializer_class, queryset):
+        serializer = serializer_class(context=self.get_context(''))
+        columns = serializer.get_values_columns()
+        return serializer.rows_from_values(
+            serializer.values_queryset(queryset, columns), columns
+        )
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.routing import check_replica
+
+
+class Command(BaseCommand):
+    help = 'Проверяет доступность и отставание реплик DATABASE_REPLICAS'
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas:
+            self.stdout.write('Реплики не настроены (DATABASE_REPLICA_URLS): все чтения идут в default')
+            return
+
+        failed = []
+        for alias in replicas:
+            available, lag = check_replica(alias)
+            lag = 'н/д' if lag is None else f'{lag:.1f} с'
+            state = 'доступна' if available else 'пропускается'
+            self.stdout.write(f'{alias:<12}{state:<14}отставание {lag}')
+            if not available:
+                failed.append(alias)
+
+        if failed:
+            raise CommandError(f'Недоступны реплики: {", ".join(failed)}')
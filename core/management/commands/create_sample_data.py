@@ -0,0 +1,435 @@
+import datetime
+import itertools
+import random
+import time
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from branches.models import Branch, BranchClosure
+from likes.models import Like
+from posts.models import Post
+from subscriptions.feed import backfill_feeds
+from subscriptions.models import Subscription
+from timeline.models import TimelineMonth
+from users.models import User, UserStats
+
+
+FIRST_NAMES = 'Анна Иван Мария Петр Ольга Алексей Елена Дмитрий Наталья Сергей'.split()
+LAST_NAMES = 'Иванова Смирнов Кузнецова Попов Васильева Соколов Морозова Волков'.split()
+BRANCH_TITLES = (
+    'Программирование', 'Математика', 'История', 'Философия', 'Музыка',
+    'Путешествия', 'Книги', 'Кино', 'Спорт', 'Кулинария', 'Языки',
+    'Физика', 'Биология', 'Дизайн', 'Фотография', 'Работа', 'Учеба',
+)
+WORDS = (
+    'знание опыт идея вопрос ответ заметка пример задача решение метод '
+    'теория практика ошибка результат проект книга статья лекция курс '
+    'алгоритм структура система модель данные анализ вывод шаг цель план'
+).split()
+COLORS = [color for color, _ in Branch.BranchColor.choices]
+# Последний день дат событий: с одним зерном набор не зависит от дня запуска
+ANCHOR_DATE = datetime.date(2024, 12, 31)
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает воспроизводимый набор тестовых данных: пользователей, '
+        'деревья веток, посты, лайки и подписки со степенными распределениями'
+    )
+
+    # Параметры распределений Парето (чем меньше, тем тяжелее хвост)
+    ACTIVITY_ALPHA = 1.16
+    POPULARITY_ALPHA = 1.3
+    MAX_BRANCH_DEPTH = 5
+    DRAFT_RATE = 0.05
+    PRIVATE_BRANCH_RATE = 0.1
+    BRANCH_SUBSCRIPTION_RATE = 0.2
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Количество пользователей')
+        parser.add_argument('--posts', type=int, default=100000, help='Всего постов')
+        parser.add_argument('--likes-per-post', type=float, default=3.0, help='Среднее число лайков')
+        parser.add_argument('--follows-per-user', type=float, default=10.0, help='Среднее число подписок')
+        parser.add_argument('--years', type=int, default=5, help='Глубина дат событий в годах')
+        parser.add_argument('--seed', type=int, default=42, help='Зерно генератора')
+        parser.add_argument(
+            '--anchor-date', type=datetime.date.fromisoformat, default=ANCHOR_DATE,
+            help='Последняя дата событий, ГГГГ-ММ-ДД'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки bulk_create')
+        parser.add_argument('--prefix', default='sample', help='Префикс имен пользователей')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        if options['anchor_date'] > datetime.date.today():
+            raise CommandError('Дата --anchor-date не может быть в будущем')
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(
+                f"Пользователи с префиксом {options['prefix']} уже есть, укажите другой --prefix"
+            )
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.options = options
+        self.sentences = [
+            ' '.join(self.rng.choices(WORDS, k=self.rng.randint(6, 16))).capitalize() + '.'
+            for _ in range(500)
+        ]
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            branches = self.plan_branches(user_ids)
+            subscriptions = self.plan_subscriptions(user_ids, branches)
+            self.plan_posts(user_ids, branches, options['posts'])
+
+            self.create_branches(branches, user_ids)
+            self.create_subscriptions(subscriptions, user_ids, branches)
+            counts = self.create_posts(user_ids, branches)
+            self.create_rollups(user_ids, branches, subscriptions, counts)
+
+        # Посты вставлены в обход Post.save, и раскладки не было. Входящие
+        # заполняются после фиксации: хранилище может быть вне базы (Redis)
+        with transaction.atomic():
+            feed_entries = backfill_feeds(Subscription.objects.filter(
+                subscriber__username__startswith=f"{options['prefix']}_"
+            ))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: пользователей {len(user_ids)}, веток {len(branches)}, "
+            f"подписок {len(subscriptions)}, постов {counts['posts']}, "
+            f"лайков {counts['likes']}, записей лент {feed_entries} "
+            f"за {time.perf_counter() - started:.1f} с"
+        ))
+
+    def pareto_counts(self, total, size, alpha):
+        """Разбиение total на size частей с весами из распределения Парето"""
+        weights = [self.rng.paretovariate(alpha) for _ in range(size)]
+        scale = total / sum(weights)
+        counts = [int(weight * scale) for weight in weights]
+        # Остаток от округления - самым активным
+        for index in sorted(range(size), key=lambda i: -weights[i])[:total - sum(counts)]:
+            counts[index] += 1
+        return counts
+
+    def bulk_create(self, model, objects):
+        """bulk_create пачками; объекты получают первичные ключи"""
+        for start in range(0, len(objects), self.batch_size):
+            model.objects.bulk_create(objects[start:start + self.batch_size])
+
+    def create_users(self, count):
+        password = make_password('sample')
+        now = datetime.datetime.now(datetime.timezone.utc)
+        prefix = self.options['prefix']
+
+        users = []
+        for index in range(count):
+            users.append(User(
+                username=f'{prefix}_{index:06d}',
+                email=f'{prefix}_{index:06d}@example.com',
+                first_name=self.rng.choice(FIRST_NAMES),
+                last_name=self.rng.choice(LAST_NAMES),
+                bio=self.rng.choice(self.sentences),
+                password=password,
+                date_joined=now - datetime.timedelta(days=self.rng.randrange(365 * self.options['years'])),
+            ))
+        self.bulk_create(User, users)
+        return [user.pk for user in users]
+
+    def plan_branches(self, user_ids):
+        """
+        Деревья веток: список словарей в порядке создания (родитель раньше потомка).
+        """
+        branches = []
+        for user_index in range(len(user_ids)):
+            size = min(1 + int(self.rng.paretovariate(1.5) * 2), 60)
+            # Названия веток пользователя уникальны
+            titles = self.rng.sample(BRANCH_TITLES, len(BRANCH_TITLES))
+            own = []
+            for number in range(size):
+                parent = None
+                if own and self.rng.random() < 0.7:
+                    parent = self.rng.choice(own)
+                    if branches[parent]['depth'] >= self.MAX_BRANCH_DEPTH:
+                        parent = None
+                own.append(len(branches))
+                title = titles[number % len(titles)]
+                if number >= len(titles):
+                    title = f'{title} {number // len(titles) + 1}'
+                branches.append({
+                    'user': user_index,
+                    'title': title,
+                    'parent': parent,
+                    'depth': 0 if parent is None else branches[parent]['depth'] + 1,
+                    'is_private': self.rng.random() < self.PRIVATE_BRANCH_RATE,
+                    'posts': 0,
+                    'subscribers': 0,
+                })
+        return branches
+
+    def plan_subscriptions(self, user_ids, branches):
+        """
+        Подписки: число подписок пользователя и популярность целей
+        распределены по Парето. Возвращает (subscriber, user, branch).
+        """
+        count = len(user_ids)
+        popularity = list(itertools.accumulate(
+            self.rng.paretovariate(self.POPULARITY_ALPHA) for _ in range(count)
+        ))
+        public_branches = {}
+        for index, branch in enumerate(branches):
+            if not branch['is_private']:
+                public_branches.setdefault(branch['user'], []).append(index)
+
+        mean = self.POPULARITY_ALPHA / (self.POPULARITY_ALPHA - 1)
+        subscriptions = []
+        for subscriber in range(count):
+            wanted = min(
+                count - 1,
+                int(self.rng.paretovariate(self.POPULARITY_ALPHA) * self.options['follows_per_user'] / mean)
+            )
+            users, targets = set(), set()
+            for _ in range(wanted * 3):
+                if len(users) + len(targets) >= wanted:
+                    break
+                target = self.rng.choices(range(count), cum_weights=popularity)[0]
+                if target == subscriber:
+                    continue
+
+                own_branches = public_branches.get(target)
+                if own_branches and self.rng.random() < self.BRANCH_SUBSCRIPTION_RATE:
+                    branch = self.rng.choice(own_branches)
+                    if branch not in targets:
+                        targets.add(branch)
+                        branches[branch]['subscribers'] += 1
+                        subscriptions.append((subscriber, None, branch))
+                elif target not in users:
+                    users.add(target)
+                    subscriptions.append((subscriber, target, None))
+        return subscriptions
+
+    def plan_posts(self, user_ids, branches, total):
+        """Распределение постов по пользователям (Парето) и их веткам"""
+        per_user = self.pareto_counts(total, len(user_ids), self.ACTIVITY_ALPHA)
+
+        own = {}
+        for index, branch in enumerate(branches):
+            own.setdefault(branch['user'], []).append(index)
+
+        for user_index, posts in enumerate(per_user):
+            candidates = own[user_index]
+            # Первые ветки пользователя заполняются гуще
+            weights = list(itertools.accumulate(1 / rank for rank in range(1, len(candidates) + 1)))
+            for branch, count in Counter(
+                self.rng.choices(candidates, cum_weights=weights, k=posts)
+            ).items():
+                branches[branch]['posts'] = count
+
+    def create_branches(self, branches, user_ids):
+        # Уровень за уровнем: у родителя должен быть pk до вставки потомка
+        for depth in range(self.MAX_BRANCH_DEPTH + 1):
+            level = [branch for branch in branches if branch['depth'] == depth]
+            objects = []
+            for branch in level:
+                parent = branch['parent']
+                branch['object'] = Branch(
+                    user_id=user_ids[branch['user']],
+                    parent_branch_id=branches[parent]['pk'] if parent is not None else None,
+                    title=branch['title'],
+                    color=self.rng.choice(COLORS),
+                    description=self.rng.choice(self.sentences),
+                    is_private=branch['is_private'],
+                    posts_count=branch['posts'],
+                    subscribers_count=branch['subscribers'],
+                )
+                objects.append(branch['object'])
+            self.bulk_create(Branch, objects)
+            for branch in level:
+                branch['pk'] = branch.pop('object').pk
+
+        links = []
+        for branch in branches:
+            ancestor, depth = branch, 0
+            while True:
+                links.append((ancestor['pk'], branch['pk'], depth))
+                if ancestor['parent'] is None:
+                    break
+                ancestor, depth = branches[ancestor['parent']], depth + 1
+        self.insert_rows(BranchClosure, ('ancestor_id', 'descendant_id', 'depth'), links)
+
+    def create_subscriptions(self, subscriptions, user_ids, branches):
+        self.bulk_create(Subscription, [
+            Subscription(
+                subscriber_id=user_ids[subscriber],
+                target_user_id=user_ids[target] if target is not None else None,
+                target_branch_id=branches[branch]['pk'] if branch is not None else None,
+            )
+            for subscriber, target, branch in subscriptions
+        ])
+
+    def create_posts(self, user_ids, branches):
+        """
+        Посты по веткам и лайки к ним; возвращает счетчики для сводок.
+
+        Самые большие таблицы вставляются кортежами через insert_rows,
+        id назначаются заранее - они нужны лайкам.
+        """
+        anchor = self.options['anchor_date']
+        days = 365 * self.options['years']
+        users_count = len(user_ids)
+        likes_mean = self.POPULARITY_ALPHA / (self.POPULARITY_ALPHA - 1)
+        now = Post._meta.get_field('created_at').get_db_prep_save(
+            datetime.datetime.now(datetime.timezone.utc), connection
+        )
+        # Даты событий на всем интервале, подготовленные для БД
+        event_dates = [
+            anchor - datetime.timedelta(days=offset) for offset in range(days)
+        ]
+        prepared_dates = [connection.ops.adapt_datefield_value(date) for date in event_dates]
+
+        post_fields = (
+            'id', 'user_id', 'branch_id', 'title', 'content', 'event_date', 'post_type',
+            'is_draft', 'visibility', 'created_at', 'updated_at', 'likes_count', 'comments_count',
+        )
+        like_fields = ('id', 'user_id', 'post_id', 'created_at')
+        next_post_id = self.next_id(Post)
+        next_like_id = self.next_id(Like)
+
+        counts = {
+            'posts': 0,
+            'likes': 0,
+            'months': Counter(),
+            'published': Counter(),
+        }
+        posts, likes = [], []
+
+        for branch in branches:
+            user_id = user_ids[branch['user']]
+            for _ in range(branch['posts']):
+                is_draft = self.rng.random() < self.DRAFT_RATE
+                if is_draft:
+                    visibility = Post.Visibility.DRAFT
+                elif branch['is_private']:
+                    visibility = Post.Visibility.PRIVATE
+                else:
+                    visibility = Post.Visibility.PUBLIC
+
+                likes_count = 0
+                if visibility == Post.Visibility.PUBLIC:
+                    likes_count = min(
+                        users_count - 1,
+                        int(self.rng.paretovariate(self.POPULARITY_ALPHA)
+                            * self.options['likes_per_post'] / likes_mean)
+                    )
+
+                day = self.rng.randrange(days)
+                post_id = next_post_id
+                next_post_id += 1
+                posts.append((
+                    post_id, user_id, branch['pk'],
+                    ' '.join(self.rng.choices(WORDS, k=self.rng.randint(2, 6))).capitalize(),
+                    ' '.join(self.rng.choices(self.sentences, k=self.rng.randint(1, 8))),
+                    prepared_dates[day], Post.PostType.TEXT.value,
+                    is_draft, visibility.value, now, now, likes_count, 0,
+                ))
+
+                if likes_count:
+                    # Выборка без повторов; автор отбрасывается
+                    likers = self.rng.sample(range(users_count), likes_count + 1)
+                    likers = [user_ids[index] for index in likers if user_ids[index] != user_id]
+                    for liker_id in likers[:likes_count]:
+                        likes.append((next_like_id, liker_id, post_id, now))
+                        next_like_id += 1
+
+                event_date = event_dates[day]
+                key = (user_id, branch['pk'], event_date.year, event_date.month)
+                counts['months'][key + (is_draft,)] += 1
+                if not is_draft:
+                    counts['published'][user_id] += 1
+
+                if len(posts) >= self.batch_size:
+                    counts['posts'] += self.insert_rows(Post, post_fields, posts)
+                    posts = []
+                if len(likes) >= self.batch_size:
+                    counts['likes'] += self.insert_rows(Like, like_fields, likes)
+                    likes = []
+
+        counts['posts'] += self.insert_rows(Post, post_fields, posts)
+        counts['likes'] += self.insert_rows(Like, like_fields, likes)
+
+        # Последовательности (PostgreSQL) продолжаются после явно заданных id
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [Post, Like]):
+                cursor.execute(sql)
+        return counts
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def insert_rows(self, model, fields, rows):
+        """
+        Многострочный INSERT готовых кортежей без объектов модели:
+        на десятках миллионов строк сборка bulk_create дороже самой вставки.
+        """
+        if not rows:
+            return 0
+
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+        placeholder = '(' + ', '.join(['%s'] * len(fields)) + ')'
+        max_params = connection.features.max_query_params or len(fields) * self.batch_size
+        per_statement = max(1, min(self.batch_size, max_params // len(fields)))
+
+        with connection.cursor() as wrapper:
+            # Курсор драйвера в обход журнала запросов DEBUG, который
+            # форматирует параметры каждой пачки
+            cursor = wrapper.cursor
+            for start in range(0, len(rows), per_statement):
+                chunk = rows[start:start + per_statement]
+                cursor.execute(
+                    f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+                    f'VALUES {", ".join([placeholder] * len(chunk))}',
+                    [value for row in chunk for value in row]
+                )
+        return len(rows)
+
+    def create_rollups(self, user_ids, branches, subscriptions, counts):
+        """Сводки временной шкалы и счетчики пользователей"""
+        private = {branch['pk']: branch['is_private'] for branch in branches}
+
+        months = {}
+        for (user_id, branch_id, year, month, is_draft), count in counts['months'].items():
+            posts_count, drafts_count = months.get((user_id, branch_id, year, month), (0, 0))
+            if is_draft:
+                drafts_count = count
+            else:
+                posts_count = count
+            months[(user_id, branch_id, year, month)] = (posts_count, drafts_count)
+        self.insert_rows(
+            TimelineMonth,
+            ('user_id', 'branch_id', 'year', 'month', 'posts_count', 'drafts_count', 'is_private'),
+            [key + value + (private[key[1]],) for key, value in months.items()]
+        )
+
+        followers, following = Counter(), Counter()
+        for subscriber, target, branch in subscriptions:
+            following[subscriber] += 1
+            followers[target if target is not None else branches[branch]['user']] += 1
+
+        branches_count = Counter(branch['user'] for branch in branches)
+        self.bulk_create(UserStats, [
+            UserStats(
+                user_id=user_id,
+                followers_count=followers[index],
+                following_count=following[index],
+                branches_count=branches_count[index],
+                posts_count=counts['published'][user_id],
+            )
+            for index, user_id in enumerate(user_ids)
+        ])
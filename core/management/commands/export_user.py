@@ -0,0 +1,63 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export import CHUNK_SIZE, export_stream, parse_position
+
+
+class Command(BaseCommand):
+    help = 'Выгружает ветки, посты и лайки пользователя в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Username пользователя')
+        parser.add_argument(
+            '--output', '-o',
+            default='-',
+            help="Файл для выгрузки или '-' для stdout"
+        )
+        parser.add_argument('--gzip', action='store_true', help='Сжимать gzip на лету')
+        parser.add_argument(
+            '--after',
+            help='Продолжить после строки <type>:<id>, например post:1500'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Строк на одну выборку курсора'
+        )
+
+    def handle(self, *args, **options):
+        UserModel = get_user_model()
+        try:
+            user = UserModel.objects.get(username=options['username'])
+        except UserModel.DoesNotExist:
+            raise CommandError(f"Пользователь {options['username']} не найден")
+
+        after = None
+        if options['after']:
+            try:
+                after = parse_position(options['after'])
+            except ValueError as error:
+                raise CommandError(str(error))
+
+        chunks = export_stream(
+            user, after=after, compress=options['gzip'],
+            chunk_size=options['chunk_size']
+        )
+
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
+            return
+
+        # Продолжение дописывается в конец файла
+        mode = 'ab' if after else 'wb'
+        with open(options['output'], mode) as output:
+            for chunk in chunks:
+                output.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Выгрузка записана в {options['output']}"))
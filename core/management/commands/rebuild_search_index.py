@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import install_search_indexes
+
+
+class Command(BaseCommand):
+    help = 'Создает и пересобирает индексы полнотекстового поиска'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Псевдоним базы данных'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            installed = install_search_indexes(using=options['database'], rebuild=True)
+        except NotImplementedError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Индексы пересобраны: {', '.join(installed) or 'нет таблиц'}"
+        ))
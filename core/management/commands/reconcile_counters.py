@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.counters import COUNTERS, CHUNK_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счетчики с исходными таблицами и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            action='append',
+            choices=list(COUNTERS),
+            help='Сверить только эту модель (можно повторять)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Ширина диапазона id на один GROUP BY'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Пауза между диапазонами, секунд'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только отчет, без записи'
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Отчет в JSON'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+
+        progress = None
+        if options['verbosity'] > 1:
+            def progress(model_label, position, last):
+                self.stderr.write(f'{model_label}: {position}/{last}')
+
+        results = reconcile(
+            models=options['model'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            pause=options['pause'],
+            progress=progress,
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps([drift.as_dict() for drift in results], indent=2))
+            return
+
+        self.stdout.write(
+            f'{"счетчик":<34}{"строк":>10}{"расхожд.":>10}{"исправл.":>10}'
+            f'{"пропущ.":>9}{"сумма":>9}{"макс.":>7}'
+        )
+        for drift in results:
+            self.stdout.write(
+                f'{drift.name:<34}{drift.checked:>10}{drift.drifted:>10}{drift.fixed:>10}'
+                f'{drift.skipped:>9}{drift.total_drift:>9}{drift.max_drift:>7}'
+            )
+
+        drifted = sum(drift.drifted for drift in results)
+        skipped = sum(drift.skipped for drift in results)
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Найдено расхождений: {drifted} (без записи)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Найдено расхождений: {drifted}, исправлено: {drifted - skipped}'
+            ))
+            if skipped:
+                self.stdout.write(self.style.WARNING(
+                    f'Пропущено из-за параллельной записи: {skipped}, исправятся при следующем запуске'
+                ))
@@ -0,0 +1,332 @@
+"""
+Инструментирование запросов: SQL, время и метрики.
+
+QueryMetricsMiddleware на время запроса подключает execute_wrapper ко
+всем соединениям и считает число запросов и время БД. Отдельно
+замеряются сериализация (DRF-сериализаторы и быстрый путь по values(),
+см. measure_serialization) и рендеринг готовых данных в JSON. Итог
+уходит в заголовок Server-Timing:
+
+    Server-Timing: db;dur=12.4;desc="9 queries", serialize;dur=6.1,
+        render;dur=1.8, total;dur=25.0
+
+Одинаковый SQL, повторенный в запросе METRICS_N_PLUS_ONE_THRESHOLD раз
+и больше, считается подозрением на N+1 и пишется в журнал вместе с
+самыми медленными запросами. Гистограммы по представлениям копятся в
+памяти процесса и отдаются в текстовом формате Prometheus (metrics_view);
+при нескольких воркерах каждый отдает свои значения.
+
+Обертка курсора не зависит от DEBUG и не хранит тексты всех запросов,
+поэтому middleware можно держать включенным под нагрузкой.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+logger = logging.getLogger('core.metrics')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+# RequestStats запроса, который сейчас обрабатывается
+_current_stats = ContextVar('request_stats', default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RequestStats:
+    """SQL одного запроса"""
+
+    def __init__(self, slowest=3):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.render_time = 0.0
+        self.serializing = False
+        self.statements = Counter()
+        self.slowest = []
+        self.slowest_size = slowest
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += duration
+            # Текст с плейсхолдерами: одинаков для запросов с разными параметрами
+            self.statements[sql] += 1
+            if len(self.slowest) < self.slowest_size:
+                heapq.heappush(self.slowest, (duration, sql))
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (duration, sql))
+
+    def repeated(self, threshold):
+        """Повторяющиеся запросы - подозрение на N+1"""
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+
+@contextmanager
+def measure_serialization():
+    """
+    Замер сериализации для сегмента serialize.
+
+    SQL, выполненный внутри (ленивые queryset и связи), вычитается - он
+    уже учтен в db. Вложенные замеры не суммируются повторно; вне
+    QueryMetricsMiddleware замер не делается.
+    """
+    stats = _current_stats.get()
+    if stats is None or stats.serializing:
+        yield
+        return
+
+    stats.serializing = True
+    started, db_time = time.perf_counter(), stats.db_time
+    try:
+        yield
+    finally:
+        stats.serializing = False
+        elapsed = time.perf_counter() - started
+        stats.serialize_time += max(elapsed - (stats.db_time - db_time), 0.0)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """Метрики процесса по (view, method)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.db_durations = {}
+        self.serialize_durations = {}
+        self.queries = {}
+        self.responses = Counter()
+        self.n_plus_one = Counter()
+
+    def observe(self, view, method, status, duration, stats, suspected):
+        key = (view, method)
+        with self.lock:
+            if key not in self.durations:
+                self.durations[key] = Histogram(DURATION_BUCKETS)
+                self.db_durations[key] = Histogram(DURATION_BUCKETS)
+                self.serialize_durations[key] = Histogram(DURATION_BUCKETS)
+                self.queries[key] = Histogram(QUERY_BUCKETS)
+            self.durations[key].observe(duration)
+            self.db_durations[key].observe(stats.db_time)
+            self.serialize_durations[key].observe(stats.serialize_time)
+            self.queries[key].observe(stats.queries)
+            self.responses[key + (status,)] += 1
+            if suspected:
+                self.n_plus_one[key] += 1
+
+    def clear(self):
+        with self.lock:
+            self.__init__()
+
+    def render(self):
+        """Текстовый формат Prometheus 0.0.4"""
+        lines = []
+        with self.lock:
+            self._render_histograms(
+                lines, 'http_request_duration_seconds',
+                'Время обработки запроса', self.durations
+            )
+            self._render_histograms(
+                lines, 'http_request_db_duration_seconds',
+                'Время SQL за запрос', self.db_durations
+            )
+            self._render_histograms(
+                lines, 'http_request_serialize_duration_seconds',
+                'Время сериализации за запрос', self.serialize_durations
+            )
+            self._render_histograms(
+                lines, 'http_request_queries',
+                'Число SQL-запросов за запрос', self.queries
+            )
+
+            lines.append('# HELP http_responses_total Ответы по статусам')
+            lines.append('# TYPE http_responses_total counter')
+            for (view, method, status), count in sorted(self.responses.items()):
+                lines.append(
+                    f'http_responses_total{{{_labels(view, method)},status="{status}"}} {count}'
+                )
+
+            lines.append('# HELP http_n_plus_one_total Запросы с повторяющимся SQL')
+            lines.append('# TYPE http_n_plus_one_total counter')
+            for (view, method), count in sorted(self.n_plus_one.items()):
+                lines.append(f'http_n_plus_one_total{{{_labels(view, method)}}} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines, name, help_text, histograms):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (view, method), histogram in sorted(histograms.items()):
+            labels = _labels(view, method)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.total}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.total}')
+
+
+def _labels(view, method):
+    view = view.replace('\\', '\\\\').replace('"', '\\"')
+    return f'view="{view}",method="{method}"'
+
+
+registry = Registry()
+
+
+class QueryMetricsMiddleware:
+    """SQL, время БД, сериализации и рендеринга каждого запроса"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = _setting('METRICS_N_PLUS_ONE_THRESHOLD', 5)
+        self.slowest = _setting('METRICS_SLOWEST_QUERIES', 3)
+        self.slow_request = _setting('METRICS_SLOW_REQUEST_MS', 500) / 1000
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = RequestStats(self.slowest)
+        request._query_stats = stats
+        started = time.perf_counter()
+
+        token = _current_stats.set(stats)
+        try:
+            with ExitStack() as stack:
+                self.wrap_connections(stack, stats)
+                response = self.get_response(request)
+        finally:
+            _current_stats.reset(token)
+
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats(self.slowest)
+        request._query_stats = stats
+        started = time.perf_counter()
+
+        # Async ORM выполняет SQL в потоке запроса (sync_to_async), и
+        # обертка ставится на соединения этого потока
+        token = _current_stats.set(stats)
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current_stats.reset(token)
+
+        return self.finish(request, response, stats, started)
+
+    @staticmethod
+    def wrap_connections(stack, stats):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats))
+
+    def finish(self, request, response, stats, started):
+        duration = time.perf_counter() - started
+        view = self.view_name(request)
+        suspected = stats.repeated(self.threshold)
+
+        response['Server-Timing'] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+            f'serialize;dur={stats.serialize_time * 1000:.1f}, '
+            f'render;dur={stats.render_time * 1000:.1f}, '
+            f'total;dur={duration * 1000:.1f}'
+        )
+        registry.observe(view, request.method, response.status_code, duration, stats, suspected)
+
+        if suspected:
+            logger.warning(
+                'Возможный N+1 в %s %s: %s', request.method, view,
+                '; '.join(f'{count}x {sql}' for sql, count in suspected)
+            )
+        if duration >= self.slow_request:
+            logger.warning(
+                'Медленный запрос %s %s: %.0f мс, SQL %d (%.0f мс), самые долгие: %s',
+                request.method, view, duration * 1000, stats.queries, stats.db_time * 1000,
+                '; '.join(
+                    f'{sql_duration * 1000:.1f} мс {sql}'
+                    for sql_duration, sql in sorted(stats.slowest, reverse=True)
+                )
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся в JSON после этого хука
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._query_stats.render_time += time.perf_counter() - started
+
+        if hasattr(request, '_query_stats'):
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def view_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match._func_path
+
+
+def metrics_view(request):
+    """
+    Метрики в формате Prometheus.
+
+    С заданным METRICS_TOKEN доступ по заголовку Authorization: Bearer <token>,
+    иначе - только для персонала.
+    """
+    token = _setting('METRICS_TOKEN', '')
+    if token:
+        allowed = request.headers.get('Authorization') == f'Bearer {token}'
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
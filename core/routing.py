@@ -0,0 +1,246 @@
+"""
+Чтение с реплик, запись в основную базу.
+
+ReplicaRoutingMiddleware помечает запросы безопасных методов (GET,
+HEAD, OPTIONS), и их чтения PrimaryReplicaRouter отправляет на одну из
+реплик DATABASE_REPLICAS - одну на весь запрос. Все остальное идет в
+default: записи, чтения небезопасных запросов, чтения внутри
+transaction.atomic() и все вне HTTP-запроса (задачи Celery, команды).
+
+Реплика отстает от основной базы, поэтому клиент, который только что
+записал, на REPLICA_PIN_SECONDS закрепляется за default и сразу видит
+свою запись. Отметка хранится в кэше под ключом от учетных данных
+запроса (заголовок Authorization или cookie сессии) и от новой cookie
+сессии ответа - так вход по сессии не теряется на отстающей реплике.
+Отметка действует между процессами, если кэш общий (Redis).
+
+Реплика проверяется не чаще раза в REPLICA_CHECK_INTERVAL секунд:
+недоступная или отставшая больше чем на REPLICA_MAX_LAG секунд
+(PostgreSQL) пропускается, без доступных реплик чтения идут в default.
+
+Ответы с версиями (core.cache) кэшируются и получают ETag по текущим
+версиям. Если данные изменились позже, чем REPLICA_MAX_LAG секунд назад,
+реплика может их еще не видеть, и устаревший ответ закэшировался бы под
+новой версией - такие запросы читают из default (prefer_primary).
+"""
+import contextvars
+import hashlib
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+logger = logging.getLogger('core.routing')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_PREFIX = 'db-pin'
+
+# Отставание реплики PostgreSQL в секундах: 0, если все полученное уже
+# применено (иначе при простое основной базы "отставание" росло бы),
+# NULL - не реплика (например, отдельный локальный сервер)
+LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+_route = contextvars.ContextVar('db_route', default=None)
+
+# alias -> (проверить после, доступна); гонка потоков дает лишь повторную проверку
+_health = {}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _replicas():
+    return _setting('DATABASE_REPLICAS', [])
+
+
+class Route:
+    """Маршрутизация одного HTTP-запроса"""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.replica = None
+        self.wrote = False
+
+
+def check_replica(alias):
+    """
+    Доступна ли реплика: соединение открывается, а отставание в пределах
+    REPLICA_MAX_LAG. Возвращает (доступна, отставание в секундах или None).
+    """
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        if not connection.is_usable():
+            raise ConnectionError('соединение не отвечает')
+        lag = None
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                value = cursor.fetchone()[0]
+            lag = None if value is None else float(value)
+    except Exception as error:
+        # Соединение потока закрывается - следующая проверка откроет новое
+        connection.close()
+        logger.warning('Реплика %s недоступна: %s', alias, error)
+        return False, None
+
+    max_lag = _setting('REPLICA_MAX_LAG', 5)
+    if lag is not None and lag > max_lag:
+        logger.warning('Реплика %s отстает на %.1f с', alias, lag)
+        return False, lag
+    return True, lag
+
+
+def replica_available(alias):
+    """Результат последней проверки реплики, не старше REPLICA_CHECK_INTERVAL"""
+    now = time.monotonic()
+    expires, available = _health.get(alias, (0, False))
+    if now >= expires:
+        available = check_replica(alias)[0]
+        _health[alias] = (now + _setting('REPLICA_CHECK_INTERVAL', 10), available)
+    return available
+
+
+def choose_replica():
+    """Случайная доступная реплика или default"""
+    replicas = list(_replicas())
+    random.shuffle(replicas)
+    for alias in replicas:
+        if replica_available(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+def prefer_primary(changed_at):
+    """
+    Остальные чтения запроса - из default, если данные менялись
+    (changed_at, unix-время) не раньше REPLICA_MAX_LAG секунд назад.
+    """
+    route = _route.get()
+    if route is None or changed_at is None:
+        return
+    # Время изменения хранится с точностью до секунды
+    if time.time() - changed_at <= _setting('REPLICA_MAX_LAG', 5) + 1:
+        route.use_replica = False
+
+
+class PrimaryReplicaRouter:
+    """Чтения помеченных запросов - на реплику, остальное - в default"""
+
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None or not route.use_replica or route.wrote:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Внутри транзакции читаем то же, во что пишем
+            return DEFAULT_DB_ALIAS
+        if route.replica is None:
+            route.replica = choose_replica()
+        return route.replica
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None:
+            route.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики - копии default: связи между их объектами допустимы
+        databases = {DEFAULT_DB_ALIAS, *_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def _credentials(request):
+    """Учетные данные запроса, за которыми закрепляется default"""
+    values = []
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if authorization:
+        values.append(authorization)
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        values.append(session_key)
+    return values
+
+
+def _pin_key(credential):
+    return f'{PIN_PREFIX}:{hashlib.sha256(credential.encode()).hexdigest()}'
+
+
+def is_pinned(request):
+    keys = [_pin_key(value) for value in _credentials(request)]
+    return bool(keys) and bool(cache.get_many(keys))
+
+
+def pin(request, response):
+    """Закрепить за default клиента запроса и новую сессию из ответа"""
+    values = _credentials(request)
+    cookie = response.cookies.get(settings.SESSION_COOKIE_NAME)
+    if cookie is not None and cookie.value:
+        values.append(cookie.value)
+    if values:
+        cache.set_many(
+            {_pin_key(value): True for value in values},
+            _setting('REPLICA_PIN_SECONDS', 5)
+        )
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Помечает безопасные запросы для чтения с реплик и закрепляет
+    клиента за default после записи.
+
+    Стоит до SessionMiddleware: сохранение сессии - тоже запись, а новая
+    cookie сессии уже есть в ответе.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _replicas():
+            return self.get_response(request)
+
+        route = Route(request.method in SAFE_METHODS and not is_pinned(request))
+        token = _route.set(route)
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+        if route.wrote:
+            pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not _replicas():
+            return await self.get_response(request)
+
+        use_replica = request.method in SAFE_METHODS and not await sync_to_async(is_pinned)(request)
+        route = Route(use_replica)
+        # sync_to_async копирует контекст: ORM в потоках видит тот же Route
+        token = _route.set(route)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _route.reset(token)
+        if route.wrote:
+            await sync_to_async(pin)(request, response)
+        return response
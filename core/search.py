@@ -0,0 +1,275 @@
+"""
+Полнотекстовый поиск по постам и веткам.
+
+Индекс зависит от СУБД:
+    SQLite     - FTS5-таблица с внешним содержимым (<table>_fts),
+                 синхронизируется триггерами на INSERT/UPDATE/DELETE
+    PostgreSQL - генерируемая колонка search_vector (tsvector) с GIN-индексом
+
+Триггеры и генерируемая колонка обновляются самой базой, поэтому
+индекс не расходится с данными и при bulk_create/update().
+Индекс создается после migrate (см. CoreConfig.ready) или командой
+rebuild_search_index.
+
+Результаты ранжируются (bm25 / ts_rank_cd) и отдаются страницами
+по курсору (score, id): меньший score - более релевантный.
+"""
+import re
+
+from django.apps import apps
+from django.db import connections, transaction
+
+
+# Индексируемые таблицы: модель, поля с весами и связи для выдачи
+SEARCH_INDEXES = {
+    'posts': (
+        'posts.Post',
+        (('title', 10.0), ('content', 1.0)),
+        ('user', 'branch'),
+    ),
+    'branches': (
+        'branches.Branch',
+        (('title', 10.0), ('description', 1.0)),
+        ('user', 'parent_branch'),
+    ),
+}
+
+MAX_TERMS = 8
+TERM_RE = re.compile(r'\w+')
+
+
+def parse_terms(query):
+    """Слова запроса без операторов языка поиска"""
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def get_index(name):
+    model_label, fields, related = SEARCH_INDEXES[name]
+    return apps.get_model(model_label), fields, related
+
+
+class BaseSearchBackend:
+    """Интерфейс индекса для конкретной СУБД"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def install(self, table, fields):
+        """
+        Создание индекса и механизма синхронизации (идемпотентно).
+
+        Возвращает True, если индекс создан пустым и его нужно заполнить.
+        """
+        raise NotImplementedError
+
+    def rebuild(self, table, fields):
+        """Полная пересборка индекса по текущим данным"""
+        raise NotImplementedError
+
+    def match_query(self, terms):
+        """Строка запроса для MATCH / to_tsquery"""
+        raise NotImplementedError
+
+    def ranked_sql(self, table, fields, visibility):
+        """
+        SELECT id, score подходящих строк; параметры -
+        строка запроса и параметры условия видимости.
+        """
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """FTS5 с внешним содержимым и триггерами"""
+
+    def fts_table(self, table):
+        return f'{table}_fts'
+
+    def install(self, table, fields):
+        fts = self.fts_table(table)
+        columns = [name for name, _ in fields]
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'new.{name}' for name in columns)
+        old_values = ', '.join(f'old.{name}' for name in columns)
+
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{column_list}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')",
+
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); "
+            f"END",
+
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column_list}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            f"END",
+
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column_list} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column_list}) "
+            f"VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values}); "
+            f"END",
+        ]
+        created = fts not in self.connection.introspection.table_names()
+        with self.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        return created
+
+    def rebuild(self, table, fields):
+        fts = self.fts_table(table)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    def match_query(self, terms):
+        # Каждое слово - в кавычках и с поиском по префиксу
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def ranked_sql(self, table, fields, visibility):
+        fts = self.fts_table(table)
+        weights = ', '.join(str(weight) for _, weight in fields)
+        return (
+            f"SELECT t.id AS id, bm25({fts}, {weights}) AS score "
+            f"FROM {fts} JOIN {table} t ON t.id = {fts}.rowid "
+            f"WHERE {fts} MATCH %s AND ({visibility})"
+        )
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Генерируемая колонка tsvector и GIN-индекс"""
+    config = 'russian'
+    weight_labels = 'ABCD'
+
+    def install(self, table, fields):
+        vector = ' || '.join(
+            f"setweight(to_tsvector('{self.config}', coalesce({name}, '')), "
+            f"'{self.weight_labels[index]}')"
+            for index, (name, _) in enumerate(fields)
+        )
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS ({vector}) STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_search_idx "
+                f"ON {table} USING GIN (search_vector)"
+            )
+        # ADD COLUMN ... GENERATED сразу вычисляет значения для всех строк
+        return False
+
+    def rebuild(self, table, fields):
+        # Генерируемая колонка всегда актуальна - достаточно пересобрать индекс
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"REINDEX INDEX {table}_search_idx")
+
+    def match_query(self, terms):
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def ranked_sql(self, table, fields, visibility):
+        # float8: значение курсора должно сравниваться без потери точности
+        return (
+            f"SELECT t.id AS id, (-ts_rank_cd(t.search_vector, query))::float8 AS score "
+            f"FROM {table} t, to_tsquery('{self.config}', %s) query "
+            f"WHERE t.search_vector @@ query AND ({visibility})"
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    connection = connections[using]
+    try:
+        backend_class = BACKENDS[connection.vendor]
+    except KeyError:
+        raise NotImplementedError(
+            f'Полнотекстовый поиск не поддерживается для {connection.vendor}'
+        )
+    return backend_class(connection)
+
+
+def install_search_indexes(using='default', rebuild=False):
+    """
+    Создание индексов для существующих таблиц; новый индекс
+    заполняется сразу, rebuild=True пересобирает и существующие.
+
+    Возвращает имена обработанных индексов.
+    """
+    backend = get_search_backend(using)
+    existing = set(backend.connection.introspection.table_names())
+
+    installed = []
+    with transaction.atomic(using=using):
+        for name in SEARCH_INDEXES:
+            model, fields, _ = get_index(name)
+            table = model._meta.db_table
+            if table not in existing:
+                continue
+            created = backend.install(table, fields)
+            if rebuild or created:
+                backend.rebuild(table, fields)
+            installed.append(name)
+    return installed
+
+
+def search(name, query, user, after=None, limit=20, using='default'):
+    """
+    Страница результатов поиска.
+
+    after - позиция (score, id) последней строки предыдущей страницы.
+    Возвращает (objects, next_position), где next_position - позиция
+    для следующей страницы или None.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return [], None
+
+    model, fields, related = get_index(name)
+    backend = get_search_backend(using)
+    visibility, visibility_params = get_visibility_sql(name, user)
+
+    sql = backend.ranked_sql(model._meta.db_table, fields, visibility)
+    params = [backend.match_query(terms), *visibility_params]
+
+    sql = f"SELECT id, score FROM ({sql}) ranked"
+    if after is not None:
+        score, last_id = after
+        sql += " WHERE score > %s OR (score = %s AND id > %s)"
+        params += [score, score, last_id]
+    sql += " ORDER BY score, id LIMIT %s"
+    params.append(limit + 1)
+
+    with backend.connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    next_position = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_id, score = rows[-1]
+        next_position = (score, last_id)
+
+    objects = model.objects.using(using).select_related(
+        *related
+    ).in_bulk([row[0] for row in rows])
+
+    return [objects[row[0]] for row in rows if row[0] in objects], next_position
+
+
+def get_visibility_sql(name, user):
+    """
+    Условие видимости для строки t: публичное или свое.
+
+    Повторяет фильтры PostViewSet и BranchViewSet.
+    """
+    from posts.models import Post
+
+    user_id = user.pk if user.is_authenticated else None
+    if name == 'posts':
+        return 't.visibility = %s OR t.user_id = %s', [Post.Visibility.PUBLIC, user_id]
+    return 't.is_private = %s OR t.user_id = %s', [False, user_id]
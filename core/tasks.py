@@ -0,0 +1,168 @@
+"""
+Фоновые задачи: тяжелые последствия записей выполняются вне запроса.
+
+Записи подписок и постов ставят задачи через defer(): id
+копятся до фиксации транзакции и уходят пачками по TASK_BATCH_SIZE,
+так что массовая запись порождает несколько задач, а не по одной на
+строку. Задача стартует через TASK_BATCH_DELAY секунд, и записи за это
+время сливаются в нее.
+
+Повторы отсекаются отметкой в кэше на каждый id: пока задача с этим
+id стоит в очереди, новая не ставится. Отметка снимается в начале
+выполнения, поэтому запись, пришедшая во время работы задачи, ставит
+следующую.
+
+Задачи идемпотентны: они перечитывают состояние из БД (пересчет
+счетчиков, раскладка поста с проверкой видимости), поэтому повторная
+доставка, лишний id или задача после отката транзакции безвредны.
+
+Без брокера (CELERY_TASK_ALWAYS_EAGER) задачи выполняются сразу при
+фиксации транзакции - счетчики в тестах точны сразу после записи.
+
+Счетчик лайков меняется F() дельтой в транзакции лайка, фоновые
+пересчеты его не трогают: расхождения (каскадные удаления, массовые
+операции) исправляет периодическая сверка reconcile_all_counters.
+"""
+import logging
+
+from celery import Task, shared_task
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+
+
+logger = logging.getLogger('core.tasks')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _queued_key(task_name, args, pk):
+    # Кортежи из args приходят в воркер списками (JSON) - ключ не зависит от типа
+    suffix = ':'.join(
+        ','.join(map(str, arg)) if isinstance(arg, (list, tuple)) else str(arg)
+        for arg in args
+    )
+    return f'tasks:queued:{task_name}:{suffix}:{pk}'
+
+
+class BatchTask(Task):
+    """
+    Задача над пачкой id: task(ids, *args).
+
+    Перед выполнением снимает отметки "в очереди" своих id.
+    """
+
+    def __call__(self, ids, *args, **kwargs):
+        cache.delete_many([_queued_key(self.name, args, pk) for pk in ids])
+        return super().__call__(ids, *args, **kwargs)
+
+
+class PendingTasks:
+    """id, накопленные в текущей транзакции соединения"""
+
+    def __init__(self):
+        self.batches = {}
+
+    def add(self, task, ids, args):
+        self.batches.setdefault((task, args), set()).update(ids)
+
+    def flush(self):
+        batches, self.batches = self.batches, {}
+        for (task, args), ids in batches.items():
+            send(task, ids, args)
+
+
+def defer(task, ids, *args, using=None):
+    """
+    Поставить task(ids, *args) после фиксации текущей транзакции.
+
+    Вызовы с одной задачей и args за транзакцию объединяются. args
+    должны сериализоваться в JSON и быть хешируемыми.
+    """
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return
+
+    connection = transaction.get_connection(using)
+    pending = getattr(connection, '_pending_tasks', None)
+    if pending is None:
+        pending = connection._pending_tasks = PendingTasks()
+    pending.add(task, ids, args)
+    # flush регистрируется на каждый вызов: откат точки сохранения
+    # снимает только ее обработчики, а остальные отправят все накопленное.
+    # Повторные вызовы flush находят пустой буфер
+    transaction.on_commit(pending.flush, using=using)
+
+
+def send(task, ids, args=()):
+    """Отправка без дублей: id, уже стоящие в очереди, пропускаются"""
+    timeout = _setting('TASK_DEDUP_TIMEOUT', 600)
+    ids = [
+        pk for pk in sorted(ids)
+        if cache.add(_queued_key(task.name, args, pk), True, timeout)
+    ]
+    batch_size = _setting('TASK_BATCH_SIZE', 500)
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        try:
+            task.apply_async(
+                (batch, *args), countdown=_setting('TASK_BATCH_DELAY', 1)
+            )
+        except Exception:
+            # Без отметок id поставятся следующей записью или сверкой
+            cache.delete_many([_queued_key(task.name, args, pk) for pk in batch])
+            if task.app.conf.task_always_eager:
+                raise
+            logger.exception('Не удалось поставить задачу %s для %d id', task.name, len(batch))
+
+
+@shared_task(
+    base=BatchTask,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def refresh_counters(ids, model_label, fields):
+    """
+    Пересчет счетчиков fields у строк model_label с pk из ids.
+
+    Исправленные строки и строки, которых еще нет, передаются в
+    counters_refreshed(changed, missing) модели, если он определен.
+    """
+    from .counters import reconcile_ids
+
+    fixed, skipped, missing = reconcile_ids(model_label, ids, fields)
+    if skipped:
+        # Строку одновременно изменил другой пересчет - проверяем еще раз
+        schedule_counters(model_label, skipped, *fields)
+
+    model = apps.get_model(model_label)
+    if (fixed or missing) and hasattr(model, 'counters_refreshed'):
+        model.counters_refreshed(fixed, missing)
+    return len(fixed)
+
+
+def schedule_counters(model_label, ids, *fields):
+    """Пересчет счетчиков после фиксации транзакции записи"""
+    defer(refresh_counters, ids, model_label, tuple(sorted(fields)))
+
+
+@shared_task(ignore_result=True)
+def reconcile_all_counters():
+    """
+    Периодическая сверка всех счетчиков (CELERY_BEAT_SCHEDULE), как
+    команда reconcile_counters.
+    """
+    from .counters import reconcile
+
+    results = reconcile(pause=_setting('COUNTER_RECONCILE_PAUSE', 0))
+    drifted = [drift for drift in results if drift.drifted]
+    for drift in drifted:
+        logger.warning(
+            'Расхождение счетчика %s: строк %d, исправлено %d, максимум %d',
+            drift.name, drift.drifted, drift.fixed, drift.max_drift
+        )
+    return sum(drift.fixed for drift in drifted)
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
@@ -31,8 +32,10 @@ class Like(models.Model):
         verbose_name_plural = _('лайки')
         ordering = ['-created_at']
         constraints = [
+            # Пост первым: по индексу читаются и лайкнувшие пост по
+            # порядку user, и лайки зрителя среди постов страницы
             models.UniqueConstraint(
-                fields=['user', 'post'],
+                fields=['post', 'user'],
                 name='unique_like'
             )
         ]
@@ -41,12 +44,80 @@ class Like(models.Model):
         return f"{self.user.username} ❤ {self.post.title}"
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Обновляем счетчик лайков у поста
-        self.post.update_counts()
+        from posts.models import Post
+        
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Увеличиваем счетчик лайков у поста без пересчета
+            if adding:
+                Post.objects.filter(pk=self.post_id).update(
+                    likes_count=F('likes_count') + 1
+                )
+                self.invalidate_post_cache(self.post)
     
     def delete(self, *args, **kwargs):
-        post = self.post
-        super().delete(*args, **kwargs)
-        # Обновляем счетчик лайков у поста
-        post.update_counts()
\ No newline at end of file
+        from posts.models import Post
+        
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            # Уменьшаем счетчик, только если строка действительно удалена
+            if result[0]:
+                Post.objects.filter(pk=self.post_id).update(
+                    likes_count=F('likes_count') - 1
+                )
+                self.invalidate_post_cache(self.post)
+        return result
+    
+    @staticmethod
+    def invalidate_post_cache(post):
+        """likes_count входит в закэшированные списки постов"""
+        from core.cache import invalidate
+        
+        invalidate(users=[post.user_id], branches=[post.branch_id])
+    
+    @classmethod
+    def liked_post_ids(cls, user, post_ids):
+        """
+        Запрос id постов из post_ids, лайкнутых пользователем.
+        
+        Одна проверка на страницу постов вместо чтения всех лайков
+        каждого поста.
+        """
+        return cls.objects.filter(
+            post_id__in=post_ids, user=user
+        ).values_list('post_id', flat=True)
+    
+    @classmethod
+    def toggle(cls, user, post):
+        """
+        Постановка/снятие лайка одной транзакцией.
+        
+        Сначала пробуем удалить лайк; если удалять нечего - вставляем.
+        Конфликт уникального ключа означает, что параллельный запрос
+        уже поставил лайк, и счетчик в этом случае не меняется.
+        Возвращает (liked, likes_count); likes_count перечитывается после
+        F() дельты в той же транзакции и учитывает параллельные лайки.
+        """
+        from posts.models import Post
+        
+        with transaction.atomic():
+            deleted, _ = cls.objects.filter(user=user, post=post).delete()
+            
+            if deleted:
+                liked, delta = False, -1
+            else:
+                try:
+                    with transaction.atomic():
+                        cls.objects.bulk_create([cls(user=user, post=post)])
+                    liked, delta = True, 1
+                except IntegrityError:
+                    liked, delta = True, 0
+            
+            posts = Post.objects.filter(pk=post.pk)
+            if delta:
+                posts.update(likes_count=F('likes_count') + delta)
+                cls.invalidate_post_cache(post)
+            likes_count = posts.values_list('likes_count', flat=True).first()
+        
+        return liked, likes_count
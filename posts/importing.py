@@ -0,0 +1,190 @@
+"""
+Пакетный импорт постов из NDJSON.
+
+Каждая строка - JSON-объект поста:
+    {"branch": "Название ветки", "title": "...", "content": "...",
+     "event_date": "2021-05-01", "post_type": "text", "is_draft": false}
+
+Строки проверяются и вставляются пачками: ветки пачки находятся
+одним запросом по названию, посты создаются через bulk_create.
+Сводки (временная шкала, счетчики автора и веток) обновляются
+один раз в конце импорта, в той же транзакции.
+
+Импортированная история не раскладывается в ленты подписчиков.
+"""
+import json
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+
+class PostImporter:
+    """Импорт постов одного пользователя"""
+    batch_size = 500
+    # Поля поста, которые можно передать в строке
+    fields = ('title', 'content', 'event_date', 'post_type', 'is_draft')
+
+    def __init__(self, user, batch_size=None, create_branches=False):
+        self.user = user
+        self.batch_size = batch_size or self.batch_size
+        self.create_branches = create_branches
+
+        self.branches = {}
+        self.created = 0
+        self.errors = []
+        # Дельты сводок, применяются в finish()
+        self.months = {}
+        self.branch_counts = Counter()
+        self.published = 0
+
+    def run(self, lines):
+        """
+        Импорт строк (str или bytes) в одной транзакции.
+
+        Возвращает {'created': N, 'errors': [{'line': n, 'errors': ...}]}.
+        """
+        with transaction.atomic():
+            batch = []
+            for line_number, line in enumerate(lines, start=1):
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8', errors='replace')
+                if not line.strip():
+                    continue
+                batch.append((line_number, line))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+            self.finish()
+
+        return {'created': self.created, 'errors': self.errors}
+
+    def add_error(self, line_number, errors):
+        self.errors.append({'line': line_number, 'errors': errors})
+
+    def import_batch(self, batch):
+        rows = []
+        for line_number, line in batch:
+            post, branch_title = self.parse_line(line_number, line)
+            if post is not None:
+                rows.append((line_number, post, branch_title))
+
+        self.resolve_branches({branch_title for _, _, branch_title in rows})
+
+        posts = []
+        for line_number, post, branch_title in rows:
+            branch = self.branches.get(branch_title)
+            if branch is None:
+                self.add_error(line_number, {'branch': [f'Ветка "{branch_title}" не найдена']})
+                continue
+            post.branch = branch
+            post.visibility = post.compute_visibility()
+            posts.append(post)
+
+        from .models import Post
+
+        Post.objects.bulk_create(posts)
+        self.created += len(posts)
+
+        for post in posts:
+            key = (post.branch_id, post.event_date.year, post.event_date.month)
+            posts_count, drafts_count = self.months.get(key, (0, 0))
+            if post.is_draft:
+                drafts_count += 1
+            else:
+                posts_count += 1
+            self.months[key] = (posts_count, drafts_count)
+            self.branch_counts[post.branch_id] += 1
+            if not post.is_draft:
+                self.published += 1
+
+    def parse_line(self, line_number, line):
+        """Пост без ветки и название ветки; при ошибке - (None, None)"""
+        from .models import Post
+
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            self.add_error(line_number, {'line': [f'Неверный JSON: {error}']})
+            return None, None
+
+        if not isinstance(data, dict):
+            self.add_error(line_number, {'line': ['Ожидается JSON-объект']})
+            return None, None
+
+        errors = {}
+        branch_title = data.get('branch')
+        if not isinstance(branch_title, str) or not branch_title.strip():
+            errors['branch'] = ['Укажите название ветки']
+
+        unknown = set(data) - set(self.fields) - {'branch'}
+        if unknown:
+            errors['line'] = [f"Неизвестные поля: {', '.join(sorted(unknown))}"]
+
+        values = {}
+        for field in self.fields:
+            if field not in data:
+                continue
+            try:
+                Post._meta.get_field(field).to_python(data[field])
+            except ValidationError:
+                # Сообщение об ошибке даст full_clean
+                pass
+            except (TypeError, ValueError):
+                # Например, число в поле даты - to_python не приводит его к ValidationError
+                errors[field] = [f'Неверный тип значения: {type(data[field]).__name__}']
+                continue
+            values[field] = data[field]
+
+        post = Post(user=self.user, **values)
+        try:
+            # Без user и branch проверка полей не обращается к БД
+            post.full_clean(exclude=['user', 'branch'])
+        except ValidationError as error:
+            errors.update(error.message_dict)
+
+        # Та же проверка, что в PostSerializer.validate_event_date (по локальной дате)
+        if 'event_date' not in errors and post.event_date > timezone.localdate():
+            errors['event_date'] = ['Дата события не может быть в будущем']
+
+        if errors:
+            self.add_error(line_number, errors)
+            return None, None
+        return post, branch_title.strip()
+
+    def resolve_branches(self, titles):
+        """Ветки пользователя по названиям - один запрос на пачку"""
+        from branches.models import Branch
+
+        missing = titles - set(self.branches)
+        if not missing:
+            return
+
+        # При одинаковых названиях берется самая ранняя ветка
+        for branch in Branch.objects.filter(
+            user=self.user, title__in=missing
+        ).order_by('-id'):
+            self.branches[branch.title] = branch
+
+        if self.create_branches:
+            for title in sorted(missing - set(self.branches)):
+                self.branches[title] = Branch.objects.create(user=self.user, title=title)
+
+    def finish(self):
+        """Сводки и счетчики по всем вставленным постам"""
+        from branches.models import Branch
+        from core.cache import invalidate
+        from timeline.models import TimelineMonth
+        from users.models import UserStats
+
+        TimelineMonth.apply_deltas(self.user.pk, self.months)
+        UserStats.apply_delta(self.user.pk, posts_count=self.published)
+
+        for branch_id, count in self.branch_counts.items():
+            Branch.apply_delta(branch_id, posts_count=count)
+
+        if self.created:
+            invalidate(users=[self.user.pk], branches=list(self.branch_counts))
@@ -0,0 +1,54 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.importing import PostImporter
+
+
+class Command(BaseCommand):
+    help = 'Импортирует посты пользователя из NDJSON-файла (или stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Путь к NDJSON-файлу или '-' для stdin")
+        parser.add_argument('--user', required=True, help='Username владельца постов')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PostImporter.batch_size,
+            help='Строк в пачке'
+        )
+        parser.add_argument(
+            '--create-branches',
+            action='store_true',
+            help='Создавать ветки, которых нет у пользователя'
+        )
+
+    def handle(self, *args, **options):
+        UserModel = get_user_model()
+        try:
+            user = UserModel.objects.get(username=options['user'])
+        except UserModel.DoesNotExist:
+            raise CommandError(f"Пользователь {options['user']} не найден")
+
+        importer = PostImporter(
+            user,
+            batch_size=options['batch_size'],
+            create_branches=options['create_branches']
+        )
+
+        if options['path'] == '-':
+            result = importer.run(sys.stdin)
+        else:
+            try:
+                with open(options['path'], encoding='utf-8') as lines:
+                    result = importer.run(lines)
+            except OSError as error:
+                raise CommandError(str(error))
+
+        for error in result['errors']:
+            self.stderr.write(f"строка {error['line']}: {error['errors']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Импортировано постов: {result['created']}, ошибок: {len(result['errors'])}"
+        ))
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.utils import timezone
@@ -17,6 +17,11 @@ class Post(models.Model):
         ACHIEVEMENT = 'achievement', _('Достижение')
         MILESTONE = 'milestone', _('Веха')
     
+    class Visibility(models.TextChoices):
+        PUBLIC = 'public', _('Публичный')
+        PRIVATE = 'private', _('В приватной ветке')
+        DRAFT = 'draft', _('Черновик')
+    
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -63,6 +68,15 @@ class Post(models.Model):
         help_text=_('Скрыть пост от других пользователей')
     )
     
+    visibility = models.CharField(
+        _('видимость'),
+        max_length=10,
+        choices=Visibility.choices,
+        default=Visibility.PUBLIC,
+        editable=False,
+        help_text=_('Вычисляется из is_draft и приватности ветки')
+    )
+    
     created_at = models.DateTimeField(
         _('дата создания'),
         auto_now_add=True
@@ -93,11 +107,125 @@ class Post(models.Model):
             models.Index(fields=['event_date']),
             models.Index(fields=['user', 'event_date']),
             models.Index(fields=['branch', 'event_date']),
+            # Частичный индекс для публичных лент без JOIN с веткой
+            models.Index(
+                fields=['visibility', '-event_date', '-created_at'],
+                name='post_public_event_idx',
+                condition=models.Q(visibility='public')
+            ),
         ]
     
+    # Поля, от которых зависят денормализованные сводки
+    TRACKED_FIELDS = ('user_id', 'branch_id', 'event_date', 'is_draft')
+    # Счетчики меняются только дельтами (Like) и пересчетом
+    COUNTERS = ('likes_count',)
+    
     def __str__(self):
         return f"{self.title} ({self.user.username})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_state()
+        return instance
+    
+    def _remember_state(self):
+        """Запоминаем состояние поста, сохраненное в БД"""
+        if all(field in self.__dict__ for field in self.TRACKED_FIELDS):
+            self._saved_state = self.get_tracked_state()
+        else:
+            self._saved_state = None
+    
+    def get_tracked_state(self):
+        return tuple(getattr(self, field) for field in self.TRACKED_FIELDS)
+    
+    def get_saved_state(self):
+        """Состояние поста в БД или None для нового поста"""
+        if self._state.adding or self.pk is None:
+            return None
+        
+        state = getattr(self, '_saved_state', None)
+        if state is None:
+            state = Post.objects.filter(pk=self.pk).values_list(
+                *self.TRACKED_FIELDS
+            ).first()
+        return state
+    
+    def compute_visibility(self):
+        if self.is_draft:
+            return self.Visibility.DRAFT
+        if self.branch.is_private:
+            return self.Visibility.PRIVATE
+        return self.Visibility.PUBLIC
+    
+    @classmethod
+    def branch_privacy_changed(cls, branch):
+        """Пересчет видимости постов ветки одним UPDATE"""
+        published = cls.Visibility.PRIVATE if branch.is_private else cls.Visibility.PUBLIC
+        cls.objects.filter(branch=branch).exclude(
+            visibility=cls.Visibility.DRAFT
+        ).update(visibility=published)
+    
+    def save(self, *args, **kwargs):
+        from branches.models import Branch
+        from core.cache import invalidate
+        from timeline.models import TimelineMonth
+        from subscriptions.feed import schedule_fanout
+        from users.models import UserStats
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'is_draft', 'branch', 'branch_id'} & set(update_fields):
+            self.visibility = self.compute_visibility()
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, 'visibility']
+        
+        previous = self.get_saved_state()
+        if previous is not None and kwargs.get('update_fields') is None:
+            # Счетчики экземпляра могли устареть - полное сохранение
+            # не должно затирать параллельные лайки
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTERS
+                and field.attname not in deferred
+            ]
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Сводка временной шкалы и счетчики автора - в той же транзакции
+            current = self.get_tracked_state()
+            TimelineMonth.post_saved(current, previous)
+            UserStats.post_saved(current, previous)
+            Branch.post_saved(current, previous)
+            
+            # Публикация поста - раскладка в ленты подписчиков в фоне
+            was_published = previous is not None and not previous[3]
+            if not self.is_draft and not was_published:
+                schedule_fanout(self.pk)
+            
+            users, branches = {self.user_id}, {self.branch_id}
+            if previous is not None:
+                users.add(previous[0])
+                branches.add(previous[1])
+            invalidate(users=users, branches=branches)
+        self._remember_state()
+    
+    def delete(self, *args, **kwargs):
+        from branches.models import Branch
+        from core.cache import invalidate
+        from timeline.models import TimelineMonth
+        from users.models import UserStats
+        
+        previous = self.get_saved_state()
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if previous is not None:
+                TimelineMonth.post_deleted(previous)
+                UserStats.post_deleted(previous)
+                Branch.apply_delta(previous[1], posts_count=-1)
+                invalidate(users=[previous[0]], branches=[previous[1]])
+        return result
+    
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse('posts:detail', kwargs={'pk': self.pk})
@@ -118,9 +246,9 @@ class Post(models.Model):
         """
         Проверка прав на просмотр поста.
         """
-        if self.is_draft:
-            if user.is_authenticated:
-                return user == self.user or user.is_staff
-            return False
+        if self.visibility == self.Visibility.PUBLIC:
+            return True
         
-        return self.branch.can_view(user)
\ No newline at end of file
+        if user.is_authenticated:
+            return user.pk == self.user_id or user.is_staff
+        return False
\ No newline at end of file
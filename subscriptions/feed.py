@@ -0,0 +1,401 @@
+"""
+Лента подписок с материализацией при записи (fan-out on write).
+
+Опубликованный пост в публичной ветке раскладывается во входящие
+подписчиков автора и ветки фоновой задачей (subscriptions.tasks).
+Для аккаунтов с числом подписчиков больше FEED_FANOUT_LIMIT раскладка
+не делается: их посты подмешиваются при чтении ленты. При отписке
+посты цели убираются из входящих той же фоновой очередью.
+
+Хранилище задается настройкой FEED_BACKEND:
+    subscriptions.feed.DatabaseFeedBackend - таблица FeedEntry
+    subscriptions.feed.RedisFeedBackend    - sorted set на подписчика
+    subscriptions.feed.LocMemFeedBackend   - память процесса (тесты)
+"""
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+
+class BaseFeedBackend:
+    """Интерфейс хранилища входящих"""
+
+    def __init__(self, **options):
+        self.options = options
+
+    def push(self, post_id, subscriber_ids):
+        """Добавить пост во входящие подписчиков"""
+        raise NotImplementedError
+
+    def push_many(self, entries):
+        """Добавить пачку (post_id, subscriber_ids) - для заполнения входящих"""
+        for post_id, subscriber_ids in entries:
+            self.push(post_id, subscriber_ids)
+
+    def remove(self, post_id, subscriber_ids):
+        """Убрать пост из входящих подписчиков"""
+        raise NotImplementedError
+
+    def discard(self, subscriber_id, post_ids):
+        """Убрать посты из входящих одного подписчика"""
+        raise NotImplementedError
+
+    def read(self, subscriber_id, before=None, limit=20):
+        """id постов по убыванию, строго меньше before"""
+        raise NotImplementedError
+
+
+class DatabaseFeedBackend(BaseFeedBackend):
+    """Входящие в таблице FeedEntry"""
+    batch_size = 1000
+
+    def push(self, post_id, subscriber_ids):
+        from .models import FeedEntry
+
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(subscriber_id=subscriber_id, post_id=post_id)
+             for subscriber_id in subscriber_ids),
+            batch_size=self.options.get('batch_size', self.batch_size),
+            ignore_conflicts=True
+        )
+
+    def push_many(self, entries):
+        from .models import FeedEntry
+
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(subscriber_id=subscriber_id, post_id=post_id)
+             for post_id, subscriber_ids in entries
+             for subscriber_id in subscriber_ids),
+            batch_size=self.options.get('batch_size', self.batch_size),
+            ignore_conflicts=True
+        )
+
+    def remove(self, post_id, subscriber_ids):
+        from .models import FeedEntry
+
+        FeedEntry.objects.filter(
+            post_id=post_id, subscriber_id__in=list(subscriber_ids)
+        ).delete()
+
+    def discard(self, subscriber_id, post_ids):
+        from .models import FeedEntry
+
+        FeedEntry.objects.filter(
+            subscriber_id=subscriber_id, post_id__in=list(post_ids)
+        ).delete()
+
+    def read(self, subscriber_id, before=None, limit=20):
+        from .models import FeedEntry
+
+        entries = FeedEntry.objects.filter(subscriber_id=subscriber_id)
+        if before is not None:
+            entries = entries.filter(post_id__lt=before)
+        return list(
+            entries.order_by('-post_id').values_list('post_id', flat=True)[:limit]
+        )
+
+
+class RedisFeedBackend(BaseFeedBackend):
+    """Входящие в Redis: sorted set feed:<id> со score = id поста"""
+    key_prefix = 'feed'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        import redis
+
+        self.client = redis.Redis.from_url(
+            options.get('url') or settings.REDIS_URL
+        )
+        self.max_length = options.get('max_length', settings.FEED_MAX_LENGTH)
+
+    def key(self, subscriber_id):
+        return f'{self.key_prefix}:{subscriber_id}'
+
+    def push(self, post_id, subscriber_ids):
+        pipe = self.client.pipeline(transaction=False)
+        for subscriber_id in subscriber_ids:
+            key = self.key(subscriber_id)
+            pipe.zadd(key, {post_id: post_id})
+            # Храним только последние max_length записей
+            pipe.zremrangebyrank(key, 0, -self.max_length - 1)
+        pipe.execute()
+
+    def remove(self, post_id, subscriber_ids):
+        pipe = self.client.pipeline(transaction=False)
+        for subscriber_id in subscriber_ids:
+            pipe.zrem(self.key(subscriber_id), post_id)
+        pipe.execute()
+
+    def discard(self, subscriber_id, post_ids):
+        post_ids = list(post_ids)
+        if post_ids:
+            self.client.zrem(self.key(subscriber_id), *post_ids)
+
+    def read(self, subscriber_id, before=None, limit=20):
+        upper = f'({before}' if before is not None else '+inf'
+        ids = self.client.zrevrangebyscore(
+            self.key(subscriber_id), upper, '-inf', start=0, num=limit
+        )
+        return [int(post_id) for post_id in ids]
+
+
+class LocMemFeedBackend(BaseFeedBackend):
+    """Входящие в памяти процесса - для тестов и локального запуска"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.inboxes = {}
+        self.lock = threading.Lock()
+
+    def push(self, post_id, subscriber_ids):
+        with self.lock:
+            for subscriber_id in subscriber_ids:
+                self.inboxes.setdefault(subscriber_id, set()).add(post_id)
+
+    def remove(self, post_id, subscriber_ids):
+        with self.lock:
+            for subscriber_id in subscriber_ids:
+                self.inboxes.get(subscriber_id, set()).discard(post_id)
+
+    def discard(self, subscriber_id, post_ids):
+        with self.lock:
+            self.inboxes.get(subscriber_id, set()).difference_update(post_ids)
+
+    def read(self, subscriber_id, before=None, limit=20):
+        with self.lock:
+            ids = sorted(self.inboxes.get(subscriber_id, ()), reverse=True)
+        if before is not None:
+            ids = [post_id for post_id in ids if post_id < before]
+        return ids[:limit]
+
+
+@lru_cache(maxsize=None)
+def get_feed_backend():
+    backend_class = import_string(settings.FEED_BACKEND)
+    return backend_class(**getattr(settings, 'FEED_BACKEND_OPTIONS', {}))
+
+
+def get_post_subscribers(post):
+    """
+    id подписчиков, которым пост раскладывается при записи.
+
+    Подписчики аккаунтов и веток сверх FEED_FANOUT_LIMIT пропускаются -
+    такие посты подмешиваются при чтении.
+    """
+    from .models import Subscription
+
+    limit = settings.FEED_FANOUT_LIMIT
+    audiences = [
+        Subscription.objects.filter(
+            target_user_id=post.user_id, target_branch__isnull=True
+        ),
+        Subscription.objects.filter(target_branch_id=post.branch_id),
+    ]
+
+    subscriber_ids = set()
+    for subscriptions in audiences:
+        ids = list(subscriptions.values_list('subscriber_id', flat=True)[:limit + 1])
+        if len(ids) <= limit:
+            subscriber_ids.update(ids)
+
+    subscriber_ids.discard(post.user_id)
+    return subscriber_ids
+
+
+def fanout_post(post_id):
+    """Раскладка опубликованного поста во входящие подписчиков"""
+    from posts.models import Post
+
+    post = Post.objects.filter(
+        pk=post_id, visibility=Post.Visibility.PUBLIC
+    ).first()
+    if post is None:
+        return 0
+
+    subscriber_ids = get_post_subscribers(post)
+    if subscriber_ids:
+        get_feed_backend().push(post.pk, subscriber_ids)
+    return len(subscriber_ids)
+
+
+def backfill_feeds(subscriptions=None, batch_size=2000):
+    """
+    Заполнение входящих уже опубликованными постами по текущим подпискам.
+
+    Для данных, вставленных в обход Post.save (create_sample_data,
+    перенос хранилища); правила те же, что у fanout_post. Аудитории
+    подписок держатся в памяти, посты читаются пачками по id.
+    subscriptions - queryset подписок для заполнения (по умолчанию все).
+    Возвращает число разложенных записей.
+    """
+    from posts.models import Post
+    from .models import Subscription
+
+    limit = settings.FEED_FANOUT_LIMIT
+    if subscriptions is None:
+        subscriptions = Subscription.objects.all()
+
+    by_user, by_branch = {}, {}
+    for subscriber_id, user_id, branch_id in subscriptions.values_list(
+        'subscriber_id', 'target_user_id', 'target_branch_id'
+    ).iterator():
+        if branch_id is not None:
+            by_branch.setdefault(branch_id, []).append(subscriber_id)
+        else:
+            by_user.setdefault(user_id, []).append(subscriber_id)
+
+    # Аудитории сверх лимита читаются при построении ленты
+    for audiences in (by_user, by_branch):
+        for target_id in [key for key, ids in audiences.items() if len(ids) > limit]:
+            del audiences[target_id]
+
+    posts = Post.objects.filter(
+        visibility=Post.Visibility.PUBLIC
+    ).order_by('pk').values_list('pk', 'user_id', 'branch_id')
+
+    backend = get_feed_backend()
+    pushed = 0
+    last_id = 0
+    while True:
+        batch = list(posts.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            return pushed
+
+        entries = []
+        for post_id, user_id, branch_id in batch:
+            audience = set(by_user.get(user_id, ()))
+            audience.update(by_branch.get(branch_id, ()))
+            audience.discard(user_id)
+            if audience:
+                entries.append((post_id, audience))
+                pushed += len(audience)
+        backend.push_many(entries)
+        last_id = batch[-1][0]
+
+
+def schedule_fanout(post_id):
+    """Раскладка фоновой задачей после фиксации транзакции, в которой сохранен пост"""
+    from core.tasks import defer
+    from .tasks import fanout_posts
+
+    defer(fanout_posts, [post_id])
+
+
+def purge_feed(subscriber_id, user_id=None, branch_id=None, batch_size=1000):
+    """
+    Удаление из входящих подписчика постов аккаунта или ветки,
+    от которых он отписался.
+
+    Посты, которые подписчик по-прежнему получает через другую
+    подписку (на автора или на ветку поста), остаются.
+    """
+    from posts.models import Post
+    from .models import Subscription
+
+    if user_id is None and branch_id is None:
+        return 0
+
+    subscriptions = Subscription.objects.filter(subscriber_id=subscriber_id)
+    posts = Post.objects.filter(
+        Q(user_id=user_id) if user_id is not None else Q(branch_id=branch_id)
+    ).exclude(
+        user_id__in=subscriptions.filter(
+            target_branch__isnull=True
+        ).values('target_user')
+    ).exclude(
+        branch_id__in=subscriptions.filter(
+            target_branch__isnull=False
+        ).values('target_branch')
+    )
+
+    backend = get_feed_backend()
+    purged = 0
+    last_id = 0
+    while True:
+        post_ids = list(
+            posts.filter(pk__gt=last_id).order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not post_ids:
+            return purged
+        backend.discard(subscriber_id, post_ids)
+        purged += len(post_ids)
+        last_id = post_ids[-1]
+
+
+def schedule_purge(subscriber_id, user_id=None, branch_id=None):
+    """Очистка входящих фоновой задачей после фиксации отписки"""
+    from core.tasks import defer
+    from .tasks import purge_feeds
+
+    defer(purge_feeds, [subscriber_id], user_id, branch_id)
+
+
+def get_pull_sources(user):
+    """
+    Аккаунты и ветки из подписок пользователя, посты которых
+    не раскладываются при записи, а читаются при построении ленты.
+
+    Отбор одним запросом по денормализованным счетчикам
+    (UserStats.followers_count, Branch.subscribers_count) среди подписок
+    читателя, без группировки всех подписок на аккаунты.
+    followers_count учитывает и подписчиков
+    веток, поэтому не меньше числа подписчиков аккаунта: лишний
+    источник лишь повторит пост из входящих, а повторы отбрасываются.
+    """
+    from .models import Subscription
+
+    limit = settings.FEED_FANOUT_LIMIT
+    sources = Subscription.objects.filter(
+        Q(target_branch__isnull=True, target_user__stats__followers_count__gt=limit)
+        | Q(target_branch__subscribers_count__gt=limit),
+        subscriber=user
+    ).values_list('target_user', 'target_branch')
+
+    user_ids, branch_ids = [], []
+    for user_id, branch_id in sources:
+        if branch_id is not None:
+            branch_ids.append(branch_id)
+        else:
+            user_ids.append(user_id)
+    return user_ids, branch_ids
+
+
+def read_feed(user, before=None, limit=20):
+    """
+    Страница ленты: входящие плюс посты "тяжелых" аккаунтов.
+
+    Возвращает (posts, next_before), где next_before - курсор
+    следующей страницы или None.
+    """
+    from posts.models import Post
+
+    post_ids = set(get_feed_backend().read(user.pk, before=before, limit=limit + 1))
+
+    user_ids, branch_ids = get_pull_sources(user)
+    if user_ids or branch_ids:
+        pulled = Post.objects.filter(
+            Q(user_id__in=user_ids) | Q(branch_id__in=branch_ids),
+            visibility=Post.Visibility.PUBLIC
+        )
+        if before is not None:
+            pulled = pulled.filter(pk__lt=before)
+        post_ids.update(
+            pulled.order_by('-pk').values_list('pk', flat=True)[:limit + 1]
+        )
+
+    post_ids = sorted(post_ids, reverse=True)
+    post_ids = post_ids[:limit + 1]
+    next_before = post_ids[limit - 1] if len(post_ids) > limit else None
+    post_ids = post_ids[:limit]
+
+    # Устаревшие записи (черновик, приватная ветка, удаление) отсекаются здесь
+    posts = Post.objects.filter(
+        pk__in=post_ids,
+        visibility=Post.Visibility.PUBLIC
+    ).select_related('user', 'branch').order_by('-pk')
+
+    return list(posts), next_before
@@ -94,13 +94,96 @@ class Subscription(models.Model):
                 _('Нельзя подписаться на приватную ветку')
             )
     
+    def get_target_owner_id(self):
+        """Пользователь, у которого появляется подписчик"""
+        if self.target_branch_id:
+            return self.target_branch.user_id
+        return self.target_user_id
+    
+    def invalidate_cache(self):
+        from core.cache import invalidate
+        
+        invalidate(
+            users=[self.subscriber_id, self.get_target_owner_id()],
+            branches=[self.target_branch_id]
+        )
+    
+    def counters_changed(self):
+        """
+        Пересчет счетчиков подписчика, владельца цели и ветки в фоновой
+        задаче: у популярных аккаунтов строка счетчиков - общая точка
+        блокировки для всех новых подписчиков.
+        """
+        from core.tasks import schedule_counters
+        
+        schedule_counters(
+            'users.UserStats',
+            [self.subscriber_id, self.get_target_owner_id()],
+            'followers_count', 'following_count'
+        )
+        schedule_counters('branches.Branch', [self.target_branch_id], 'subscribers_count')
+    
     def save(self, *args, **kwargs):
         self.clean()
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if adding:
+            self.counters_changed()
+        self.invalidate_cache()
+    
+    def delete(self, *args, **kwargs):
+        from .feed import schedule_purge
         
-        # Обновляем счетчики
-        if self.target_user:
-            self.target_user.update_counts()
-        elif self.target_branch:
-            self.target_branch.user.update_counts()
-            self.target_branch.update_counts()
\ No newline at end of file
+        result = super().delete(*args, **kwargs)
+        if result[0]:
+            self.counters_changed()
+            schedule_purge(
+                self.subscriber_id,
+                user_id=self.target_user_id,
+                branch_id=self.target_branch_id
+            )
+            self.invalidate_cache()
+        return result
+
+
+class FeedEntry(models.Model):
+    """
+    Запись ленты подписчика (fan-out on write).
+    
+    Хранилище DatabaseFeedBackend: пост попадает во входящие
+    подписчиков автора и ветки при публикации.
+    """
+    subscriber = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name=_('подписчик')
+    )
+    
+    post = models.ForeignKey(
+        'posts.Post',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name=_('пост')
+    )
+    
+    created_at = models.DateTimeField(
+        _('дата создания'),
+        auto_now_add=True
+    )
+    
+    class Meta:
+        verbose_name = _('запись ленты')
+        verbose_name_plural = _('записи ленты')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subscriber', 'post'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['subscriber', '-post']),
+        ]
+    
+    def __str__(self):
+        return f"{self.subscriber_id} ← {self.post_id}"
@@ -0,0 +1,43 @@
+from celery import shared_task
+from django.db import DatabaseError
+
+from core.tasks import BatchTask
+
+
+@shared_task(
+    base=BatchTask,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def fanout_posts(post_ids):
+    """
+    Раскладка опубликованных постов во входящие подписчиков.
+
+    Повтор безопасен: хранилища входящих не дублируют записи, а
+    неопубликованные к этому времени посты пропускаются.
+    """
+    from .feed import fanout_post
+
+    return sum(fanout_post(post_id) for post_id in post_ids)
+
+
+@shared_task(
+    base=BatchTask,
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def purge_feeds(subscriber_ids, user_id=None, branch_id=None):
+    """
+    Удаление постов аккаунта или ветки из входящих отписавшихся.
+
+    Подписки проверяются при выполнении: если подписчик успел
+    подписаться снова, его входящие не трогаются.
+    """
+    from .feed import purge_feed
+
+    return sum(
+        purge_feed(subscriber_id, user_id, branch_id)
+        for subscriber_id in subscriber_ids
+    )
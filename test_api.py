@@ -0,0 +1,105 @@
+"""
+Ответы API: поля, пагинация, кэш по версиям, экспорт, метрики.
+"""
+
+
+def test_liked_by_me_with_fields_without_id(api, make_user, make_post):
+    """?fields= без id: ответ без liked_by_me, а не 500"""
+    from likes.models import Like
+
+    author, viewer = make_user(), make_user()
+    post = make_post(author)
+    Like.toggle(viewer, post)
+    api.force_authenticate(viewer)
+
+    response = api.get('/posts/', {'fields': 'title', 'user': author.pk})
+    assert response.status_code == 200
+    assert response.data['results'] == [{'title': post.title}]
+
+    response = api.get(f'/posts/{post.pk}/', {'fields': 'title'})
+    assert response.status_code == 200
+    assert response.data == {'title': post.title}
+
+    response = api.get('/posts/', {'fields': 'id,title', 'user': author.pk})
+    assert [dict(row) for row in response.data['results']] == [
+        {'id': post.pk, 'title': post.title, 'liked_by_me': True}
+    ]
+
+
+def test_async_liked_by_me_with_fields_without_id(api, make_user, make_post):
+    author, viewer = make_user(), make_user()
+    make_post(author)
+    # Асинхронные представления проверяют сессию
+    api.force_login(viewer)
+
+    response = api.get('/async/posts/', {'fields': 'title'})
+    assert response.status_code == 200
+    assert all(set(row) == {'title'} for row in response.json()['results'])
+
+
+def walk(api, url, params, link):
+    """Страницы по ссылкам next или previous до конца"""
+    pages = []
+    response = api.get(url, params)
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        pages.append([row['id'] for row in data['results']])
+        if not data[link]:
+            return pages
+        response = api.get(data[link])
+
+
+def test_cursor_pagination_over_ties(api, make_user, make_post):
+    """Вперед и назад по постам с одинаковыми ключами сортировки"""
+    import datetime
+    from django.utils import timezone
+    from posts.models import Post
+
+    user = make_user()
+    branch = make_post(user).branch
+    for index in range(8):
+        make_post(user, branch=branch, event_date=datetime.date(2020, 1, 1 + index % 2))
+    posts = Post.objects.filter(user=user)
+    # Совпадают и event_date, и created_at - порядок решает только id
+    posts.update(created_at=timezone.now())
+    expected = list(posts.order_by('-event_date', '-created_at', 'id').values_list('id', flat=True))
+    api.force_authenticate(user)
+
+    for url in ('/posts/', '/async/posts/'):
+        if url.startswith('/async/'):
+            api.force_login(user)
+        params = {'user': user.pk, 'pagination': 'cursor', 'page_size': 4}
+        forward = walk(api, url, params, 'next')
+        assert [pk for page in forward for pk in page] == expected
+        assert len(forward) == 3
+
+        # Назад от последней страницы - те же страницы в обратном порядке
+        last = api.get(url, params)
+        while last.json()['next']:
+            last = api.get(last.json()['next'])
+        backward = [[row['id'] for row in last.json()['results']]]
+        previous = last.json()['previous']
+        while previous:
+            data = api.get(previous).json()
+            backward.append([row['id'] for row in data['results']])
+            previous = data['previous']
+        assert backward[::-1] == forward
+
+
+def test_malformed_cursor_is_bad_request(api, make_user):
+    from api.pagination import encode_cursor
+
+    user = make_user()
+    api.force_authenticate(user)
+    api.force_login(user)
+    cursors = [
+        'не-курсор',
+        encode_cursor(['список']),
+        encode_cursor({'p': [1]}),
+        encode_cursor({'p': ['не дата', '2020-01-01T00:00:00Z', 1]}),
+    ]
+    for url in ('/posts/', '/async/posts/', '/feed/'):
+        for cursor in cursors:
+            response = api.get(url, {'cursor': cursor})
+            assert response.status_code == 400, (url, cursor, response.status_code)
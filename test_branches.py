@@ -0,0 +1,65 @@
+"""
+Таблица замыкания веток после создания, переносов и удалений.
+
+BranchClosure поддерживается при сохранении и удалении веток; после
+любой последовательности изменений она должна совпадать с rebuild()
+по parent_branch.
+"""
+
+
+def snapshot(user):
+    """Связи предок-потомок между ветками пользователя"""
+    from branches.models import BranchClosure
+
+    return sorted(
+        BranchClosure.objects.filter(descendant__user=user).values_list(
+            'ancestor_id', 'descendant_id', 'depth'
+        )
+    )
+
+
+def assert_matches_rebuild(user):
+    from branches.models import BranchClosure
+
+    live = snapshot(user)
+    BranchClosure.rebuild()
+    assert live == snapshot(user)
+
+
+def test_closure_matches_rebuild(api, make_user):
+    from branches.models import Branch
+
+    user = make_user()
+
+    def create(title, parent=None):
+        return Branch.objects.create(user=user, title=title, parent_branch=parent)
+
+    root = create('Корень')
+    child = create('Ребенок', root)
+    grandchild = create('Внук', child)
+    other = create('Другой корень')
+    create('Лист', grandchild)
+    assert_matches_rebuild(user)
+
+    # Перенос поддерева под другой корень и в корень
+    child.parent_branch = other
+    child.save()
+    assert_matches_rebuild(user)
+    grandchild.parent_branch = None
+    grandchild.save()
+    assert_matches_rebuild(user)
+
+    # Перенос через API, в том числе запрещенный - под собственного потомка
+    api.force_authenticate(user)
+    response = api.patch(f'/branches/{grandchild.pk}/', {'parent_branch': root.pk}, format='json')
+    assert response.status_code == 200
+    response = api.patch(f'/branches/{root.pk}/', {'parent_branch': grandchild.pk}, format='json')
+    assert response.status_code == 400
+    assert_matches_rebuild(user)
+
+    # Удаление середины цепочки: дети становятся корнями
+    Branch.objects.get(pk=grandchild.pk).delete()
+    assert_matches_rebuild(user)
+    Branch.objects.get(pk=other.pk).delete()
+    assert_matches_rebuild(user)
+    assert Branch.objects.get(pk=child.pk).parent_branch_id is None
@@ -0,0 +1,101 @@
+"""
+Кэш ответов по версиям и условные GET.
+
+Запись повышает версии пользователя и ветки после фиксации транзакции;
+ответ, закэшированный под старой версией, больше не отдается.
+"""
+
+
+def titles(response):
+    return [row['title'] for row in response.data['results']]
+
+
+def test_write_bumps_versions_on_commit(api, make_user, make_post):
+    from django.db import transaction
+    from core.cache import get_stats, get_versions
+
+    user = make_user()
+    post = make_post(user, title='Старый заголовок')
+    api.force_authenticate(user)
+    url = f'/branches/{post.branch_id}/posts/'
+    keys = [('user', user.pk), ('branch', post.branch_id)]
+
+    assert titles(api.get(url)) == ['Старый заголовок']
+    hits = get_stats()['hits']
+    assert titles(api.get(url)) == ['Старый заголовок']
+    assert get_stats()['hits'] == hits + 1
+
+    versions = get_versions(*keys)
+    with transaction.atomic():
+        post.title = 'Новый заголовок'
+        post.save()
+        # До фиксации данные не видны другим - версии прежние
+        assert get_versions(*keys) == versions
+    changed = get_versions(*keys)
+    assert all(new > old for new, old in zip(changed, versions))
+
+    assert titles(api.get(url)) == ['Новый заголовок']
+
+    # Откаченная запись версии не меняет
+    try:
+        with transaction.atomic():
+            post.title = 'Откаченный заголовок'
+            post.save()
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert get_versions(*keys) == changed
+
+
+def test_conditional_get_until_post_edit(api, make_user, make_post):
+    user = make_user()
+    post = make_post(user)
+    api.force_authenticate(user)
+
+    etags = {}
+    for url in (f'/branches/{post.branch_id}/posts/', f'/timeline/{user.username}/'):
+        response = api.get(url)
+        assert response.status_code == 200
+        etags[url] = response['ETag']
+
+        response = api.get(url, HTTP_IF_NONE_MATCH=etags[url])
+        assert response.status_code == 304
+        assert response['ETag'] == etags[url]
+
+    response = api.patch(f'/posts/{post.pk}/', {'event_date': '2019-05-01'}, format='json')
+    assert response.status_code == 200
+
+    for url, etag in etags.items():
+        response = api.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response['ETag'] != etag
+        assert api.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+
+
+def liked_flags(response):
+    if response.streaming:
+        import json
+        return [row['liked_by_me'] for row in json.loads(b''.join(response.streaming_content))['posts']]
+    return [row['liked_by_me'] for row in response.data['results']]
+
+
+def test_etag_is_per_viewer(api, make_user, make_post):
+    """Общий кэш данных, но liked_by_me и 304 - у каждого пользователя свои"""
+    from rest_framework.test import APIClient
+    from likes.models import Like
+
+    author, first, second = make_user(), make_user(), make_user()
+    post = make_post(author)
+    Like.toggle(first, post)
+    other = APIClient()
+    api.force_authenticate(first)
+    other.force_authenticate(second)
+
+    for url in (f'/branches/{post.branch_id}/posts/', f'/timeline/{author.username}/year/?year=2020'):
+        response, other_response = api.get(url), other.get(url)
+        assert liked_flags(response) == [True]
+        assert liked_flags(other_response) == [False]
+        assert response['ETag'] != other_response['ETag']
+        assert other.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 200
+        assert api.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
@@ -0,0 +1,62 @@
+"""
+Денормализованные счетчики после правок устаревших экземпляров.
+
+Счетчики меняются F() дельтами; полное сохранение экземпляра, прочитанного
+до дельты, не должно возвращать старое значение. После каждой
+последовательности записей счетчики сверяются с пересчетом по
+исходным таблицам (core.counters).
+"""
+
+
+def rebuilt(model_label, pk):
+    """Значения счетчиков строки, пересчитанные по источникам"""
+    from core.counters import COUNTERS, count_sources
+
+    return {
+        field: count_sources(sources, **{'in': [pk]}).get(pk, 0)
+        for field, sources in COUNTERS[model_label].items()
+    }
+
+
+def stored(model, pk):
+    from core.counters import COUNTERS
+
+    fields = list(COUNTERS[model._meta.label])
+    return dict(zip(fields, model.objects.filter(pk=pk).values_list(*fields).get()))
+
+
+def test_edited_branch_keeps_counters(api, make_user, make_post):
+    from branches.models import Branch
+    from posts.models import Post
+    from subscriptions.models import Subscription
+
+    owner, follower = make_user(), make_user()
+    branch = make_post(owner).branch
+    stale = Branch.objects.get(pk=branch.pk)
+
+    make_post(owner, branch=branch)
+    make_post(owner, branch=branch)
+    Subscription.objects.create(subscriber=follower, target_branch=branch)
+
+    # Сохранение экземпляра, прочитанного до новых постов и подписки
+    stale.title = 'Переименованная ветка'
+    stale.save()
+    api.force_authenticate(owner)
+    response = api.patch(f'/branches/{branch.pk}/', {'description': 'Описание'}, format='json')
+    assert response.status_code == 200
+
+    assert stored(Branch, branch.pk) == rebuilt('branches.Branch', branch.pk)
+
+    # Уменьшения до нуля не нарушают CHECK счетчиков
+    for post in Post.objects.filter(branch=branch):
+        post.delete()
+    assert stored(Branch, branch.pk) == rebuilt('branches.Branch', branch.pk)
+    assert Branch.objects.get(pk=branch.pk).title == 'Переименованная ветка'
+
+
+def test_branch_decrement_stops_at_zero(make_user, make_post):
+    from branches.models import Branch
+
+    branch = make_post(make_user()).branch
+    Branch.apply_delta(branch.pk, posts_count=-5)
+    assert Branch.objects.get(pk=branch.pk).posts_count == 0
@@ -0,0 +1,126 @@
+"""
+Лента подписок: раскладка при записи и подмешивание при чтении.
+
+Посты аккаунтов с числом подписчиков до FEED_FANOUT_LIMIT попадают во
+входящие подписчиков, посты более популярных читаются при построении
+ленты. После отписки посты цели из ленты пропадают.
+"""
+from django.test.utils import override_settings
+
+
+def inbox(user):
+    from subscriptions.feed import get_feed_backend
+
+    return get_feed_backend().read(user.pk, limit=100)
+
+
+def feed(user):
+    from subscriptions.feed import read_feed
+
+    posts, _ = read_feed(user, limit=100)
+    return [post.pk for post in posts]
+
+
+def test_post_fans_out_to_subscribers(make_user, make_post):
+    from subscriptions.models import Subscription
+
+    author, reader, stranger = make_user(), make_user(), make_user()
+    Subscription.objects.create(subscriber=reader, target_user=author)
+
+    post = make_post(author)
+
+    assert inbox(reader) == [post.pk]
+    assert feed(reader) == [post.pk]
+    assert inbox(stranger) == [] and inbox(author) == []
+
+
+def test_popular_author_is_pulled(make_user, make_post):
+    from subscriptions.feed import get_pull_sources
+    from subscriptions.models import Subscription
+
+    author, reader = make_user(), make_user()
+    Subscription.objects.create(subscriber=reader, target_user=author)
+
+    with override_settings(FEED_FANOUT_LIMIT=0):
+        post = make_post(author)
+
+        assert inbox(reader) == []
+        assert get_pull_sources(reader) == ([author.pk], [])
+        assert feed(reader) == [post.pk]
+
+
+def test_unsubscribe_purges_inbox(make_user, make_post):
+    from branches.models import Branch
+    from subscriptions.models import Subscription
+
+    author, reader = make_user(), make_user()
+    branch = Branch.objects.create(user=author, title='Подписанная ветка')
+    by_author = Subscription.objects.create(subscriber=reader, target_user=author)
+    by_branch = Subscription.objects.create(subscriber=reader, target_branch=branch)
+
+    other = make_post(author)
+    kept = make_post(author, branch=branch)
+    assert inbox(reader) == [kept.pk, other.pk]
+
+    # Пост ветки остается: подписка на нее не отменена
+    by_author.delete()
+    assert inbox(reader) == [kept.pk]
+    assert feed(reader) == [kept.pk]
+
+    by_branch.delete()
+    assert inbox(reader) == []
+    assert feed(reader) == []
+
+
+def test_backfill_matches_fanout(make_user, make_post):
+    from branches.models import Branch
+    from posts.models import Post
+    from subscriptions.feed import backfill_feeds
+    from subscriptions.models import Subscription
+
+    author, popular, reader = make_user(), make_user(), make_user()
+    branch = Branch.objects.create(user=author, title='Ветка для заполнения')
+    # Посты до подписок: раскладки при записи не было
+    posts = [make_post(author), make_post(author, branch=branch), make_post(popular)]
+    draft = make_post(author, visibility=Post.Visibility.DRAFT)
+    Subscription.objects.create(subscriber=reader, target_branch=branch)
+    Subscription.objects.create(subscriber=reader, target_user=popular)
+    Subscription.objects.create(subscriber=author, target_user=popular)
+    assert inbox(reader) == []
+
+    subscriptions = Subscription.objects.filter(subscriber__in=[author, reader])
+    with override_settings(FEED_FANOUT_LIMIT=1):
+        assert backfill_feeds(subscriptions, batch_size=2) == 1
+    assert inbox(reader) == [posts[1].pk]
+    assert draft.pk not in inbox(author)
+
+    assert backfill_feeds(subscriptions, batch_size=2) == 3
+    assert inbox(reader) == [posts[2].pk, posts[1].pk]
+    assert inbox(author) == [posts[2].pk]
+
+
+def test_sample_data_fills_feeds(django_db):
+    import io
+    from django.core.management import call_command
+    from posts.models import Post
+    from subscriptions.feed import get_post_subscribers
+    from subscriptions.models import FeedEntry
+    from users.models import User
+
+    call_command(
+        'create_sample_data', users=30, posts=300, prefix='feed_sample',
+        stdout=io.StringIO()
+    )
+    try:
+        posts = Post.objects.filter(
+            user__username__startswith='feed_sample_',
+            visibility=Post.Visibility.PUBLIC
+        )
+        assert FeedEntry.objects.filter(post__in=posts).exists()
+        for post in posts:
+            subscribers = set(
+                FeedEntry.objects.filter(post=post).values_list('subscriber_id', flat=True)
+            )
+            assert subscribers == get_post_subscribers(post)
+    finally:
+        User.objects.filter(username__startswith='feed_sample_').delete()
@@ -0,0 +1,62 @@
+"""
+Импорт постов из NDJSON: ошибки по строкам и дата события.
+"""
+import datetime
+import json
+
+
+def ndjson(*rows):
+    return '\n'.join(row if isinstance(row, str) else json.dumps(row) for row in rows)
+
+
+def test_import_reports_errors_per_line(api, make_user):
+    from posts.models import Post
+
+    user = make_user()
+    api.force_authenticate(user)
+    tomorrow = datetime.date.today() + datetime.timedelta(days=2)
+    payload = ndjson(
+        {'branch': 'Импорт', 'content': 'Текст', 'title': 'Первый', 'event_date': '2020-01-01'},
+        {'branch': 'Импорт', 'content': 'Текст', 'title': 'Число вместо даты', 'event_date': 5},
+        '{не json',
+        {'branch': 'Импорт', 'content': 'Текст', 'title': 'Из будущего', 'event_date': tomorrow.isoformat()},
+        {'branch': 'Импорт', 'content': 'Текст', 'title': 'Неверная дата', 'event_date': '2020-13-01'},
+        {'branch': 'Импорт', 'content': 'Текст', 'title': 'Последний', 'event_date': '2020-02-01'},
+    )
+
+    response = api.post(
+        '/posts/import/?create_branches=1', payload, content_type='application/x-ndjson'
+    )
+
+    assert response.status_code == 201, response.data
+    assert response.data['created'] == 2
+    errors = {error['line']: error['errors'] for error in response.data['errors']}
+    assert set(errors) == {2, 3, 4, 5}
+    assert set(errors[2]) == {'event_date'}
+    assert set(errors[3]) == {'line'}
+    assert errors[4] == {'event_date': ['Дата события не может быть в будущем']}
+    assert set(errors[5]) == {'event_date'}
+    assert sorted(Post.objects.filter(user=user).values_list('title', flat=True)) == ['Первый', 'Последний']
+
+
+def test_future_event_date_matches_serializer(api, make_user, make_post):
+    """Импорт и PostSerializer отвергают одни и те же даты"""
+    from django.utils import timezone
+    from posts.importing import PostImporter
+
+    user = make_user()
+    branch = make_post(user).branch
+    api.force_authenticate(user)
+    today = timezone.localdate()
+
+    for event_date, valid in ((today, True), (today + datetime.timedelta(days=1), False)):
+        response = api.post('/posts/', {
+            'user_id': user.pk, 'branch': branch.pk, 'title': 'Пост',
+            'content': 'Текст', 'event_date': event_date.isoformat(),
+        }, format='json')
+        assert (response.status_code == 201) == valid
+
+        result = PostImporter(user).run([json.dumps({
+            'branch': branch.title, 'title': 'Пост', 'content': 'Текст', 'event_date': event_date.isoformat(),
+        })])
+        assert result['created'] == int(valid), result
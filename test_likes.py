@@ -0,0 +1,117 @@
+"""
+Счетчик лайков при параллельных переключениях.
+
+Like.toggle вызывается одновременно из нескольких потоков, каждый со
+своим соединением и транзакцией; после всех переключений
+Post.likes_count должен совпасть с числом строк Like.
+"""
+import datetime
+import threading
+
+import pytest
+
+
+THREADS = 8
+TOGGLES = 5
+
+
+@pytest.fixture
+def post(django_db):
+    from django.contrib.auth import get_user_model
+    from branches.models import Branch
+    from posts.models import Post
+
+    User = get_user_model()
+    owner = User.objects.create_user(username='likes_owner', password='pass')
+    branch = Branch.objects.create(user=owner, title='Лайки')
+    post = Post.objects.create(
+        user=owner, branch=branch, title='Пост для лайков',
+        content='Текст', event_date=datetime.date(2020, 1, 1)
+    )
+    users = [
+        User.objects.create_user(username=f'likes_user{index}', password='pass')
+        for index in range(THREADS)
+    ]
+    try:
+        yield post, users
+    finally:
+        User.objects.filter(pk__in=[owner.pk, *(user.pk for user in users)]).delete()
+
+
+def run_threads(target, args_list):
+    """Запуск target в потоках одновременно; исключения потоков пробрасываются"""
+    from django.db import connections
+
+    barrier = threading.Barrier(len(args_list))
+    errors = []
+
+    def worker(*args):
+        try:
+            barrier.wait()
+            target(*args)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def assert_counter_matches(post):
+    from likes.models import Like
+
+    post.refresh_from_db(fields=['likes_count'])
+    assert post.likes_count == Like.objects.filter(post=post).count()
+
+
+def test_concurrent_toggles_keep_likes_count(post):
+    """Разные пользователи переключают лайк одного поста несколько раз"""
+    from likes.models import Like
+
+    post, users = post
+
+    def toggle(user, times):
+        for _ in range(times):
+            Like.toggle(user, post)
+
+    # Нечетное число переключений оставляет лайк, четное - снимает
+    run_threads(toggle, [(user, TOGGLES + index % 2) for index, user in enumerate(users)])
+
+    assert_counter_matches(post)
+    assert post.likes_count == sum(1 for index in range(THREADS) if (TOGGLES + index % 2) % 2)
+
+
+def test_concurrent_toggles_by_one_user(post):
+    """Один пользователь переключает лайк из нескольких потоков"""
+    from likes.models import Like
+
+    post, users = post
+    user = users[0]
+
+    run_threads(lambda: Like.toggle(user, post), [()] * THREADS)
+
+    assert_counter_matches(post)
+    assert post.likes_count in (0, 1)
+
+
+def test_stale_post_save_keeps_likes(post):
+    """Полное сохранение экземпляра, прочитанного до лайка, не теряет лайк"""
+    from likes.models import Like
+    from posts.models import Post
+
+    post, users = post
+    stale = Post.objects.get(pk=post.pk)
+    Like.toggle(users[0], post)
+
+    stale.title = 'Измененный пост'
+    stale.save()
+
+    assert_counter_matches(post)
+    assert post.likes_count == 1
+    assert Post.objects.get(pk=post.pk).title == 'Измененный пост'
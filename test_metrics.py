@@ -0,0 +1,62 @@
+"""
+Server-Timing и метрики QueryMetricsMiddleware.
+
+Заголовок раскладывает время запроса на SQL, сериализацию и рендеринг
+JSON; те же замеры копятся в гистограммах по представлениям.
+"""
+import re
+
+
+def timings(response):
+    """Server-Timing -> {сегмент: мс}"""
+    return {
+        name: float(duration)
+        for name, duration in re.findall(r'(\w+);dur=([\d.]+)', response['Server-Timing'])
+    }
+
+
+def test_server_timing_segments(api, make_user, make_post):
+    from core.metrics import registry
+
+    user = make_user()
+    post = make_post(user)
+    for index in range(20):
+        make_post(user, branch=post.branch, title=f'Пост {index}')
+    api.force_authenticate(user)
+    registry.clear()
+
+    # Быстрый путь по values() и сериализаторы DRF (?expand=)
+    for params in ({}, {'expand': 'user'}):
+        response = api.get(f'/branches/{post.branch_id}/posts/', params)
+        assert response.status_code == 200
+        segments = timings(response)
+        assert set(segments) == {'db', 'serialize', 'render', 'total'}
+        assert segments['serialize'] > 0
+        assert segments['db'] + segments['serialize'] + segments['render'] <= segments['total']
+        assert re.search(r'desc="\d+ queries"', response['Server-Timing'])
+
+    metrics = registry.render()
+    counts = re.findall(
+        r'http_request_serialize_duration_seconds_count\{view="([^"]+)",method="GET"\} (\d+)',
+        metrics
+    )
+    assert [int(count) for _, count in counts] == [2]
+
+
+def test_serialization_measured_only_in_requests(make_user, make_post):
+    from api.serializers import PostSerializer
+    from core.metrics import RequestStats, _current_stats
+
+    post = make_post(make_user())
+
+    # Вне запроса замер не делается и ничего не ломает
+    assert PostSerializer(post).data['id'] == post.pk
+
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    try:
+        PostSerializer(post, expand=['user']).data
+    finally:
+        _current_stats.reset(token)
+    assert stats.serialize_time > 0
+    assert not stats.serializing
@@ -0,0 +1,104 @@
+"""
+Чтение с реплики и закрепление за основной базой после записи.
+
+Реплика - вторая SQLite-база с копией default. Копия не обновляется,
+поэтому по содержимому ответа и по запросам каждого соединения видно,
+откуда читал запрос.
+"""
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def replica(django_db, tmp_path):
+    """Алиас replica во втором файле; sync() копирует в него default"""
+    from django.db import connections
+    from django.test.utils import override_settings
+    from core import routing
+
+    path = tmp_path / 'replica.sqlite3'
+    default = connections['default']
+
+    def sync():
+        connections['replica'].close()
+        default.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            default.connection.backup(target)
+        finally:
+            target.close()
+
+    connections.settings['replica'] = {**default.settings_dict, 'NAME': str(path)}
+    routing._health.clear()
+    try:
+        with override_settings(DATABASE_REPLICAS=['replica']):
+            yield sync
+    finally:
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        routing._health.clear()
+
+
+def captured(request, *aliases):
+    """Ответ и SQL каждого соединения за время запроса"""
+    from contextlib import ExitStack
+    from django.db import connections
+    from django.test.utils import CaptureQueriesContext
+
+    with ExitStack() as stack:
+        contexts = {
+            alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+            for alias in aliases
+        }
+        response = request()
+    return response, {alias: [query['sql'] for query in context] for alias, context in contexts.items()}
+
+
+def test_reads_from_replica_until_own_write(api, make_user, make_post, replica):
+    user = make_user()
+    post = make_post(user, title='На реплике')
+    api.force_login(user)
+    replica()
+    # Запись после копии видна только в default
+    make_post(user, branch=post.branch, title='Только в основной')
+
+    def titles(response):
+        return sorted(row['title'] for row in response.data['results'])
+
+    response, queries = captured(lambda: api.get('/posts/', {'user': user.pk}), 'default', 'replica')
+    assert response.status_code == 200
+    assert titles(response) == ['На реплике']
+    assert queries['replica'] and not queries['default']
+
+    response, queries = captured(lambda: api.post('/posts/', {
+        'user_id': user.pk, 'branch': post.branch_id, 'title': 'Новый',
+        'content': 'Текст', 'event_date': '2020-01-02',
+    }, format='json'), 'default', 'replica')
+    assert response.status_code == 201
+    assert any(sql.startswith('INSERT') for sql in queries['default'])
+    assert not queries['replica']
+
+    # Клиент закреплен за default и видит свою запись
+    response, queries = captured(lambda: api.get('/posts/', {'user': user.pk}), 'default', 'replica')
+    assert titles(response) == ['На реплике', 'Новый', 'Только в основной']
+    assert queries['default'] and not queries['replica']
+
+
+def test_other_clients_still_read_from_replica(api, make_user, make_post, replica):
+    from rest_framework.test import APIClient
+
+    writer, reader = make_user(), make_user()
+    post = make_post(writer)
+    api.force_login(writer)
+    other = APIClient()
+    other.force_login(reader)
+    replica()
+
+    response = api.patch(f'/posts/{post.pk}/', {'title': 'Изменен'}, format='json')
+    assert response.status_code == 200
+
+    response, queries = captured(lambda: other.get(f'/posts/{post.pk}/'), 'default', 'replica')
+    assert response.data['title'] == 'Пост'
+    assert queries['replica'] and not queries['default']
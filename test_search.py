@@ -0,0 +1,71 @@
+"""
+Индекс полнотекстового поиска после migrate.
+
+Индекс создается обработчиком post_migrate (CoreConfig.ready): после
+migrate на базе без индекса FTS-таблицы и триггеры должны появиться,
+а пост - находиться поиском.
+"""
+import datetime
+
+import pytest
+
+
+def sqlite_objects(connection, names):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s)" % ', '.join(['%s'] * len(names)),
+            names
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def index_objects(backend, table):
+    fts = backend.fts_table(table)
+    return [fts, f'{fts}_ai', f'{fts}_ad', f'{fts}_au']
+
+
+def test_migrate_installs_search_index(django_db):
+    from django.contrib.auth import get_user_model
+    from django.core.management import call_command
+    from django.db import connection
+    from branches.models import Branch
+    from core.search import SEARCH_INDEXES, get_index, get_search_backend, search
+    from posts.models import Post
+
+    if connection.vendor != 'sqlite':
+        pytest.skip('проверка FTS5-таблиц SQLite')
+
+    backend = get_search_backend()
+    names = []
+    for name in SEARCH_INDEXES:
+        model, _, _ = get_index(name)
+        names.extend(index_objects(backend, model._meta.db_table))
+
+    # Индекс, созданный при создании тестовой базы, удаляется
+    with connection.cursor() as cursor:
+        for name in names:
+            if name.endswith('_fts'):
+                cursor.execute(f'DROP TABLE IF EXISTS {name}')
+            else:
+                cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    assert not sqlite_objects(connection, names)
+
+    User = get_user_model()
+    owner = User.objects.create_user(username='search_owner', password='pass')
+    try:
+        branch = Branch.objects.create(user=owner, title='Астрономия')
+        post = Post.objects.create(
+            user=owner, branch=branch, title='Наблюдение затмения',
+            content='Текст', event_date=datetime.date(2020, 1, 1)
+        )
+
+        call_command('migrate', verbosity=0, interactive=False)
+
+        assert sqlite_objects(connection, names) == set(names)
+        # Строки, созданные до migrate, попадают в новый индекс
+        found, _ = search('posts', 'затмения', owner)
+        assert [item.pk for item in found] == [post.pk]
+        found, _ = search('branches', 'астрономия', owner)
+        assert [item.pk for item in found] == [branch.pk]
+    finally:
+        owner.delete()
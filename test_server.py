@@ -0,0 +1,423 @@
+"""
+Нагрузочный набор API Knowledge Map.
+
+Каждый эндпоинт из api/views.py вызывается в процессе (APIClient через
+api.urls) на сгенерированных наборах данных нескольких размеров.
+Для каждого замеряются задержка p50/p99, число SQL-запросов и пик
+памяти; число запросов сверяется с бюджетом эндпоинта, так что
+регрессия N+1 роняет прогон.
+
+Запуск (настройки по умолчанию - config.test_settings):
+    python test_server.py --sizes 2000,20000 --output bench.json
+    pytest test_server.py        # бюджеты на малом наборе
+
+Данные создаются в отдельной тестовой базе и удаляются после прогона.
+"""
+import argparse
+import datetime
+import gzip
+import itertools
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.test_settings')
+
+REQUIRED_APPS = ('branches', 'posts', 'likes', 'subscriptions', 'timeline', 'core', 'api')
+
+# Максимум SQL-запросов на холодный (без кэша ответов) запрос.
+# Бюджеты списков проверяются на двух размерах страницы и не
+# должны зависеть от него.
+QUERY_BUDGETS = {
+    'users:list': 2,
+    'users:preview': 4,
+    'users:prefix': 2,
+    'users:detail': 1,
+    'users:timeline_data': 2,
+    'users:branches': 2,
+    'branches:list': 2,
+    'branches:detail': 2,
+    'branches:posts': 5,
+    'branches:ancestors': 3,
+    'branches:subtree': 4,
+    'posts:list': 3,
+    'posts:detail': 2,
+    'posts:likers': 2,
+    'posts:like': 10,
+    'posts:import': 17,
+    'subscriptions:list': 2,
+    'subscriptions:my': 1,
+    'likes:list': 2,
+    # Входящие, источники подмешивания, посты, liked_by_me
+    'feed': 4,
+    'timeline': 2,
+    'timeline:heatmap': 2,
+    # Плюс liked_by_me: запрос на каждые ZOOM_CHUNK_SIZE постов окна
+    'timeline:year': 5,
+    'timeline:month': 5,
+    'timeline:day': 5,
+    'timeline:range': 5,
+    # Асинхронные представления читают сессию и пользователя (2 запроса)
+    'async:timeline': 4,
+    'async:user_branches': 4,
+    'async:user_overview': 6,
+    'async:posts': 4,
+    'branches:create': 7,
+    'branches:update': 6,
+    # Каскад: замыкание, подписки, месяцы шкалы, счетчики
+    'branches:delete': 14,
+    # Включая раскладку в ленты: без брокера задачи выполняются в запросе
+    'posts:create': 18,
+    'posts:update': 10,
+    'posts:delete': 9,
+    'search:posts': 3,
+    'search:branches': 2,
+    'export': 3,
+    'cache-stats': 0,
+}
+
+PAGE_SIZES = (10, 50)
+
+
+def setup_django():
+    import django
+
+    django.setup()
+    from django.conf import settings
+
+    missing = [app for app in REQUIRED_APPS if app not in settings.INSTALLED_APPS]
+    return missing
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+class Bench:
+    """Прогон эндпоинтов на одном наборе данных"""
+
+    def __init__(self, size, repeat):
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIClient
+
+        self.size = size
+        self.repeat = repeat
+        self.results = []
+        self.violations = []
+
+        User = get_user_model()
+        prefix = f'bench{size}'
+        users = User.objects.filter(username__startswith=f'{prefix}_')
+        # Самый активный автор и один из его подписчиков
+        self.owner = users.order_by('-stats__posts_count', 'pk').first()
+        self.viewer = users.filter(
+            subscriptions__target_user=self.owner
+        ).first() or users.exclude(pk=self.owner.pk).first()
+        self.viewer.is_staff = True
+        self.viewer.save(update_fields=['is_staff'])
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        # Асинхронные представления проверяют сессию, а не force_authenticate
+        self.session_client = APIClient()
+        self.session_client.force_login(self.viewer)
+
+    def run(self):
+        from branches.models import Branch
+        from posts.models import Post
+
+        owner = self.owner.username
+        branch = Branch.objects.filter(
+            user=self.owner, is_private=False
+        ).order_by('-posts_count').first()
+        leaf = Branch.objects.filter(
+            user=self.owner, is_private=False, parent_branch__isnull=False
+        ).first() or branch
+        post = Post.objects.filter(visibility=Post.Visibility.PUBLIC).order_by('-likes_count').first()
+        # Изменять пост может только автор - лайк ставится на свой пост
+        own_post = Post.objects.filter(user=self.viewer).first()
+        word = post.title.split()[0]
+
+        # Прогрев: импорт модулей и шаблонов не должен попасть в пик памяти
+        self.request('get', '/users/')
+
+        for page_size in PAGE_SIZES:
+            paged = f'page_size={page_size}'
+            self.measure('users:list', 'get', f'/users/?{paged}', page_size)
+            self.measure('users:preview', 'get', f'/users/?preview=5&{paged}', page_size)
+            self.measure('branches:list', 'get', f'/branches/?{paged}', page_size)
+            self.measure('branches:posts', 'get', f'/branches/{branch.pk}/posts/?{paged}', page_size)
+            self.measure(
+                'branches:posts', 'get',
+                f'/branches/{branch.pk}/posts/?include_descendants=1&{paged}', page_size
+            )
+            self.measure('posts:list', 'get', f'/posts/?{paged}', page_size)
+            self.measure('posts:list', 'get', f'/posts/?pagination=cursor&{paged}', page_size)
+            self.measure('posts:list', 'get', f'/posts/?expand=user&{paged}', page_size)
+            self.measure('subscriptions:list', 'get', f'/subscriptions/?{paged}', page_size)
+            self.measure('likes:list', 'get', f'/likes/?{paged}', page_size)
+            self.measure('feed', 'get', f'/feed/?{paged}', page_size)
+            self.measure('search:posts', 'get', f'/search/?q={word}&{paged}', page_size)
+            self.measure('search:branches', 'get', f'/search/?q={branch.title}&type=branches&{paged}', page_size)
+
+        self.measure('users:detail', 'get', f'/users/{owner}/')
+        self.measure('users:timeline_data', 'get', f'/users/{owner}/timeline_data/')
+        self.measure('users:branches', 'get', f'/users/{owner}/branches/')
+        self.measure('branches:detail', 'get', f'/branches/{branch.pk}/')
+        self.measure('branches:ancestors', 'get', f'/branches/{leaf.pk}/ancestors/')
+        self.measure('branches:subtree', 'get', f'/branches/{branch.pk}/subtree/')
+        self.measure('posts:detail', 'get', f'/posts/{post.pk}/')
+        self.measure('posts:likers', 'get', f'/posts/{post.pk}/likers/')
+        likers = self.request('get', f'/posts/{post.pk}/likers/?page_size=2').json()
+        if likers['next']:
+            self.measure('posts:likers', 'get', likers['next'])
+        self.measure('users:prefix', 'get', f'/users/?username={owner[:3]}')
+        # Четное число повторов - лайк возвращается в исходное состояние
+        self.measure('posts:like', 'post', f'/posts/{own_post.pk}/like/', repeat=self.repeat * 2)
+        self.measure(
+            'posts:import', 'post', '/posts/import/?create_branches=1',
+            data=self.import_payload(), content_type='application/x-ndjson', repeat=3
+        )
+        self.measure_writes()
+        self.measure('subscriptions:my', 'get', '/subscriptions/my_subscriptions/')
+        self.measure('timeline', 'get', f'/timeline/{owner}/')
+        self.measure('timeline:heatmap', 'get', f'/timeline/{owner}/heatmap/?by_branch=1')
+        # Окна вокруг даты самого популярного поста автора
+        anchor = Post.objects.filter(user=self.owner).order_by('-likes_count').first().event_date
+        self.measure('timeline:year', 'get', f'/timeline/{owner}/year/?year={anchor.year}')
+        self.measure(
+            'timeline:month', 'get',
+            f'/timeline/{owner}/month/?year={anchor.year}&month={anchor.month}'
+        )
+        self.measure('timeline:day', 'get', f'/timeline/{owner}/day/?date={anchor.isoformat()}')
+        self.measure(
+            'timeline:range', 'get',
+            f'/timeline/{owner}/range/?start={anchor.replace(day=1).isoformat()}'
+            f'&end={anchor.isoformat()}'
+        )
+        self.measure('async:timeline', 'get', f'/async/timeline/{owner}/', client=self.session_client)
+        self.measure(
+            'async:user_branches', 'get', f'/async/users/{owner}/branches/',
+            client=self.session_client
+        )
+        self.measure(
+            'async:user_overview', 'get', f'/async/users/{owner}/overview/',
+            client=self.session_client
+        )
+        self.measure('async:posts', 'get', '/async/posts/', client=self.session_client)
+        self.measure('export', 'get', '/export/?gzip=1')
+        self.measure('cache-stats', 'get', '/cache-stats/')
+        return self.results
+
+    def measure_writes(self):
+        """Создание, изменение и удаление постов и веток зрителя"""
+        from branches.models import Branch
+        from posts.models import Post
+
+        viewer = self.viewer.pk
+        branch = Branch.objects.filter(user=self.viewer).order_by('pk').first()
+        numbers = itertools.count()
+        self.measure('branches:create', 'post', '/branches/', data=lambda: {
+            'user_id': viewer, 'title': f'Новая ветка {next(numbers)}', 'color': 'blue',
+        }, format='json')
+        self.measure('branches:update', 'patch', f'/branches/{branch.pk}/', data={
+            'description': 'Обновленное описание',
+        }, format='json')
+        self.measure('posts:create', 'post', '/posts/', data={
+            'user_id': viewer, 'branch': branch.pk, 'title': 'Новый пост',
+            'content': 'Текст', 'event_date': '2020-01-01',
+        }, format='json')
+        post = Post.objects.filter(user=self.viewer).order_by('-pk').first()
+        self.measure('posts:update', 'patch', f'/posts/{post.pk}/', data={
+            'title': 'Измененный пост', 'event_date': '2019-12-31',
+        }, format='json')
+
+        # Каждый повтор удаляет новый объект
+        def created_post():
+            created = Post.objects.create(
+                user=self.viewer, branch=branch, title='Удаляемый пост',
+                content='Текст', event_date=datetime.date(2020, 1, 1)
+            )
+            return f'/posts/{created.pk}/'
+
+        def created_branch():
+            created = Branch.objects.create(
+                user=self.viewer, title=f'Удаляемая ветка {next(numbers)}'
+            )
+            return f'/branches/{created.pk}/'
+
+        self.measure('posts:delete', 'delete', created_post)
+        self.measure('branches:delete', 'delete', created_branch)
+
+    def import_payload(self, lines=100):
+        return '\n'.join(
+            json.dumps({
+                'branch': 'Импорт', 'title': f'Импорт {index}',
+                'content': 'Импортированная заметка', 'event_date': f'2020-{index % 12 + 1:02d}-01',
+            }, ensure_ascii=False)
+            for index in range(lines)
+        ).encode()
+
+    def request(self, method, url, client=None, **kwargs):
+        # data-функция дает новые данные на каждый запрос (уникальные названия)
+        if callable(kwargs.get('data')):
+            kwargs['data'] = kwargs['data']()
+        response = getattr(client or self.client, method)(url, **kwargs)
+        if response.status_code >= 400:
+            raise AssertionError(f'{method.upper()} {url}: {response.status_code}')
+        if response.streaming:
+            body = b''.join(response.streaming_content)
+            if response['Content-Type'] == 'application/gzip':
+                gzip.decompress(body)
+        return response
+
+    def measure(self, name, method, url, page_size=None, repeat=None, **kwargs):
+        """
+        Замер эндпоинта; url - адрес или функция, возвращающая новый
+        адрес на каждый запрос (удаление).
+        """
+        make_url = url if callable(url) else (lambda: url)
+        from django.core.cache import cache
+        from django.db import connection, reset_queries
+        from django.test.utils import CaptureQueriesContext
+
+        # Холодный запрос: число запросов и пик памяти без кэша ответов.
+        # Журнал запросов ограничен, заполненный журнал не дал бы прироста
+        cache.clear()
+        reset_queries()
+        tracemalloc.start()
+        url = make_url()
+        with CaptureQueriesContext(connection) as context:
+            self.request(method, url, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        # Следующие запросы очищают журнал (сигнал request_started)
+        queries = [query['sql'] for query in context.captured_queries]
+
+        timings = []
+        for _ in range(repeat or self.repeat):
+            target = make_url()
+            started = time.perf_counter()
+            self.request(method, target, **kwargs)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        result = {
+            'endpoint': name,
+            'method': method.upper(),
+            'url': url,
+            'dataset': self.size,
+            'page_size': page_size,
+            'queries': len(queries),
+            'budget': QUERY_BUDGETS[name],
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'peak_kb': round(peak / 1024, 1),
+        }
+        self.results.append(result)
+
+        if result['queries'] > result['budget']:
+            self.violations.append(
+                f"{name} {url}: {result['queries']} запросов при бюджете {result['budget']}\n"
+                + '\n'.join(queries)
+            )
+        return result
+
+
+def run_suite(sizes, repeat=20, seed=42, stream=sys.stdout, create_db=True):
+    """
+    Прогон на наборах из sizes постов в отдельной тестовой базе.
+
+    create_db=False - база уже создана (фикстура django_db под pytest).
+    Возвращает (results, violations).
+    """
+    from django.core.management import call_command
+    from django.test.utils import (
+        override_settings, setup_databases, setup_test_environment,
+        teardown_databases, teardown_test_environment
+    )
+
+    if create_db:
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+
+    results, violations = [], []
+    try:
+        with override_settings(ROOT_URLCONF='api.urls', DEBUG=False):
+            for size in sizes:
+                call_command('flush', interactive=False, verbosity=0)
+                call_command(
+                    'create_sample_data',
+                    users=max(20, size // 50), posts=size, seed=seed,
+                    prefix=f'bench{size}', stdout=stream
+                )
+                bench = Bench(size, repeat)
+                results.extend(bench.run())
+                violations.extend(bench.violations)
+    finally:
+        if create_db:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+    return results, violations
+
+
+def print_table(results, stream=sys.stdout):
+    stream.write(
+        f'{"эндпоинт":<22}{"набор":>8}{"стр.":>6}{"запр.":>7}{"бюджет":>8}'
+        f'{"p50, мс":>10}{"p99, мс":>10}{"пик, КБ":>10}\n'
+    )
+    for row in results:
+        stream.write(
+            f"{row['endpoint']:<22}{row['dataset']:>8}{row['page_size'] or '':>6}"
+            f"{row['queries']:>7}{row['budget']:>8}{row['p50_ms']:>10.2f}"
+            f"{row['p99_ms']:>10.2f}{row['peak_kb']:>10.1f}\n"
+        )
+
+
+def test_query_budgets(django_db):
+    """Бюджеты запросов на малом наборе данных"""
+    missing = setup_django()
+    assert not missing, f"API-приложения не подключены в INSTALLED_APPS: {', '.join(missing)}"
+
+    _, violations = run_suite([500], repeat=3, create_db=False)
+    assert not violations, '\n\n'.join(violations)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='2000,20000', help='Размеры наборов (постов) через запятую')
+    parser.add_argument('--repeat', type=int, default=20, help='Повторов на эндпоинт')
+    parser.add_argument('--seed', type=int, default=42, help='Зерно генератора данных')
+    parser.add_argument('--output', default='bench.json', help='Файл для результатов в JSON')
+    args = parser.parse_args()
+
+    missing = setup_django()
+    if missing:
+        sys.exit(f"Не подключены приложения: {', '.join(missing)}")
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results, violations = run_suite(sizes, repeat=args.repeat, seed=args.seed)
+    print_table(results)
+
+    with open(args.output, 'w', encoding='utf-8') as output:
+        json.dump({
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sizes': sizes,
+            'repeat': args.repeat,
+            'results': results,
+            'violations': violations,
+        }, output, ensure_ascii=False, indent=2)
+
+    if violations:
+        sys.stderr.write('\nПревышены бюджеты запросов:\n\n' + '\n\n'.join(violations) + '\n')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Помесячная сводка временной шкалы после последовательности записей.
+
+TimelineMonth поддерживается дельтами при сохранении и удалении постов
+и при смене приватности веток; после любой последовательности записей
+она должна совпадать с пересборкой rebuild() по самим постам.
+"""
+import datetime
+
+
+def snapshot(user):
+    """Непустые строки сводки пользователя"""
+    from timeline.models import TimelineMonth
+
+    return sorted(
+        TimelineMonth.objects.filter(user=user).exclude(
+            posts_count=0, drafts_count=0
+        ).values_list(
+            'branch_id', 'year', 'month', 'posts_count', 'drafts_count', 'is_private'
+        )
+    )
+
+
+def assert_matches_rebuild(user):
+    from timeline.models import TimelineMonth
+
+    live = snapshot(user)
+    TimelineMonth.rebuild(user=user)
+    assert live == snapshot(user)
+
+
+def test_rollup_matches_rebuild(api, make_user, make_post):
+    from branches.models import Branch
+
+    user = make_user()
+    first = make_post(user, event_date=datetime.date(2021, 1, 10))
+    branch, other = first.branch, Branch.objects.create(user=user, title='Вторая ветка')
+    second = make_post(user, branch=branch, event_date=datetime.date(2021, 1, 20))
+    draft = make_post(user, branch=other, event_date=datetime.date(2021, 3, 1), is_draft=True)
+    make_post(user, branch=other, event_date=datetime.date(2021, 3, 5))
+    assert_matches_rebuild(user)
+
+    # Перенос в другой месяц и в другую ветку, публикация черновика
+    second.event_date = datetime.date(2021, 2, 1)
+    second.save()
+    first.branch = other
+    first.save()
+    draft.is_draft = False
+    draft.save()
+    assert_matches_rebuild(user)
+
+    # Изменение через API и дата с часовым поясом у границы месяца:
+    # 31 января 22:30 UTC - уже 1 февраля по Москве
+    api.force_authenticate(user)
+    response = api.patch(f'/posts/{first.pk}/', {'event_date': '2020-12-31'}, format='json')
+    assert response.status_code == 200
+    draft.event_date = datetime.datetime(2021, 1, 31, 22, 30, tzinfo=datetime.timezone.utc)
+    draft.save()
+    assert_matches_rebuild(user)
+
+    # Приватность ветки и удаления
+    other.is_private = True
+    other.save()
+    assert_matches_rebuild(user)
+    second.delete()
+    Branch.objects.get(pk=branch.pk).delete()
+    assert_matches_rebuild(user)
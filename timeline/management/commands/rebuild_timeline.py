@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from timeline.models import TimelineMonth
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает помесячную сводку временной шкалы из постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Пересобрать сводку только для пользователя с этим username'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create'
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            UserModel = get_user_model()
+            try:
+                user = UserModel.objects.get(username=options['user'])
+            except UserModel.DoesNotExist:
+                raise CommandError(f"Пользователь {options['user']} не найден")
+
+        created = TimelineMonth.rebuild(user=user, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Сводка пересобрана: {created} строк'
+        ))
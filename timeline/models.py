@@ -0,0 +1,252 @@
+import datetime
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q, Count
+from django.db.models.functions import ExtractYear, ExtractMonth
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.conf import settings
+
+
+def event_month(event_date):
+    """
+    (год, месяц) даты события.
+
+    datetime приводится к дате так же, как при сохранении в DateField:
+    aware - в часовом поясе по умолчанию, поэтому месяц сводки совпадает
+    с месяцем сохраненной даты и у границы суток.
+    """
+    if isinstance(event_date, datetime.datetime):
+        if timezone.is_aware(event_date):
+            event_date = timezone.localdate(event_date, timezone.get_default_timezone())
+        else:
+            event_date = event_date.date()
+    return event_date.year, event_date.month
+
+
+class TimelineMonth(models.Model):
+    """
+    Помесячная сводка постов пользователя по веткам.
+
+    Поддерживается инкрементально при изменении постов и приватности
+    веток, поэтому временная шкала строится без чтения самих постов.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_months',
+        verbose_name=_('пользователь')
+    )
+
+    branch = models.ForeignKey(
+        'branches.Branch',
+        on_delete=models.CASCADE,
+        related_name='timeline_months',
+        verbose_name=_('ветка')
+    )
+
+    year = models.PositiveSmallIntegerField(_('год'))
+
+    month = models.PositiveSmallIntegerField(_('месяц'))
+
+    posts_count = models.PositiveIntegerField(
+        _('количество опубликованных постов'),
+        default=0
+    )
+
+    drafts_count = models.PositiveIntegerField(
+        _('количество черновиков'),
+        default=0
+    )
+
+    is_private = models.BooleanField(
+        _('приватная ветка'),
+        default=False,
+        help_text=_('Копия Branch.is_private для фильтрации без JOIN')
+    )
+
+    class Meta:
+        verbose_name = _('месяц временной шкалы')
+        verbose_name_plural = _('месяцы временной шкалы')
+        ordering = ['year', 'month']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'branch', 'year', 'month'],
+                name='unique_timeline_month'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', 'year', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.year}-{self.month:02d} ({self.branch_id})"
+
+    @classmethod
+    def apply_delta(cls, user_id, branch_id, event_date, is_draft, delta):
+        """
+        Изменение счетчика месяца на delta атомарным UPDATE.
+
+        Строка создается при первом посте месяца; гонку двух
+        одновременных вставок разрешает уникальное ограничение.
+        """
+        counter = 'drafts_count' if is_draft else 'posts_count'
+        year, month = event_month(event_date)
+        lookup = {
+            'user_id': user_id,
+            'branch_id': branch_id,
+            'year': year,
+            'month': month,
+        }
+
+        updated = cls.objects.filter(**lookup).update(
+            **{counter: F(counter) + delta}
+        )
+        if updated or delta < 0:
+            return
+
+        from branches.models import Branch
+        is_private = Branch.objects.filter(
+            pk=branch_id
+        ).values_list('is_private', flat=True).first() or False
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    is_private=is_private,
+                    **{counter: delta},
+                    **lookup
+                )
+        except IntegrityError:
+            cls.objects.filter(**lookup).update(
+                **{counter: F(counter) + delta}
+            )
+
+    @classmethod
+    def apply_deltas(cls, user_id, deltas):
+        """
+        Пакетное изменение счетчиков пользователя.
+
+        deltas - {(branch_id, year, month): (posts, drafts)} с неотрицательными
+        приращениями. Существующие строки блокируются и обновляются одним
+        bulk_update, недостающие создаются одним bulk_create.
+        """
+        from branches.models import Branch
+
+        if not deltas:
+            return
+
+        branch_ids = {branch_id for branch_id, _, _ in deltas}
+        years = {year for _, year, _ in deltas}
+        try:
+            with transaction.atomic():
+                existing = {
+                    (row.branch_id, row.year, row.month): row
+                    for row in cls.objects.select_for_update().filter(
+                        user_id=user_id, branch_id__in=branch_ids, year__in=years
+                    )
+                }
+                private = dict(Branch.objects.filter(
+                    pk__in=branch_ids
+                ).values_list('pk', 'is_private'))
+
+                changed, created = [], []
+                for key, (posts, drafts) in deltas.items():
+                    row = existing.get(key)
+                    if row is None:
+                        branch_id, year, month = key
+                        created.append(cls(
+                            user_id=user_id, branch_id=branch_id, year=year, month=month,
+                            posts_count=posts, drafts_count=drafts,
+                            is_private=private.get(branch_id, False)
+                        ))
+                    else:
+                        row.posts_count += posts
+                        row.drafts_count += drafts
+                        changed.append(row)
+
+                cls.objects.bulk_update(changed, ['posts_count', 'drafts_count'])
+                cls.objects.bulk_create(created)
+        except IntegrityError:
+            # Строку месяца успела создать параллельная запись - по одной
+            for (branch_id, year, month), (posts, drafts) in deltas.items():
+                event_date = datetime.date(year, month, 1)
+                if posts:
+                    cls.apply_delta(user_id, branch_id, event_date, False, posts)
+                if drafts:
+                    cls.apply_delta(user_id, branch_id, event_date, True, drafts)
+
+    @classmethod
+    def post_saved(cls, current, previous=None):
+        """
+        Учет создания или изменения поста.
+
+        Состояния - кортежи (user_id, branch_id, event_date, is_draft).
+        """
+        if previous is not None:
+            if cls._month_key(previous) == cls._month_key(current):
+                return
+            cls.apply_delta(*previous, delta=-1)
+
+        cls.apply_delta(*current, delta=1)
+
+    @classmethod
+    def post_deleted(cls, state):
+        """Учет удаления поста"""
+        cls.apply_delta(*state, delta=-1)
+
+    @classmethod
+    def branch_privacy_changed(cls, branch):
+        """Синхронизация флага приватности ветки"""
+        cls.objects.filter(branch=branch).update(is_private=branch.is_private)
+
+    @staticmethod
+    def _month_key(state):
+        user_id, branch_id, event_date, is_draft = state
+        return (user_id, branch_id, *event_month(event_date), is_draft)
+
+    @classmethod
+    def rebuild(cls, user=None, batch_size=1000):
+        """
+        Полная пересборка сводки одним GROUP BY по постам.
+        """
+        from posts.models import Post
+
+        posts = Post.objects.all()
+        rollups = cls.objects.all()
+        if user is not None:
+            posts = posts.filter(user=user)
+            rollups = rollups.filter(user=user)
+
+        rows = posts.order_by().values(
+            'user_id', 'branch_id', 'branch__is_private',
+            year=ExtractYear('event_date'),
+            month=ExtractMonth('event_date'),
+        ).annotate(
+            published=Count('id', filter=Q(is_draft=False)),
+            drafts=Count('id', filter=Q(is_draft=True)),
+        )
+
+        created = 0
+        with transaction.atomic():
+            rollups.delete()
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(cls(
+                    user_id=row['user_id'],
+                    branch_id=row['branch_id'],
+                    year=row['year'],
+                    month=row['month'],
+                    posts_count=row['published'],
+                    drafts_count=row['drafts'],
+                    is_private=row['branch__is_private'],
+                ))
+                if len(batch) >= batch_size:
+                    cls.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                cls.objects.bulk_create(batch)
+                created += len(batch)
+
+        return created
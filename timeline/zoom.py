@@ -0,0 +1,96 @@
+"""
+Окна временной шкалы: год, месяц, день или явный диапазон дат.
+
+Посты окна читаются одним запросом с условием event_date BETWEEN
+start AND end по индексу (user, event_date) и уже упорядоченными
+(от новых к старым), поэтому время ответа зависит от размера окна,
+а не от числа постов пользователя.
+
+Соседние периоды для навигации находятся запросами с LIMIT 1 по тому
+же индексу: ближайшая дата поста до начала окна и после его конца.
+Пустые периоды при этом пропускаются.
+"""
+import calendar
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+ZOOMS = ('year', 'month', 'day', 'range')
+
+# Наибольшая длина явного диапазона (zoom=range), дней
+MAX_RANGE_DAYS = 366
+
+CHUNK_SIZE = 500
+BUFFER_SIZE = 64 * 1024
+
+
+def period_bounds(zoom, anchor):
+    """(start, end) периода zoom, содержащего дату anchor"""
+    if zoom == 'year':
+        return datetime.date(anchor.year, 1, 1), datetime.date(anchor.year, 12, 31)
+    if zoom == 'month':
+        last_day = calendar.monthrange(anchor.year, anchor.month)[1]
+        return anchor.replace(day=1), anchor.replace(day=last_day)
+    if zoom == 'day':
+        return anchor, anchor
+    raise ValueError(f'Неизвестный масштаб: {zoom}')
+
+
+def window_posts(posts, start, end):
+    """Посты окна от новых к старым"""
+    return posts.filter(event_date__range=(start, end)).order_by(
+        '-event_date', '-created_at', '-id'
+    )
+
+
+def adjacent_dates(posts, start, end):
+    """
+    Ближайшие даты постов до start и после end (или None).
+
+    Два запроса ORDER BY event_date LIMIT 1 - одно чтение индекса каждый.
+    """
+    previous = posts.filter(event_date__lt=start).order_by(
+        '-event_date'
+    ).values_list('event_date', flat=True).first()
+    following = posts.filter(event_date__gt=end).order_by(
+        'event_date'
+    ).values_list('event_date', flat=True).first()
+    return previous, following
+
+
+def adjacent_periods(zoom, posts, start, end):
+    """
+    Начала соседних непустых периодов (или None).
+
+    Для явного диапазона - сами ближайшие даты постов.
+    """
+    previous, following = adjacent_dates(posts, start, end)
+    if zoom != 'range':
+        previous = previous and period_bounds(zoom, previous)[0]
+        following = following and period_bounds(zoom, following)[0]
+    return previous, following
+
+
+def stream_json(header, key, rows, buffer_size=BUFFER_SIZE):
+    """
+    Байтовые блоки JSON-объекта header с массивом rows под ключом key.
+
+    Строки кодируются по мере чтения курсора, весь ответ в памяти
+    не собирается.
+    """
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    opening = encoder.encode(header)[:-1]
+    buffer = [opening + (',' if header else '') + encoder.encode(key) + ':[']
+    size = len(buffer[0])
+
+    for index, row in enumerate(rows):
+        chunk = (',' if index else '') + encoder.encode(row)
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= buffer_size:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+
+    buffer.append(']}')
+    yield ''.join(buffer).encode()
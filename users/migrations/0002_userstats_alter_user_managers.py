@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-18 04:25
+
+import django.db.models.deletion
+import users.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='количество подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='количество подписок')),
+                ('branches_count', models.PositiveIntegerField(default=0, verbose_name='количество веток')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='количество опубликованных постов')),
+            ],
+            options={
+                'verbose_name': 'статистика пользователя',
+                'verbose_name_plural': 'статистика пользователей',
+            },
+        ),
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', users.models.UserManager()),
+            ],
+        ),
+    ]
@@ -1,8 +1,24 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager as DjangoUserManager
+from django.conf import settings
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 
 
+class UserQuerySet(models.QuerySet):
+    def with_stats(self):
+        """Счетчики из UserStats одним LEFT JOIN"""
+        return self.annotate(**{
+            field: Coalesce(F(f'stats__{field}'), 0)
+            for field in UserStats.COUNTERS
+        })
+
+
+class UserManager(DjangoUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     """
     Расширенная модель пользователя для Knowledge Map.
@@ -23,6 +39,8 @@ class User(AbstractUser):
         help_text=_('Загрузите ваш аватар')
     )
     
+    objects = UserManager()
+    
     class Meta:
         verbose_name = _('пользователь')
         verbose_name_plural = _('пользователи')
@@ -30,3 +48,128 @@ class User(AbstractUser):
     
     def __str__(self):
         return self.username
+    
+    def update_counts(self):
+        """Пересчет счетчиков пользователя"""
+        return UserStats.recount(self.pk)
+
+
+class UserStats(models.Model):
+    """
+    Денормализованные счетчики пользователя.
+    
+    Счетчики постов и веток обновляются атомарными F() дельтами в
+    транзакциях записи, подписок - фоновым пересчетом после записи
+    (core.tasks); recount() пересчитывает все с нуля.
+    """
+    COUNTERS = ('followers_count', 'following_count', 'branches_count', 'posts_count')
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name=_('пользователь')
+    )
+    
+    followers_count = models.PositiveIntegerField(
+        _('количество подписчиков'),
+        default=0
+    )
+    
+    following_count = models.PositiveIntegerField(
+        _('количество подписок'),
+        default=0
+    )
+    
+    branches_count = models.PositiveIntegerField(
+        _('количество веток'),
+        default=0
+    )
+    
+    posts_count = models.PositiveIntegerField(
+        _('количество опубликованных постов'),
+        default=0
+    )
+    
+    class Meta:
+        verbose_name = _('статистика пользователя')
+        verbose_name_plural = _('статистика пользователей')
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.posts_count} / {self.followers_count}"
+    
+    @classmethod
+    def apply_delta(cls, user_id, **deltas):
+        """
+        Изменение счетчиков на дельты, например posts_count=1.
+        
+        Если записи еще нет, она создается пересчетом - вызов делается
+        после записи, поэтому пересчет уже учитывает изменение.
+        """
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas or user_id is None:
+            return
+        
+        updated = cls.objects.filter(user_id=user_id).update(**{
+            field: F(field) + delta for field, delta in deltas.items()
+        })
+        if not updated:
+            cls.recount(user_id)
+    
+    @classmethod
+    def post_saved(cls, current, previous=None):
+        """
+        Учет опубликованных постов; состояния как у Post.get_tracked_state().
+        """
+        was_published = previous is not None and not previous[3]
+        is_published = not current[3]
+        
+        if was_published and is_published and previous[0] == current[0]:
+            return
+        if was_published:
+            cls.apply_delta(previous[0], posts_count=-1)
+        if is_published:
+            cls.apply_delta(current[0], posts_count=1)
+    
+    @classmethod
+    def post_deleted(cls, state):
+        if not state[3]:
+            cls.apply_delta(state[0], posts_count=-1)
+    
+    @classmethod
+    def counters_refreshed(cls, changed, missing):
+        """
+        После фонового пересчета (core.tasks.refresh_counters): записи,
+        которых еще нет, создаются полным пересчетом.
+        """
+        from core.cache import invalidate
+        
+        for user_id in User.objects.filter(pk__in=missing).values_list('pk', flat=True):
+            cls.recount(user_id)
+        invalidate(users=[*changed, *missing])
+    
+    @classmethod
+    def recount(cls, user_id):
+        """Полный пересчет счетчиков пользователя"""
+        from branches.models import Branch
+        from posts.models import Post
+        from subscriptions.models import Subscription
+        
+        stats, _ = cls.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                'followers_count': Subscription.objects.filter(
+                    Q(target_user_id=user_id, target_branch__isnull=True) |
+                    Q(target_branch__user_id=user_id)
+                ).count(),
+                'following_count': Subscription.objects.filter(
+                    subscriber_id=user_id
+                ).count(),
+                'branches_count': Branch.objects.filter(user_id=user_id).count(),
+                'posts_count': Post.objects.filter(
+                    user_id=user_id, is_draft=False
+                ).count(),
+            }
+        )
+        return stats